@@ -0,0 +1,157 @@
+"""Archivo de incidentes cerrados: separa la tabla caliente de la histórica.
+
+Los incidentes cerrados hace más de ``ARCHIVO_DIAS`` días se mueven, junto con
+sus logs, a ``incidentearchivado`` y ``logincidentearchivado``. Cada lote es una
+transacción (``INSERT ... SELECT`` y ``DELETE``) de hasta ``ARCHIVO_LOTE``
+incidentes, con ``ARCHIVO_PAUSA_S`` segundos entre lotes para no competir con el
+tráfico. Así el tamaño de ``incidente`` y la profundidad de sus índices dependen
+de los incidentes activos y no de toda la historia.
+
+Las lecturas por id, por radicado y de logs caen a las tablas frías cuando el
+incidente no está en la caliente (ver ``app.database``). Por cada lote se publica
+``{"operation": "archive", "ids": [...]}`` en ``TOPIC_ID`` para que la réplica
+mueva las mismas filas. El mensaje se guarda primero en ``archivo_publicaciones``
+(outbox) en la misma transacción del lote y se borra al publicarse; si Pub/Sub
+falla, se reintenta y lo pendiente se publica en la siguiente ejecución, así que
+la réplica no se queda con filas que la primaria ya archivó. Se ejecuta como
+comando, por ejemplo desde un cron::
+
+    python -m app.archivo --dias 180 --lote 500 --pausa 0.5
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, Table, Text, delete, insert, select
+from sqlalchemy.engine import Connection
+
+from app import config
+from app.database import obtener_engine, publish_message
+from app.models import Estado, Incidente, IncidenteArchivado, LogIncidente, LogIncidenteArchivado
+
+logger = logging.getLogger(__name__)
+
+_REINTENTOS_PUBLICACION = 3
+
+_metadata = MetaData()
+publicaciones_pendientes = Table(
+    "archivo_publicaciones", _metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("ids", Text, nullable=False),
+    Column("creado", DateTime, nullable=False),
+)
+
+
+def mover_a_archivo(conn: Connection, ids: List[int]) -> int:
+    """Mueve los incidentes ``ids`` y sus logs a las tablas frías; retorna los incidentes movidos.
+
+    Es idempotente: los ids que ya no están en la tabla caliente se ignoran.
+    """
+    if not ids:
+        return 0
+    columnas = [columna.name for columna in Incidente.__table__.columns]
+    columnas_log = [columna.name for columna in LogIncidente.__table__.columns]
+    conn.execute(insert(IncidenteArchivado.__table__).from_select(
+        columnas, select(*(Incidente.__table__.c[c] for c in columnas)).where(Incidente.id.in_(ids))))
+    conn.execute(insert(LogIncidenteArchivado.__table__).from_select(
+        columnas_log, select(*(LogIncidente.__table__.c[c] for c in columnas_log))
+        .where(LogIncidente.incidente_id.in_(ids))))
+    conn.execute(delete(LogIncidente.__table__).where(LogIncidente.incidente_id.in_(ids)))
+    return conn.execute(delete(Incidente.__table__).where(Incidente.id.in_(ids))).rowcount
+
+
+def publicar_pendientes(engine, publicar: Callable = publish_message) -> int:
+    """Publica los mensajes del outbox en orden; retorna los que quedan pendientes.
+
+    Cada mensaje se reintenta ``_REINTENTOS_PUBLICACION`` veces. Si sigue fallando
+    se detiene (para no publicar fuera de orden) y deja en el log los ids para
+    reenviarlos a mano si hiciera falta.
+    """
+    with engine.connect() as conn:
+        pendientes = conn.execute(select(publicaciones_pendientes.c.id, publicaciones_pendientes.c.ids)
+                                  .order_by(publicaciones_pendientes.c.id)).all()
+    for posicion, (pendiente_id, ids) in enumerate(pendientes):
+        for intento in range(1, _REINTENTOS_PUBLICACION + 1):
+            try:
+                publicar({"operation": "archive", "ids": json.loads(ids)}, config.TOPIC_ID)
+                break
+            except Exception as e:
+                if intento == _REINTENTOS_PUBLICACION:
+                    logger.error("No se pudo publicar el archivo de incidentes, queda pendiente",
+                                 extra={"ids": ids, "error": str(e)})
+                    return len(pendientes) - posicion
+                time.sleep(0.5 * 2 ** (intento - 1))
+        with engine.begin() as conn:
+            conn.execute(delete(publicaciones_pendientes).where(publicaciones_pendientes.c.id == pendiente_id))
+    return 0
+
+
+def _informar(progreso: Dict):
+    logger.info("Archivando incidentes", extra=progreso)
+
+
+def archivar_cerrados(engine, dias: Optional[int] = None, lote: Optional[int] = None,
+                      pausa_s: Optional[float] = None, publicar: Callable = publish_message,
+                      progreso: Callable[[Dict], None] = _informar) -> Dict:
+    dias = config.ARCHIVO_DIAS if dias is None else dias
+    lote = config.ARCHIVO_LOTE if lote is None else lote
+    pausa_s = config.ARCHIVO_PAUSA_S if pausa_s is None else pausa_s
+    limite = date.today() - timedelta(days=dias)
+
+    inicio = time.perf_counter()
+    _metadata.create_all(engine)
+    # Lo que no se pudo publicar en la ejecución anterior va primero
+    pendientes = publicar_pendientes(engine, publicar)
+    archivados = lotes = 0
+    ultimo_id = 0
+    while True:
+        with engine.begin() as conn:
+            # SKIP LOCKED: un incidente que se está modificando se archiva en la siguiente ejecución
+            ids = conn.execute(
+                select(Incidente.id)
+                .where(Incidente.id > ultimo_id, Incidente.estado == Estado.cerrado, Incidente.fecha_cierre < limite)
+                .order_by(Incidente.id).limit(lote).with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                break
+            archivados += mover_a_archivo(conn, ids)
+            conn.execute(insert(publicaciones_pendientes).values(
+                ids=json.dumps(ids), creado=datetime.now(timezone.utc).replace(tzinfo=None)))
+        lotes += 1
+        ultimo_id = ids[-1]
+        if not pendientes:
+            pendientes = publicar_pendientes(engine, publicar)
+        else:
+            pendientes += 1
+        progreso({"incidentes": archivados, "lotes": lotes, "ultimo_id": ultimo_id})
+        if pausa_s > 0:
+            time.sleep(pausa_s)
+
+    return {"incidentes": archivados, "lotes": lotes, "publicaciones_pendientes": pendientes,
+            "cerrados_antes_de": limite.isoformat(), "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, default=config.ARCHIVO_DIAS)
+    parser.add_argument("--lote", type=int, default=config.ARCHIVO_LOTE)
+    parser.add_argument("--pausa", type=float, default=config.ARCHIVO_PAUSA_S, help="Segundos entre lotes")
+    args = parser.parse_args(argv)
+
+    def imprimir(progreso: Dict):
+        print(f"{progreso['incidentes']} incidentes archivados en {progreso['lotes']} lotes", flush=True)
+
+    resumen = archivar_cerrados(obtener_engine(), args.dias, args.lote, args.pausa, progreso=imprimir)
+    print(f"{resumen['incidentes']} incidentes cerrados antes de {resumen['cerrados_antes_de']} "
+          f"archivados en {resumen['segundos']}s")
+    if resumen["publicaciones_pendientes"]:
+        print(f"{resumen['publicaciones_pendientes']} publicaciones a la réplica quedaron pendientes", flush=True)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import heapq
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, select
+
+from app import config
+from app.indice_texto import IndiceBM25
+from app.models import Incidente
+
+logger = logging.getLogger(__name__)
+
+# ER_FT_MATCHING_KEY_NOT_FOUND: no hay índice FULLTEXT para las columnas del MATCH
+_ERROR_SIN_INDICE_FULLTEXT = 1191
+# Cada cuánto se vuelve a probar el FULLTEXT tras encontrarlo ausente, para tomarlo
+# sin reiniciar cuando ``python -m app.indices`` termina de crearlo
+_REINTENTO_SIN_INDICE_S = 60
+
+ResultadosBusqueda = Tuple[int, List[Tuple[Incidente, float]]]
+
+
+class BusquedaNoDisponible(Exception):
+    """La búsqueda pedida no puede atenderse sin el índice FULLTEXT."""
+
+
+def _texto_incidente(incidente: Incidente) -> str:
+    return f"{incidente.description or ''} {incidente.solucion or ''}"
+
+
+class BuscadorIncidentes(ABC):
+    """Interfaz de los motores de búsqueda de texto sobre incidentes.
+
+    ``cliente_id`` en ``None`` significa buscar en todos los clientes (agentes).
+    """
+
+    @abstractmethod
+    def buscar(self, consulta: str, cliente_id: Optional[int], session: Session,
+               offset: int, limite: int) -> ResultadosBusqueda:
+        ...
+
+    def indexar(self, incidente: Incidente):
+        pass
+
+
+class BuscadorFulltextMySQL(BuscadorIncidentes):
+    """Usa el índice FULLTEXT ``ft_incidente_texto`` de MySQL.
+
+    En bases existentes el índice lo crea ``python -m app.indices``. Mientras no
+    exista, ``buscar_incidentes`` solo atiende búsquedas de un cliente.
+    """
+
+    def __init__(self):
+        self.disponible = True
+        self.reintentar_en = 0.0
+
+    def buscar(self, consulta, cliente_id, session, offset, limite):
+        puntaje = match(Incidente.description, Incidente.solucion,
+                        against=consulta).in_natural_language_mode()
+        filtros = [puntaje]
+        if cliente_id is not None:
+            filtros.append(Incidente.cliente_id == cliente_id)
+
+        total = session.exec(select(func.count()).select_from(Incidente).where(*filtros)).one()
+        statement = (
+            select(Incidente, puntaje.label("score"))
+            .where(*filtros)
+            .order_by(puntaje.desc(), Incidente.id.desc())
+            .offset(offset)
+            .limit(limite)
+        )
+        return total, [(incidente, float(score)) for incidente, score in session.exec(statement).all()]
+
+
+class BuscadorEnMemoria(BuscadorIncidentes):
+    """Índice BM25 en proceso, un índice por cliente.
+
+    Pensado para SQLite y desarrollo local: cada índice se construye desde la
+    base de datos en la primera búsqueda y se mantiene con ``indexar``.
+    """
+
+    def __init__(self):
+        self._indices: Dict[int, IndiceBM25] = {}
+        self._todos_cargados = False
+        self._lock = threading.Lock()
+
+    def _cargar(self, session: Session, cliente_id: Optional[int]):
+        statement = select(Incidente.id, Incidente.cliente_id, Incidente.description, Incidente.solucion)
+        if cliente_id is not None:
+            statement = statement.where(Incidente.cliente_id == cliente_id)
+        indices: Dict[int, IndiceBM25] = {}
+        for incidente_id, id_cliente, description, solucion in session.exec(statement):
+            indice = indices.get(id_cliente)
+            if indice is None:
+                indice = indices[id_cliente] = IndiceBM25()
+            indice.agregar(incidente_id, f"{description or ''} {solucion or ''}")
+        if cliente_id is not None:
+            indices.setdefault(cliente_id, IndiceBM25())
+        for id_cliente, indice in indices.items():
+            self._indices.setdefault(id_cliente, indice)
+
+    def _indices_para(self, cliente_id: Optional[int], session: Session) -> List[IndiceBM25]:
+        if cliente_id is None:
+            if not self._todos_cargados:
+                with self._lock:
+                    if not self._todos_cargados:
+                        self._cargar(session, None)
+                        self._todos_cargados = True
+            return list(self._indices.values())
+        if cliente_id not in self._indices:
+            with self._lock:
+                if cliente_id not in self._indices:
+                    self._cargar(session, cliente_id)
+        return [self._indices[cliente_id]]
+
+    def buscar(self, consulta, cliente_id, session, offset, limite):
+        indices = self._indices_para(cliente_id, session)
+        total = sum(indice.contar(consulta) for indice in indices)
+        candidatos = heapq.nlargest(
+            offset + limite,
+            (resultado for indice in indices for resultado in indice.buscar(consulta, offset + limite)),
+            key=lambda item: item[1],
+        )[offset:]
+        if not candidatos:
+            return total, []
+
+        ids = [incidente_id for incidente_id, _ in candidatos]
+        incidentes = {i.id: i for i in session.exec(select(Incidente).where(Incidente.id.in_(ids))).all()}
+        return total, [(incidentes[incidente_id], score) for incidente_id, score in candidatos
+                       if incidente_id in incidentes]
+
+    def indexar(self, incidente: Incidente):
+        indice = self._indices.get(incidente.cliente_id)
+        if indice is None:
+            if not self._todos_cargados:
+                return
+            with self._lock:
+                indice = self._indices.setdefault(incidente.cliente_id, IndiceBM25())
+        indice.agregar(incidente.id, _texto_incidente(incidente))
+
+    def reiniciar(self):
+        with self._lock:
+            self._indices.clear()
+            self._todos_cargados = False
+
+
+buscador_fulltext = BuscadorFulltextMySQL()
+buscador_en_memoria = BuscadorEnMemoria()
+
+
+def obtener_buscador(session: Session) -> BuscadorIncidentes:
+    if config.BUSQUEDA_BACKEND == "memoria":
+        return buscador_en_memoria
+    if config.BUSQUEDA_BACKEND == "fulltext" or session.get_bind().dialect.name == "mysql":
+        return buscador_fulltext
+    return buscador_en_memoria
+
+
+def _falta_indice_fulltext(error: DBAPIError) -> bool:
+    original = error.orig
+    codigo = getattr(original, "errno", None) or (original.args[0] if getattr(original, "args", None) else None)
+    return codigo == _ERROR_SIN_INDICE_FULLTEXT
+
+
+def _buscar_sin_fulltext(consulta: str, cliente_id: Optional[int], session: Session,
+                         offset: int, limite: int) -> ResultadosBusqueda:
+    # Un índice del proceso no se enteraría de las escrituras de otras instancias y
+    # el de todos los clientes cargaría la tabla completa en memoria: se construye
+    # uno desechable solo con los incidentes del cliente.
+    if cliente_id is None:
+        raise BusquedaNoDisponible("La búsqueda en todos los clientes requiere el índice FULLTEXT")
+    return BuscadorEnMemoria().buscar(consulta, cliente_id, session, offset, limite)
+
+
+def buscar_incidentes(consulta: str, cliente_id: Optional[int], session: Session,
+                      offset: int = 0, limite: int = 20) -> ResultadosBusqueda:
+    buscador = obtener_buscador(session)
+    if buscador is not buscador_fulltext:
+        return buscador.buscar(consulta, cliente_id, session, offset, limite)
+    if buscador_fulltext.disponible or time.monotonic() >= buscador_fulltext.reintentar_en:
+        try:
+            resultados = buscador_fulltext.buscar(consulta, cliente_id, session, offset, limite)
+            buscador_fulltext.disponible = True
+            return resultados
+        except DBAPIError as e:
+            if not _falta_indice_fulltext(e):
+                raise
+            logger.warning("Falta el índice FULLTEXT ft_incidente_texto, crearlo con python -m app.indices")
+            buscador_fulltext.disponible = False
+            buscador_fulltext.reintentar_en = time.monotonic() + _REINTENTO_SIN_INDICE_S
+            session.rollback()
+    return _buscar_sin_fulltext(consulta, cliente_id, session, offset, limite)
+
+
+def indexar_incidente(incidente: Incidente):
+    # El índice FULLTEXT de MySQL se mantiene solo; únicamente el índice en
+    # memoria necesita enterarse de los cambios.
+    buscador_en_memoria.indexar(incidente)
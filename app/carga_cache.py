@@ -0,0 +1,136 @@
+"""Carga de claves de caché sin estampidas.
+
+Cuando falta una clave muy consultada, solo una petición la carga desde la base
+de datos:
+
+* dentro del proceso, las peticiones concurrentes por la misma clave esperan el
+  mismo ``Future``;
+* entre procesos, quien toma ``<clave>:carga`` (``SET NX PX``) consulta la base y
+  los demás esperan a que la clave aparezca, hasta ``CACHE_ESPERA_MS``.
+
+Además, las claves con TTL se refrescan antes de expirar con probabilidad
+creciente a medida que se acerca el vencimiento (XFetch): refresca si
+``-delta * beta * ln(U) >= ttl_restante``, donde ``delta`` es lo que tarda la
+carga. Así el vencimiento no provoca una ola de fallos simultáneos.
+"""
+import asyncio
+import math
+import random
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from redis.asyncio import Redis as AsyncRedis
+
+from app import config
+from app.metricas import CACHE_CONSULTAS
+
+Valor = Union[str, bytes]
+Cargador = Callable[[], Awaitable[Optional[Valor]]]
+
+_INTERVALO_ESPERA = 0.01
+
+
+class CargaUnica:
+    def __init__(self):
+        self._en_vuelo: Dict[str, asyncio.Future] = {}
+        # Duración típica de la carga por tipo de clave (delta de XFetch)
+        self._duraciones: Dict[str, float] = {}
+
+    def _debe_refrescar(self, tipo: str, ttl_ms: int) -> bool:
+        if ttl_ms <= 0 or config.INCIDENTE_CACHE_TTL <= 0:
+            return False
+        delta = self._duraciones.get(tipo, 0.01)
+        return -delta * config.CACHE_REFRESCO_BETA * math.log(1.0 - random.random()) >= ttl_ms / 1000
+
+    async def obtener(self, redis_async: AsyncRedis, tipo: str, clave: str, cargar: Cargador) -> Optional[Valor]:
+        """Valor de ``clave``; si falta (o toca refrescarla) se carga con ``cargar`` una sola vez."""
+        async with redis_async.pipeline(transaction=False) as pipe:
+            pipe.get(clave)
+            pipe.pttl(clave)
+            valor, ttl_ms = await pipe.execute()
+
+        if valor is not None:
+            if clave in self._en_vuelo or not self._debe_refrescar(tipo, ttl_ms):
+                CACHE_CONSULTAS.inc(tipo, "hit")
+                return valor
+            # Solo refresca quien obtiene el candado; el resto sigue con el valor vigente
+            token = await self._tomar_candado(redis_async, clave)
+            if token is not None and clave in self._en_vuelo:
+                await self._liberar(redis_async, clave, token)
+                token = None
+            if token is None:
+                CACHE_CONSULTAS.inc(tipo, "hit")
+                return valor
+            CACHE_CONSULTAS.inc(tipo, "refresh")
+            return await self._resolver(redis_async, tipo, clave, cargar, token)
+
+        en_vuelo = self._en_vuelo.get(clave)
+        if en_vuelo is not None:
+            CACHE_CONSULTAS.inc(tipo, "coalesced")
+            return await asyncio.shield(en_vuelo)
+        CACHE_CONSULTAS.inc(tipo, "miss")
+        return await self._resolver(redis_async, tipo, clave, cargar, await self._tomar_candado(redis_async, clave))
+
+    async def _resolver(self, redis_async: AsyncRedis, tipo: str, clave: str, cargar: Cargador,
+                        token: Optional[str]) -> Optional[Valor]:
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_vuelo[clave] = futuro
+        try:
+            if token is not None:
+                valor = await self._cargar_y_guardar(redis_async, tipo, clave, cargar, token)
+            else:
+                valor = await self._esperar_otro_proceso(redis_async, tipo, clave, cargar)
+            futuro.set_result(valor)
+            return valor
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Marca la excepción como recuperada por si nadie más esperaba este futuro
+            futuro.exception()
+            raise
+        finally:
+            del self._en_vuelo[clave]
+
+    async def _tomar_candado(self, redis_async: AsyncRedis, clave: str) -> Optional[str]:
+        token = secrets.token_hex(8)
+        if await redis_async.set(f"{clave}:carga", token, nx=True, px=config.CACHE_CANDADO_MS):
+            return token
+        return None
+
+    async def _liberar(self, redis_async: AsyncRedis, clave: str, token: str):
+        """Suelta el candado solo si sigue siendo nuestro (pudo expirar y tomarlo otro)."""
+        if await redis_async.get(f"{clave}:carga") == token.encode():
+            await redis_async.delete(f"{clave}:carga")
+
+    async def _cargar_y_guardar(self, redis_async: AsyncRedis, tipo: str, clave: str, cargar: Cargador,
+                                token: str) -> Optional[Valor]:
+        try:
+            inicio = time.perf_counter()
+            valor = await cargar()
+            duracion = time.perf_counter() - inicio
+            anterior = self._duraciones.get(tipo)
+            self._duraciones[tipo] = duracion if anterior is None else anterior * 0.9 + duracion * 0.1
+            if valor is not None:
+                await redis_async.set(clave, valor, ex=config.INCIDENTE_CACHE_TTL or None)
+            return valor
+        finally:
+            await self._liberar(redis_async, clave, token)
+
+    async def _esperar_otro_proceso(self, redis_async: AsyncRedis, tipo: str, clave: str,
+                                    cargar: Cargador) -> Optional[Valor]:
+        limite = time.monotonic() + config.CACHE_ESPERA_MS / 1000
+        while time.monotonic() < limite:
+            await asyncio.sleep(_INTERVALO_ESPERA)
+            valor = await redis_async.get(clave)
+            if valor is not None:
+                return valor
+            if not await redis_async.exists(f"{clave}:carga"):
+                break
+        # El otro proceso terminó sin valor (el registro no existe) o tardó demasiado
+        token = await self._tomar_candado(redis_async, clave)
+        if token is not None:
+            return await self._cargar_y_guardar(redis_async, tipo, clave, cargar, token)
+        return await cargar()
+
+
+carga_unica = CargaUnica()
@@ -2,14 +2,18 @@ from yarl import URL
 import httpx
 from fastapi import HTTPException
 from app import config
+from app.concurrencia import limites
+from app.metricas import HTTP_SALIENTE_DURACION
+from app.trazas import encabezados_propagacion, span
 
 async def verificar_cliente_existente(email: str, token: str) -> str:
     base_url = URL(config.URL_SERVICE_CLIENT)
     full_url = base_url / "clientes/email"
 
     async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = await client.post(str(full_url), json={"email": email}, headers=headers)
+        with limites["clientes"].adquirir(), HTTP_SALIENTE_DURACION.cronometrar("clientes"), span("http.clientes", url=str(full_url)):
+            headers = {"Authorization": f"Bearer {token}", **encabezados_propagacion()}
+            response = await client.post(str(full_url), json={"email": email}, headers=headers)
         
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
@@ -26,8 +30,9 @@ async def verificar_agente_existente(email: str, token: str) -> str:
     full_url = base_url / "agentes/email"
 
     async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = await client.post(str(full_url), json={"email": email}, headers=headers)
+        with limites["clientes"].adquirir(), HTTP_SALIENTE_DURACION.cronometrar("clientes"), span("http.clientes", url=str(full_url)):
+            headers = {"Authorization": f"Bearer {token}", **encabezados_propagacion()}
+            response = await client.post(str(full_url), json={"email": email}, headers=headers)
         
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Agente no encontrado")
@@ -0,0 +1,118 @@
+"""Codificación de los incidentes guardados en las claves ``incidente:*``.
+
+``CACHE_CODEC`` elige el formato de escritura; la lectura reconoce todos, así que
+el formato se cambia en caliente: primero se despliega el código que lee ambos y
+luego se cambia la variable. Las claves viejas se siguen leyendo hasta que expiran.
+
+* ``json``: ``model_dump_json()``, el formato original (empieza siempre con ``{``).
+* ``binario``: cabecera ``\\xffI`` + versión + banderas, seguida de una tupla de
+  ancho fijo (ids, ordinales de los enums y fechas como ordinal del calendario) y
+  de los textos con su longitud. Si los textos superan ``CACHE_CODEC_COMPRIMIR_DESDE``
+  bytes se comprimen con zlib (bandera ``_COMPRIMIDO``).
+
+Los ordinales son la posición en la declaración de cada enum: agregar valores al
+final es compatible, pero reordenarlos o quitarlos exige una nueva versión.
+"""
+import json
+import struct
+import zlib
+from datetime import date
+from typing import Optional, Union
+
+from app import config
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+
+CABECERA = b"\xffI"
+VERSION_BINARIO = 1
+_COMPRIMIDO = 0x01
+
+_FIJO = struct.Struct("<qqBBBBII")
+_LONGITUD = struct.Struct("<I")
+_NULO = 0xFFFFFFFF
+_TEXTOS = ("radicado", "identificacion_usuario", "description", "solucion")
+
+_CATEGORIAS, _PRIORIDADES, _CANALES, _ESTADOS = ([miembro.value for miembro in enum]
+                                                  for enum in (Categoria, Prioridad, Canal, Estado))
+# Los enums heredan de str, así que el miembro y su valor son la misma clave
+_ORD_CATEGORIA, _ORD_PRIORIDAD, _ORD_CANAL, _ORD_ESTADO = ({valor: i for i, valor in enumerate(valores)}
+                                                          for valores in (_CATEGORIAS, _PRIORIDADES,
+                                                                          _CANALES, _ESTADOS))
+
+
+def _fecha(valor) -> int:
+    if not valor:
+        return 0
+    # Los modelos con table=True no validan, así que la fecha puede seguir siendo texto
+    return (date.fromisoformat(valor) if isinstance(valor, str) else valor).toordinal()
+
+
+def _texto(valor: Optional[str]) -> bytes:
+    if valor is None:
+        return _LONGITUD.pack(_NULO)
+    datos = valor.encode()
+    return _LONGITUD.pack(len(datos)) + datos
+
+
+def codificar_binario(incidente: Incidente) -> bytes:
+    textos = b"".join((_texto(incidente.radicado), _texto(incidente.identificacion_usuario),
+                       _texto(incidente.description), _texto(incidente.solucion)))
+    banderas = 0
+    if config.CACHE_CODEC_COMPRIMIR_DESDE and len(textos) >= config.CACHE_CODEC_COMPRIMIR_DESDE:
+        comprimidos = zlib.compress(textos, 1)
+        if len(comprimidos) < len(textos):
+            textos, banderas = comprimidos, banderas | _COMPRIMIDO
+    fijo = _FIJO.pack(incidente.id or 0, incidente.cliente_id,
+                      _ORD_CATEGORIA[incidente.categoria], _ORD_PRIORIDAD[incidente.prioridad],
+                      _ORD_CANAL[incidente.canal], _ORD_ESTADO[incidente.estado],
+                      _fecha(incidente.fecha_creacion), _fecha(incidente.fecha_cierre))
+    return CABECERA + bytes((VERSION_BINARIO, banderas)) + fijo + textos
+
+
+def _decodificar_binario(valor: bytes) -> dict:
+    version, banderas = valor[2], valor[3]
+    if version != VERSION_BINARIO:
+        raise ValueError(f"Versión de codificación desconocida: {version}")
+    (incidente_id, cliente_id, categoria, prioridad, canal, estado,
+     fecha_creacion, fecha_cierre) = _FIJO.unpack_from(valor, 4)
+    textos = valor[4 + _FIJO.size:]
+    if banderas & _COMPRIMIDO:
+        textos = zlib.decompress(textos)
+
+    leidos, posicion = {}, 0
+    for campo in _TEXTOS:
+        (longitud,) = _LONGITUD.unpack_from(textos, posicion)
+        posicion += _LONGITUD.size
+        if longitud == _NULO:
+            leidos[campo] = None
+        else:
+            leidos[campo] = textos[posicion:posicion + longitud].decode()
+            posicion += longitud
+
+    # Mismas claves, orden y tipos que json.loads(incidente.model_dump_json())
+    return {
+        "id": incidente_id or None,
+        "description": leidos["description"],
+        "categoria": _CATEGORIAS[categoria],
+        "prioridad": _PRIORIDADES[prioridad],
+        "canal": _CANALES[canal],
+        "cliente_id": cliente_id,
+        "estado": _ESTADOS[estado],
+        "fecha_creacion": date.fromordinal(fecha_creacion).isoformat() if fecha_creacion else None,
+        "fecha_cierre": date.fromordinal(fecha_cierre).isoformat() if fecha_cierre else None,
+        "solucion": leidos["solucion"],
+        "radicado": leidos["radicado"],
+        "identificacion_usuario": leidos["identificacion_usuario"],
+    }
+
+
+def codificar(incidente: Incidente) -> Union[str, bytes]:
+    if config.CACHE_CODEC == "binario":
+        return codificar_binario(incidente)
+    return incidente.model_dump_json()
+
+
+def decodificar(valor: Union[str, bytes]) -> dict:
+    """Incidente como diccionario JSON, sea cual sea el formato con que se guardó."""
+    if isinstance(valor, bytes) and valor.startswith(CABECERA):
+        return _decodificar_binario(valor)
+    return json.loads(valor)
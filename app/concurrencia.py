@@ -0,0 +1,233 @@
+"""Límites de concurrencia adaptativos (AIMD) por dependencia.
+
+Cada dependencia (base de datos primaria y réplica, Redis, servicio de clientes y
+facturación) tiene un límite de operaciones en curso. Si se alcanza, la petición
+se rechaza de inmediato con 503 en vez de hacer cola en el pool.
+
+El límite se ajusta solo a partir de la latencia observada, comparando dos medias
+móviles (gradiente): la reciente, que sigue a las últimas operaciones, y la base,
+de ventana larga. Mientras la reciente se mantiene por debajo de ``latencia base ×
+CONCURRENCIA_TOLERANCIA`` y el límite se está usando, crece de forma aditiva
+(+1 por cada ``límite`` operaciones). Si la supera, o ante fallos de conexión, se
+reduce multiplicativamente, como máximo una vez cada ``ESPERA_REDUCCION`` segundos.
+Una operación lenta aislada no basta para reducirlo.
+
+En la base de datos el cupo no es la sesión sino la conexión: ``PoolLimitado`` lo
+reserva antes de esperar una conexión del pool y lo libera al devolverla, y la
+latencia que ajusta el límite es la espera por la conexión. Esa espera es casi
+cero mientras el pool alcanza y crece cuando hay cola, sin importar si las
+sentencias son lecturas por id o listados.
+
+Rechazar solo alivia la carga antes de escribir: una vez confirmada la escritura,
+el cliente reintentaría y la duplicaría. Dentro de ``sin_rechazos`` los cupos se
+siguen contando pero se conceden aunque se haya alcanzado el límite.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, Type
+
+import httpx
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from app import config
+from app.metricas import observar_fallos_sql, registro
+
+RECHAZOS = registro.contador(
+    "concurrency_rejections_total", "Operaciones rechazadas por el límite de concurrencia", ("dependency",))
+
+
+_sin_rechazos: ContextVar[bool] = ContextVar("concurrencia_sin_rechazos", default=False)
+
+
+@contextmanager
+def sin_rechazos():
+    """Concede los cupos pedidos en el bloque aunque se supere el límite (ver arriba)."""
+    token = _sin_rechazos.set(True)
+    try:
+        yield
+    finally:
+        _sin_rechazos.reset(token)
+
+
+class DependenciaSaturada(HTTPException):
+    def __init__(self, dependencia: str):
+        super().__init__(status_code=503, detail=f"Servicio saturado ({dependencia}), intente de nuevo",
+                         headers={"Retry-After": "1"})
+        self.dependencia = dependencia
+
+
+class LimiteAdaptativo:
+    ESPERA_REDUCCION = 0.1
+    DECAIMIENTO_BASE = 0.001
+    DECAIMIENTO_RECIENTE = 0.2
+
+    def __init__(self, nombre: str, inicial: int, minimo: int, maximo: int, margen_s: float = 0.002,
+                 fallos: Tuple[Type[BaseException], ...] = (TimeoutError, ConnectionError), reduccion: float = 0.9):
+        self.nombre = nombre
+        self.limite = float(inicial)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.margen_s = margen_s
+        self.fallos = fallos
+        self.reduccion = reduccion
+        self.en_curso = 0
+        self.latencia_base: Optional[float] = None
+        self.latencia_reciente: Optional[float] = None
+        self._ultima_reduccion = 0.0
+        self._lock = threading.Lock()
+
+    def _entrar(self):
+        with self._lock:
+            if self.en_curso >= int(self.limite) and not _sin_rechazos.get():
+                RECHAZOS.inc(self.nombre)
+                raise DependenciaSaturada(self.nombre)
+            self.en_curso += 1
+
+    def _salir(self, duracion: Optional[float] = None, fallo: bool = False):
+        with self._lock:
+            self.en_curso -= 1
+            if duracion is not None or fallo:
+                self._ajustar(duracion or 0.0, fallo)
+
+    def observar(self, duracion: float, fallo: bool = False):
+        with self._lock:
+            self._ajustar(duracion, fallo)
+
+    def _ajustar(self, duracion: float, fallo: bool):
+        if not fallo:
+            if self.latencia_base is None:
+                self.latencia_base = self.latencia_reciente = duracion
+            else:
+                self.latencia_base += (duracion - self.latencia_base) * self.DECAIMIENTO_BASE
+                self.latencia_reciente += (duracion - self.latencia_reciente) * self.DECAIMIENTO_RECIENTE
+
+        if fallo or self.latencia_reciente > self.latencia_base * config.CONCURRENCIA_TOLERANCIA + self.margen_s:
+            ahora = time.monotonic()
+            if ahora - self._ultima_reduccion >= self.ESPERA_REDUCCION:
+                self.limite = max(self.minimo, self.limite * self.reduccion)
+                self._ultima_reduccion = ahora
+        elif self.en_curso + 1 >= self.limite / 2:
+            # Solo crece si el límite se está usando; si no, la señal no dice nada
+            self.limite = min(self.maximo, self.limite + 1 / self.limite)
+
+    @contextmanager
+    def adquirir(self, medir: bool = True):
+        """Reserva un cupo; con ``medir`` la duración del bloque alimenta el ajuste del límite."""
+        if not config.CONCURRENCIA_HABILITADA:
+            yield
+            return
+        self._entrar()
+        inicio = time.perf_counter()
+        fallo = False
+        try:
+            yield
+        except self.fallos:
+            fallo = True
+            raise
+        finally:
+            self._salir(time.perf_counter() - inicio if medir else None, fallo)
+
+    def reiniciar(self, inicial: int):
+        with self._lock:
+            self.limite = float(inicial)
+            self.en_curso = 0
+            self.latencia_base = None
+            self.latencia_reciente = None
+            self._ultima_reduccion = 0.0
+
+
+_FALLOS_HTTP = (httpx.TimeoutException, httpx.NetworkError, httpx.PoolTimeout)
+_FALLOS_REDIS = (RedisConnectionError, RedisTimeoutError)
+
+# nombre: (inicial, mínimo, máximo, margen) — el inicial de la base de datos coincide
+# con pool_size + max_overflow del pool por defecto de SQLAlchemy
+_INICIALES = {
+    "db_primary": (15, 2, 100, 0.005),
+    "db_replica": (15, 2, 100, 0.005),
+    "redis": (64, 4, 512, 0.002),
+    "clientes": (32, 2, 256, 0.020),
+    "facturacion": (32, 2, 256, 0.020),
+}
+_FALLOS = {"redis": _FALLOS_REDIS, "clientes": _FALLOS_HTTP, "facturacion": _FALLOS_HTTP}
+
+limites: Dict[str, LimiteAdaptativo] = {
+    nombre: LimiteAdaptativo(nombre, inicial, minimo, maximo, margen,
+                             fallos=_FALLOS.get(nombre, (TimeoutError, ConnectionError)))
+    for nombre, (inicial, minimo, maximo, margen) in _INICIALES.items()
+}
+
+
+def reiniciar_limites_concurrencia():
+    for nombre, limite_ in limites.items():
+        limite_.reiniciar(_INICIALES[nombre][0])
+
+
+registro.medidor(
+    "concurrency_limit", "Límite de concurrencia y operaciones en curso por dependencia", ("dependency", "kind"),
+    lambda: {clave: valor for nombre, limite_ in limites.items()
+             for clave, valor in (((nombre, "limit"), int(limite_.limite)), ((nombre, "inflight"), limite_.en_curso))})
+
+
+class PoolLimitado(QueuePool):
+    """``QueuePool`` que reserva un cupo de ``limite`` por cada conexión entregada.
+
+    El cupo se toma antes de esperar en la cola del pool (si no hay, se rechaza con
+    503 sin esperar) y se libera al devolver la conexión. La espera alimenta el ajuste
+    del límite; no conseguir conexión (timeout del pool o error al conectar) cuenta
+    como fallo. ``limite`` se asigna al nombrar el engine; sin él se comporta como
+    un ``QueuePool``.
+    """
+
+    limite: Optional[LimiteAdaptativo] = None
+
+    def _do_get(self):
+        limite_ = self.limite
+        if limite_ is None or not config.CONCURRENCIA_HABILITADA:
+            return super()._do_get()
+        limite_._entrar()
+        inicio = time.perf_counter()
+        try:
+            registro_ = super()._do_get()
+        except BaseException:
+            limite_._salir(fallo=True)
+            raise
+        limite_.observar(time.perf_counter() - inicio)
+        # El cupo viaja con la conexión: se libera el mismo aunque cambie la configuración
+        registro_.record_info["concurrencia_cupo"] = limite_
+        return registro_
+
+    def _do_return_conn(self, registro_):
+        limite_ = registro_.record_info.pop("concurrencia_cupo", None)
+        try:
+            super()._do_return_conn(registro_)
+        finally:
+            if limite_ is not None:
+                limite_._salir()
+
+    def recreate(self):
+        # dispose() y la invalidación del pool crean uno nuevo con los mismos parámetros
+        pool = super().recreate()
+        pool.limite = self.limite
+        return pool
+
+
+def limitar_pool(engine: Engine, nombre: str):
+    """Asocia el pool de ``engine`` (si es ``PoolLimitado``) al límite ``db_<nombre>``."""
+    if isinstance(engine.pool, PoolLimitado):
+        engine.pool.limite = limites.get(f"db_{nombre}")
+
+
+# Una conexión caída mientras se ejecuta una sentencia también es un fallo de la base
+@observar_fallos_sql
+def _al_fallar(contexto):
+    conexion = contexto.connection
+    if conexion is None or not contexto.is_disconnect:
+        return
+    limite_ = limites.get(f"db_{conexion.info.get('metricas_engine')}")
+    if limite_ is not None and config.CONCURRENCIA_HABILITADA:
+        limite_.observar(0.0, fallo=True)
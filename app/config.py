@@ -37,4 +37,128 @@ DB_SOCKET_PATH_PRIMARY = os.getenv("DB_SOCKET_PATH_PRIMARY", "")
 DB_SOCKET_PATH_REPLICA = os.getenv("DB_SOCKET_PATH_REPLICA", "")
 
 URL_SERVICE_CLIENT = os.getenv("URL_SERVICE_CLIENT", "http://localhost:8000")
-SECRET_KEY = os.getenv("SECRET_KEY", "secret")
\ No newline at end of file
+URL_SERVICE_FACTURACION = os.getenv("URL_SERVICE_FACTURACION", "https://ms-facturacion-345518488840.us-central1.run.app")
+SECRET_KEY = os.getenv("SECRET_KEY", "secret")
+# Motor de búsqueda de incidentes: "auto" usa FULLTEXT en MySQL y el índice en memoria en otro caso
+BUSQUEDA_BACKEND = os.getenv("BUSQUEDA_BACKEND", "auto").lower()
+
+# Detección de incidentes casi duplicados al crear: "desactivado", "marcar" o "fusionar"
+DUPLICADOS_MODO = os.getenv("DUPLICADOS_MODO", "desactivado").lower()
+DUPLICADOS_UMBRAL = float(os.getenv("DUPLICADOS_UMBRAL", "0.8"))
+DUPLICADOS_VENTANA_HORAS = int(os.getenv("DUPLICADOS_VENTANA_HORAS", "24"))
+# "auto" usa Redis si está configurado (compartido entre instancias) y memoria si no
+DUPLICADOS_ALMACEN = os.getenv("DUPLICADOS_ALMACEN", "auto").lower()
+
+SOLUCIONES_CACHE_TTL = int(os.getenv("SOLUCIONES_CACHE_TTL", "3600"))
+
+EXPORTACION_TAMANO_LOTE = int(os.getenv("EXPORTACION_TAMANO_LOTE", "1000"))
+
+# Trazas: exportador "ninguno", "consola" o "archivo"; TRAZAS_MUESTREO es la fracción de peticiones trazadas
+TRAZAS_EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "ninguno").lower()
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0.1"))
+
+# Logging: nivel base de "app", niveles por módulo ("app.routes=DEBUG,app.database=WARNING")
+# y fracción de mensajes DEBUG que se conservan
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_NIVELES = os.getenv("LOG_NIVELES", "")
+LOG_MUESTREO_DEBUG = float(os.getenv("LOG_MUESTREO_DEBUG", "0.01"))
+# Registra cada sentencia SQL (logger "sqlalchemy.engine") con el formato y la redacción de la app
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Consultas lentas y modo debug
+CONSULTAS_LENTAS_UMBRAL_MS = float(os.getenv("CONSULTAS_LENTAS_UMBRAL_MS", "200"))
+CONSULTAS_LENTAS_MAX = int(os.getenv("CONSULTAS_LENTAS_MAX", "200"))
+# Fracción de las sentencias sobre el umbral que se guardan (1 = todas)
+CONSULTAS_LENTAS_MUESTREO = float(os.getenv("CONSULTAS_LENTAS_MUESTREO", "1"))
+DEBUG = os.getenv("DEBUG", "").lower() == "true"
+# Token requerido en X-Debug-Token para los endpoints /debug/*; vacío los deshabilita
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+# Perfilador por petición (ver app/perfilador.py)
+PERFILADOR_HABILITADO = os.getenv("PERFILADOR_HABILITADO", "").lower() == "true"
+PERFILADOR_TOKEN = os.getenv("PERFILADOR_TOKEN", "")
+PERFILADOR_MUESTREO = float(os.getenv("PERFILADOR_MUESTREO", "0"))
+PERFILADOR_MODO = os.getenv("PERFILADOR_MODO", "cprofile").lower()
+PERFILADOR_INTERVALO_MS = float(os.getenv("PERFILADOR_INTERVALO_MS", "5"))
+PERFILADOR_DIRECTORIO = os.getenv("PERFILADOR_DIRECTORIO", "/tmp/perfiles")
+PERFILADOR_MAX_ARCHIVOS = int(os.getenv("PERFILADOR_MAX_ARCHIVOS", "50"))
+
+# Arranque: "huella" ejecuta create_all solo si cambió el esquema, "siempre" o "nunca"
+ESQUEMA_SINCRONIZACION = os.getenv("ESQUEMA_SINCRONIZACION", "huella").lower()
+# Conexiones a la base de datos y a Redis que se abren durante el lifespan
+PRECALENTAR_CONEXIONES = int(os.getenv("PRECALENTAR_CONEXIONES", "2"))
+
+# Lanzador de producción (python -m app.servidor); SERVIDOR_WORKERS=0 usa las CPUs disponibles
+SERVIDOR_HOST = os.getenv("SERVIDOR_HOST", "0.0.0.0")
+SERVIDOR_PUERTO = int(os.getenv("PORT", "8080"))
+SERVIDOR_WORKERS = int(os.getenv("SERVIDOR_WORKERS", "0"))
+SERVIDOR_MAX_PETICIONES = int(os.getenv("SERVIDOR_MAX_PETICIONES", "0"))
+SERVIDOR_MAX_MEMORIA_MB = float(os.getenv("SERVIDOR_MAX_MEMORIA_MB", "0"))
+SERVIDOR_TIEMPO_APAGADO = int(os.getenv("SERVIDOR_TIEMPO_APAGADO", "20"))
+SERVIDOR_KEEPALIVE = int(os.getenv("SERVIDOR_KEEPALIVE", "5"))
+SERVIDOR_BACKLOG = int(os.getenv("SERVIDOR_BACKLOG", "2048"))
+SERVIDOR_ACCESS_LOG = os.getenv("SERVIDOR_ACCESS_LOG", "").lower() == "true"
+# Solo se lee X-Forwarded-For de estas IPs (separadas por coma); en Cloud Run agregar la del front end
+SERVIDOR_PROXIES_CONFIABLES = os.getenv("SERVIDOR_PROXIES_CONFIABLES", "127.0.0.1,::1")
+# Un worker que falla antes de SERVIDOR_VIDA_MINIMA_S se reinicia con espera exponencial
+SERVIDOR_VIDA_MINIMA_S = float(os.getenv("SERVIDOR_VIDA_MINIMA_S", "10"))
+SERVIDOR_REINICIO_ESPERA_S = float(os.getenv("SERVIDOR_REINICIO_ESPERA_S", "0.5"))
+SERVIDOR_REINICIO_ESPERA_MAX_S = float(os.getenv("SERVIDOR_REINICIO_ESPERA_MAX_S", "30"))
+
+# Idempotency-Key en POST /incidente: vigencia de la respuesta guardada, del candado
+# y tiempo máximo que un reintento concurrente espera la respuesta del primero
+IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", "86400"))
+IDEMPOTENCIA_CANDADO_MS = int(os.getenv("IDEMPOTENCIA_CANDADO_MS", "30000"))
+IDEMPOTENCIA_ESPERA_MS = int(os.getenv("IDEMPOTENCIA_ESPERA_MS", "10000"))
+
+# Límite de peticiones por cliente (ver app/limites.py); LIMITES_LOTE son los cupos reservados por ida a Redis
+LIMITES_HABILITADO = os.getenv("LIMITES_HABILITADO", "true").lower() == "true"
+LIMITES_LECTURA_POR_MINUTO = int(os.getenv("LIMITES_LECTURA_POR_MINUTO", "600"))
+LIMITES_ESCRITURA_POR_MINUTO = int(os.getenv("LIMITES_ESCRITURA_POR_MINUTO", "120"))
+LIMITES_LOTE = int(os.getenv("LIMITES_LOTE", "10"))
+
+# Límites de concurrencia adaptativos por dependencia (ver app/concurrencia.py)
+CONCURRENCIA_HABILITADA = os.getenv("CONCURRENCIA_HABILITADA", "true").lower() == "true"
+CONCURRENCIA_TOLERANCIA = float(os.getenv("CONCURRENCIA_TOLERANCIA", "2.0"))
+
+# Cliente asíncrono de Redis para las claves de caché incidente:*
+REDIS_MAX_CONEXIONES = int(os.getenv("REDIS_MAX_CONEXIONES", "50"))
+REDIS_TIMEOUT_S = float(os.getenv("REDIS_TIMEOUT_S", "2"))
+
+# Caché de incidentes: TTL de incidente:* (0 = sin expiración), candado y espera de la
+# carga única y factor beta del refresco anticipado (ver app/carga_cache.py)
+INCIDENTE_CACHE_TTL = int(os.getenv("INCIDENTE_CACHE_TTL", "3600"))
+CACHE_CANDADO_MS = int(os.getenv("CACHE_CANDADO_MS", "2000"))
+CACHE_ESPERA_MS = int(os.getenv("CACHE_ESPERA_MS", "1000"))
+CACHE_REFRESCO_BETA = float(os.getenv("CACHE_REFRESCO_BETA", "1.0"))
+
+# Búsquedas negativas (ver app/filtro_negativo.py): TTL de las marcas de ausencia y
+# tamaño del filtro de Bloom de radicados (bits y funciones hash). El filtro se
+# reconstruye cada FILTRO_RADICADOS_VIGENCIA_S / 2 y solo descarta mientras está vigente
+CACHE_NEGATIVO_TTL = int(os.getenv("CACHE_NEGATIVO_TTL", "30"))
+FILTRO_RADICADOS_HABILITADO = os.getenv("FILTRO_RADICADOS_HABILITADO", "true").lower() == "true"
+FILTRO_RADICADOS_BITS = int(os.getenv("FILTRO_RADICADOS_BITS", str(2 ** 24)))
+FILTRO_RADICADOS_HASHES = int(os.getenv("FILTRO_RADICADOS_HASHES", "7"))
+FILTRO_RADICADOS_VIGENCIA_S = int(os.getenv("FILTRO_RADICADOS_VIGENCIA_S", "3600"))
+
+# Precalentamiento de la caché al arrancar (ver app/precalentamiento.py)
+CACHE_PRECALENTAR = os.getenv("CACHE_PRECALENTAR", "false").lower() == "true"
+CACHE_PRECALENTAR_FILAS_POR_SEGUNDO = float(os.getenv("CACHE_PRECALENTAR_FILAS_POR_SEGUNDO", "2000"))
+CACHE_PRECALENTAR_DIAS = int(os.getenv("CACHE_PRECALENTAR_DIAS", "7"))
+
+# Formato de las claves incidente:* ("json" o "binario") y tamaño de los textos a
+# partir del cual el formato binario los comprime (0 = nunca); ver app/codec_cache.py
+CACHE_CODEC = os.getenv("CACHE_CODEC", "json")
+CACHE_CODEC_COMPRIMIR_DESDE = int(os.getenv("CACHE_CODEC_COMPRIMIR_DESDE", "512"))
+
+# Archivo de incidentes cerrados (ver app/archivo.py): antigüedad mínima del cierre,
+# incidentes por transacción y pausa entre transacciones
+ARCHIVO_DIAS = int(os.getenv("ARCHIVO_DIAS", "180"))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", "500"))
+ARCHIVO_PAUSA_S = float(os.getenv("ARCHIVO_PAUSA_S", "0.5"))
+
+# Consumidor que aplica TOPIC_ID en la réplica (ver app/sincronizacion.py)
+SINCRONIZACION_SUSCRIPCION = os.getenv("GCP_SYNC_SUBSCRIPTION_ID", "incidentes-db-sync-replica")
+SINCRONIZACION_LOTE = int(os.getenv("SINCRONIZACION_LOTE", "200"))
+SINCRONIZACION_ESPERA_S = float(os.getenv("SINCRONIZACION_ESPERA_S", "1.0"))
@@ -0,0 +1,165 @@
+"""Registro de consultas SQL lentas.
+
+Las sentencias que superan ``CONSULTAS_LENTAS_UMBRAL_MS`` se muestrean con
+``CONSULTAS_LENTAS_MUESTREO`` y las elegidas se guardan en un buffer circular
+acotado con el SQL normalizado (literales reemplazados por ``?``) y la forma de
+sus parámetros. Cuando la base se degrada casi todo supera el umbral: el
+muestreo evita normalizar cada sentencia en el camino de la petición. El plan (EXPLAIN) no se calcula en el
+camino de la petición: se obtiene bajo demanda desde el endpoint interno, con
+una conexión aparte. Para el EXPLAIN se conservan los parámetros con los textos
+vaciados: el plan no depende de su contenido y el buffer no guarda radicados,
+identificaciones ni descripciones.
+
+La duración viene del cronómetro único de sentencias de ``app.metricas``.
+"""
+import contextvars
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app import config
+from app.metricas import observar_sentencias
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTA_MARCADORES = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sql(statement: str) -> str:
+    sql = _LITERAL_TEXTO.sub("?", statement)
+    sql = _LITERAL_NUMERO.sub("?", sql)
+    sql = _LISTA_MARCADORES.sub("(?, ...)", sql)
+    return _ESPACIOS.sub(" ", sql).strip()
+
+
+def forma_parametros(parameters, executemany: bool):
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return {"executemany": len(parameters), "fila": forma_parametros(parameters[0], False)}
+    if isinstance(parameters, dict):
+        return {clave: type(valor).__name__ for clave, valor in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(valor).__name__ for valor in parameters]
+    return type(parameters).__name__
+
+
+def anonimizar_parametros(parameters):
+    """``parameters`` con cada texto reemplazado por uno vacío; el resto se conserva."""
+    if isinstance(parameters, (str, bytes)):
+        return type(parameters)()
+    if isinstance(parameters, dict):
+        return {clave: anonimizar_parametros(valor) for clave, valor in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(anonimizar_parametros(valor) for valor in parameters)
+    return parameters
+
+
+class ConsultaLenta:
+    __slots__ = ("sql", "sql_normalizado", "parametros", "forma", "duracion_ms", "engine", "motor",
+                 "fecha", "plan", "_engine_ref")
+
+    def a_dict(self) -> dict:
+        return {
+            "sql": self.sql_normalizado,
+            "parametros": self.forma,
+            "duracion_ms": round(self.duracion_ms, 3),
+            "engine": self.motor,
+            "fecha": self.fecha,
+            "plan": self.plan,
+        }
+
+
+class RegistroConsultasLentas:
+    def __init__(self, maximo: int):
+        self._consultas: deque = deque(maxlen=maximo)
+
+    def agregar(self, consulta: ConsultaLenta):
+        # deque.append con maxlen es atómico; descarta la más antigua al llenarse
+        self._consultas.append(consulta)
+
+    def listar(self) -> List[ConsultaLenta]:
+        # list() copia el deque en C sin liberar el GIL
+        return sorted(list(self._consultas), key=lambda c: c.duracion_ms, reverse=True)
+
+    def limpiar(self):
+        self._consultas.clear()
+
+
+registro_consultas_lentas = RegistroConsultasLentas(config.CONSULTAS_LENTAS_MAX)
+
+# Conteo de consultas de la petición actual, solo en modo debug
+_conteo_peticion: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("conteo_consultas", default=None)
+
+
+@observar_sentencias
+def _registrar_sentencia(conn, statement, parameters, executemany, duracion):
+    duracion_ms = duracion * 1000
+
+    conteo = _conteo_peticion.get()
+    if conteo is not None:
+        conteo[0] += 1
+        conteo[1] += duracion_ms
+
+    if duracion_ms < config.CONSULTAS_LENTAS_UMBRAL_MS:
+        return
+    if config.CONSULTAS_LENTAS_MUESTREO < 1 and random.random() >= config.CONSULTAS_LENTAS_MUESTREO:
+        return
+    consulta = ConsultaLenta()
+    consulta.sql = statement
+    consulta.sql_normalizado = normalizar_sql(statement)
+    consulta.parametros = None if executemany else anonimizar_parametros(parameters)
+    consulta.forma = forma_parametros(parameters, executemany)
+    consulta.duracion_ms = duracion_ms
+    consulta.engine = conn.engine
+    consulta.motor = conn.info.get("metricas_engine", "default")
+    consulta.fecha = datetime.now(timezone.utc).isoformat()
+    consulta.plan = None
+    registro_consultas_lentas.agregar(consulta)
+
+
+def obtener_plan(consulta: ConsultaLenta):
+    """Ejecuta EXPLAIN de la consulta en una conexión nueva y guarda el resultado."""
+    if consulta.plan is not None or consulta.parametros is None:
+        return consulta.plan
+    if not consulta.sql.lstrip().upper().startswith("SELECT"):
+        return None
+    prefijo = "EXPLAIN QUERY PLAN " if consulta.engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with consulta.engine.connect() as conn:
+            resultado = conn.exec_driver_sql(prefijo + consulta.sql, consulta.parametros)
+            consulta.plan = [dict(fila._mapping) for fila in resultado]
+    except Exception as e:
+        consulta.plan = {"error": str(e)}
+    return consulta.plan
+
+
+class ConteoConsultasMiddleware:
+    """Agrega ``X-Query-Count`` y ``X-Query-Time-Ms`` a cada respuesta para detectar N+1."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        conteo = [0, 0.0]
+        token = _conteo_peticion.set(conteo)
+
+        async def send_con_conteo(mensaje):
+            if mensaje["type"] == "http.response.start":
+                mensaje.setdefault("headers", [])
+                mensaje["headers"] = list(mensaje["headers"]) + [
+                    (b"x-query-count", str(conteo[0]).encode()),
+                    (b"x-query-time-ms", f"{conteo[1]:.2f}".encode()),
+                ]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_conteo)
+        finally:
+            _conteo_peticion.reset(token)
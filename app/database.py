@@ -1,66 +1,387 @@
 # incidentes/app/database.py
+import hashlib
 import json
+import logging
 import secrets
 import string
-from typing import Generator, List, Optional
+import threading
+from contextlib import ExitStack
+from typing import Callable, Generator, List, Optional
 from redis import Redis
-from sqlalchemy import select
+from redis.asyncio import BlockingConnectionPool, Redis as AsyncRedis
+from sqlalchemy import Column, Integer, MetaData, String, Table, delete, insert, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
 from sqlmodel import Session, create_engine, SQLModel
 from app import config
-from app.models import Incidente, LogIncidente, ProblemaComun
+from app.carga_cache import carga_unica
+from app.codec_cache import codificar, decodificar
+from app.filtro_negativo import (ausente_seguro, construir_filtro_radicados, recordar_ausente,
+                                   registrar_creacion, registrar_creacion_async)
+from app.concurrencia import (DependenciaSaturada, PoolLimitado, limitar_pool, limites as limites_concurrencia,
+                              sin_rechazos)
+from app.precalentamiento import precalentar_cache
+from app.metricas import CACHE_CONSULTAS, PUBSUB_DURACION, REDIS_DURACION, estado_pool, nombrar_engine, registro
+from app.models import Incidente, IncidenteArchivado, LogIncidente, LogIncidenteArchivado, ProblemaComun
+from app.trazas import span
+from app.sugerencias import indexar_problema_comun
 from uuid import UUID
 from google.cloud import pubsub_v1
 from google.oauth2 import service_account
 from datetime import date, datetime
 
 from app.utils import determinar_origen_cambio
+from app.versiones import (clave_catalogo_soluciones, clave_version_incidente, clave_version_incidentes,
+                           clave_version_soluciones, incrementar_version, nueva_version)
+
+logger = logging.getLogger(__name__)
+
+
+class RedisInstrumentado(Redis):
+    def execute_command(self, *args, **options):
+        with limites_concurrencia["redis"].adquirir(), REDIS_DURACION.cronometrar(args[0]):
+            return super().execute_command(*args, **options)
+
+
+class RedisAsyncInstrumentado(AsyncRedis):
+    async def execute_command(self, *args, **options):
+        with limites_concurrencia["redis"].adquirir(), REDIS_DURACION.cronometrar(args[0]):
+            return await super().execute_command(*args, **options)
+
+
+def _nuevo_engine(database_url: str):
+    # Sin echo: el SQL se registra por el logger "sqlalchemy.engine" con DB_ECHO (ver
+    # app/logger.py) y los parámetros, que traen datos personales, no aparecen en los
+    # logs ni en los mensajes de error
+    return create_engine(database_url, poolclass=PoolLimitado, hide_parameters=True)
+
+
+def _registrar_configuracion(database_url: str):
+    logger.info("Configurando engine",
+                extra={"database_url": make_url(database_url).render_as_string(hide_password=True)})
+
 
 def get_engine(database_url: Optional[str] = None):
     if database_url:
-        return create_engine(database_url, echo=True)
+        return _nuevo_engine(database_url)
     if config.DB_SOCKET_PATH_PRIMARY:
         database_url = f"mysql+mysqlconnector://{config.DB_USER}:{config.DB_PASSWORD}@/{config.DB_NAME}?unix_socket={config.DB_SOCKET_PATH_PRIMARY}"
     else:
         database_url = f"mysql+mysqlconnector://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
-    
-    print(database_url, flush=True)
-    return create_engine(database_url, echo=True)
+    _registrar_configuracion(database_url)
+    return _nuevo_engine(database_url)
 
 
 def get_engine_replica(database_url: Optional[str] = None):
     if database_url:
-        return create_engine(database_url, echo=True)
+        return _nuevo_engine(database_url)
     if config.DB_SOCKET_PATH_REPLICA:
         database_url = f"mysql+mysqlconnector://{config.DB_USER_REPLICA}:{config.DB_PASSWORD_REPLICA}@/{config.DB_NAME_REPLICA}?unix_socket={config.DB_SOCKET_PATH_REPLICA}"
     else:
         database_url = f"mysql+mysqlconnector://{config.DB_USER_REPLICA}:{config.DB_PASSWORD_REPLICA}@{config.DB_HOST_REPLICA}:{config.DB_PORT_REPLICA}/{config.DB_NAME_REPLICA}"
-    print(database_url, flush=True)
-    return create_engine(database_url, echo=True)
+    _registrar_configuracion(database_url)
+    return _nuevo_engine(database_url)
+
+
+# Los engines y el cliente de Redis se crean en el primer uso (o al precalentar en el
+# lifespan) para que importar este módulo no tenga efectos secundarios. Siguen
+# disponibles como ``app.database.engine``, ``engine_replica`` y ``redis_client``.
+_recursos = {}
+_recursos_lock = threading.Lock()
+
+
+def _recurso(nombre: str, crear):
+    recurso = _recursos.get(nombre)
+    if recurso is None:
+        with _recursos_lock:
+            recurso = _recursos.get(nombre)
+            if recurso is None:
+                recurso = _recursos[nombre] = crear()
+    return recurso
+
+
+def _crear_engine(nombre: str, fabrica):
+    engine = fabrica()
+    nombrar_engine(engine, nombre)
+    limitar_pool(engine, nombre)
+    return engine
+
 
+def obtener_engine():
+    return _recurso("engine", lambda: _crear_engine("primary", get_engine))
 
-engine = get_engine()
-engine_replica = get_engine_replica()
+
+def obtener_engine_replica():
+    return _recurso("engine_replica", lambda: _crear_engine("replica", get_engine_replica))
+
+
+def obtener_redis() -> Redis:
+    return _recurso("redis_client", lambda: RedisInstrumentado(host=config.REDIS_HOST, port=config.REDIS_PORT))
+
+
+def obtener_redis_async() -> AsyncRedis:
+    # BlockingConnectionPool espera una conexión libre hasta REDIS_TIMEOUT_S en vez de fallar
+    return _recurso("redis_async", lambda: RedisAsyncInstrumentado(connection_pool=BlockingConnectionPool(
+        host=config.REDIS_HOST, port=int(config.REDIS_PORT), max_connections=config.REDIS_MAX_CONEXIONES,
+        timeout=config.REDIS_TIMEOUT_S, socket_timeout=config.REDIS_TIMEOUT_S,
+        socket_connect_timeout=config.REDIS_TIMEOUT_S)))
+
+
+_FABRICAS = {"engine": obtener_engine, "engine_replica": obtener_engine_replica, "redis_client": obtener_redis}
+
+
+def __getattr__(nombre):
+    if nombre in _FABRICAS:
+        return _FABRICAS[nombre]()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+registro.medidor("db_pool_connections", "Estado del pool de conexiones por engine", ("engine", "state"),
+                 lambda: estado_pool({nombre: _recursos[clave] for nombre, clave in
+                                      (("primary", "engine"), ("replica", "engine_replica")) if clave in _recursos}))
 
 
 def init_db(engine, engine_replica):
     SQLModel.metadata.create_all(engine)
     SQLModel.metadata.create_all(engine_replica)
 
-redis_client = Redis(host=config.REDIS_HOST, port=config.REDIS_PORT)
+
+_huella_metadata = MetaData()
+esquema_huella = Table(
+    "esquema_huella", _huella_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("huella", String(64), nullable=False),
+)
+
+
+# Cambia cuando cambia lo que hace sincronizar_esquema, para que las bases con la
+# huella anterior vuelvan a sincronizarse (3: avisa de los índices faltantes en
+# vez de crearlos)
+_VERSION_SINCRONIZACION = 3
+
+
+def huella_esquema(engine) -> str:
+    """SHA-256 del DDL que ``create_all`` emitiría para los modelos en el dialecto del engine."""
+    digest = hashlib.sha256()
+    digest.update(str(_VERSION_SINCRONIZACION).encode())
+    for tabla in SQLModel.metadata.sorted_tables:
+        digest.update(str(CreateTable(tabla).compile(dialect=engine.dialect)).encode())
+        for indice in sorted(tabla.indexes, key=lambda i: i.name or ""):
+            digest.update(str(CreateIndex(indice).compile(dialect=engine.dialect)).encode())
+    return digest.hexdigest()
+
+
+def sincronizar_esquema(engine) -> bool:
+    """Ejecuta ``create_all`` solo si la huella guardada no coincide con la de los modelos.
+
+    Retorna ``True`` si se emitió DDL. Con ``ESQUEMA_SINCRONIZACION=siempre`` se
+    comporta como ``init_db`` y con ``nunca`` no toca el esquema.
+    """
+    if config.ESQUEMA_SINCRONIZACION == "nunca":
+        return False
+    huella = huella_esquema(engine)
+    if config.ESQUEMA_SINCRONIZACION != "siempre":
+        try:
+            with engine.connect() as conn:
+                guardada = conn.execute(select(esquema_huella.c.huella).where(esquema_huella.c.id == 1)).scalar()
+            if guardada == huella:
+                return False
+        except DBAPIError:
+            pass  # La tabla de huella aún no existe
+
+    SQLModel.metadata.create_all(engine)
+    faltantes = indices_faltantes(engine)
+    if faltantes:
+        # Construirlos aquí bloquearía el arranque; se crean con python -m app.indices
+        logger.warning("Faltan índices en tablas existentes, crearlos con python -m app.indices",
+                       extra={"indices": [indice.name for indice in faltantes]})
+    _huella_metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(delete(esquema_huella))
+        conn.execute(insert(esquema_huella).values(id=1, huella=huella))
+    logger.info("Esquema sincronizado", extra={"huella": huella[:12]})
+    return True
+
+
+_esquemas_sincronizados = False
+
+
+def sincronizar_esquemas():
+    """Sincroniza el esquema de la primaria y de la réplica una vez por proceso.
+
+    El supervisor (app/servidor.py) lo llama antes del fork: los workers heredan la
+    marca y no emiten el mismo DDL todos a la vez al arrancar.
+    """
+    global _esquemas_sincronizados
+    if _esquemas_sincronizados:
+        return
+    for motor in (obtener_engine(), obtener_engine_replica()):
+        sincronizar_esquema(motor)
+    _esquemas_sincronizados = True
+
+
+def indices_faltantes(engine) -> List:
+    """Índices de los modelos que faltan en las tablas existentes de la base.
+
+    ``create_all`` solo crea los índices junto con su tabla, así que un índice
+    agregado después a un modelo nunca llegaría a una base existente.
+    """
+    faltantes = []
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        for tabla in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {i["name"] for i in inspector.get_indexes(tabla.name)}
+            for indice in tabla.indexes:
+                # Respeta ddl_if: el FULLTEXT solo existe en MySQL
+                condicion = indice._ddl_if
+                if condicion is not None and not condicion._should_execute(CreateIndex(indice), indice, conn):
+                    continue
+                if indice.name not in existentes:
+                    faltantes.append(indice)
+    return faltantes
+
+
+def crear_indices_faltantes(engine) -> List[str]:
+    """Crea en las tablas existentes los índices de los modelos que les faltan.
+
+    Puede tardar minutos en tablas grandes (el FULLTEXT de ``incidente``), por eso
+    no se ejecuta al arrancar sino con ``python -m app.indices``. Retorna los
+    nombres de los índices creados.
+    """
+    creados = []
+    for indice in indices_faltantes(engine):
+        logger.info("Creando índice faltante", extra={"tabla": indice.table.name, "indice": indice.name})
+        with engine.begin() as conn:
+            indice.create(conn, checkfirst=True)
+        creados.append(indice.name)
+    return creados
+
+
+def precalentar_conexiones(engine, redis_client: Optional[Redis] = None, cantidad: int = 1):
+    """Abre ``cantidad`` conexiones a la base de datos y a Redis y las deja en sus pools."""
+    if cantidad <= 0:
+        return
+    with ExitStack() as pila:
+        for _ in range(cantidad):
+            conn = pila.enter_context(engine.connect())
+            conn.exec_driver_sql("SELECT 1")
+    if redis_client is not None:
+        pool = redis_client.connection_pool
+        conexiones = [pool.get_connection("PING") for _ in range(cantidad)]
+        try:
+            for conexion in conexiones:
+                conexion.send_command("PING")
+                conexion.read_response()
+        finally:
+            for conexion in conexiones:
+                pool.release(conexion)
+
+
+def preparar_recursos():
+    """Crea engines y Redis, sincroniza el esquema si cambió y precalienta las conexiones."""
+    engine, engine_replica = obtener_engine(), obtener_engine_replica()
+    sincronizar_esquemas()
+    precalentar_conexiones(engine, obtener_redis(), config.PRECALENTAR_CONEXIONES)
+    precalentar_conexiones(engine_replica, cantidad=config.PRECALENTAR_CONEXIONES)
+    detener = threading.Event()
+    hilo = threading.Thread(target=_preparar_cache, args=(engine_replica, obtener_redis(), detener),
+                            name="preparar-cache", daemon=True)
+    _preparacion_cache.update(hilo=hilo, detener=detener)
+    hilo.start()
+
+
+_preparacion_cache = {}
+
+
+def _construir_filtro(engine, redis_client: Redis):
+    try:
+        construir_filtro_radicados(engine, redis_client)
+    except Exception as e:
+        logger.warning("No se pudo construir el filtro de radicados", extra={"error": str(e)})
+
+
+def _preparar_cache(engine, redis_client: Redis, detener: threading.Event):
+    # Ni el filtro ni el precalentamiento son necesarios para atender, así que no retrasan el arranque
+    _construir_filtro(engine, redis_client)
+    if config.CACHE_PRECALENTAR:
+        try:
+            resumen = precalentar_cache(engine, redis_client,
+                                        filas_por_segundo=config.CACHE_PRECALENTAR_FILAS_POR_SEGUNDO,
+                                        dias_recientes=config.CACHE_PRECALENTAR_DIAS)
+            if resumen is not None:
+                logger.info("Caché precalentada", extra=resumen)
+        except Exception as e:
+            logger.warning("No se pudo precalentar la caché", extra={"error": str(e)})
+    # El filtro se renueva antes de que venza (ver app/filtro_negativo.py)
+    while config.FILTRO_RADICADOS_HABILITADO and not detener.wait(config.FILTRO_RADICADOS_VIGENCIA_S / 2):
+        _construir_filtro(engine, redis_client)
+
+
+def detener_preparacion_cache():
+    """Detiene el hilo de preparación de caché y espera a que termine."""
+    detener = _preparacion_cache.pop("detener", None)
+    if detener is not None:
+        detener.set()
+        _preparacion_cache.pop("hilo").join(timeout=5)
+
+
+def liberar_recursos():
+    detener_preparacion_cache()
+    with _recursos_lock:
+        for nombre in ("engine", "engine_replica"):
+            if nombre in _recursos:
+                _recursos.pop(nombre).dispose()
+        redis = _recursos.pop("redis_client", None)
+    if redis is not None:
+        redis.connection_pool.disconnect()
+
+
+async def precalentar_redis_async(cantidad: int):
+    pool = obtener_redis_async().connection_pool
+    conexiones = [await pool.get_connection("PING") for _ in range(cantidad)]
+    try:
+        for conexion in conexiones:
+            await conexion.send_command("PING")
+            await conexion.read_response()
+    finally:
+        for conexion in conexiones:
+            await pool.release(conexion)
+
+
+async def cerrar_redis_async():
+    with _recursos_lock:
+        redis = _recursos.pop("redis_async", None)
+    if redis is not None:
+        await redis.aclose()
+        await redis.connection_pool.disconnect()
 
 
+# El cupo de concurrencia de la base se toma al sacar la conexión del pool (ver
+# PoolLimitado), no durante toda la petición
 def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+    with Session(obtener_engine()) as session:
         yield session
 
 
 def get_session_replica() -> Generator[Session, None, None]:
-    with Session(engine_replica) as session:
+    with Session(obtener_engine_replica()) as session:
         yield session
 
 
+def get_fabrica_sesiones_replica() -> Callable[[], Session]:
+    """Para respuestas en streaming: siguen consultando después de cerrar las dependencias."""
+    return lambda: Session(obtener_engine_replica())
+
+
 def get_redis_client() -> Redis:
-    return redis_client
+    return obtener_redis()
+
+
+def get_redis_async() -> AsyncRedis:
+    return obtener_redis_async()
 
 
 def create_incidente_cache(incidente: Incidente, session: Session, redis_client: Redis):
@@ -69,16 +390,21 @@ def create_incidente_cache(incidente: Incidente, session: Session, redis_client:
         if not incidente.radicado:
             incidente.radicado = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(8))
         session.add(incidente)
-        session.commit()
-        session.refresh(incidente)
-
-        incidente_json = incidente.model_dump_json()
-        redis_client.set(f"incidente:{incidente.id}", incidente_json)
+        with span("db.commit", tabla="incidente"):
+            session.commit()
+        with span("db.refresh", tabla="incidente"):
+            session.refresh(incidente)
+
+        with span("redis.set", clave="incidente:{id}"):
+            redis_client.set(f"incidente:{incidente.id}", codificar(incidente))
+        registrar_creacion(redis_client, incidente)
         return incidente
     except Exception as e:
         session.rollback()
         if session_replica:
             session_replica.rollback()
+        if isinstance(e, DependenciaSaturada):
+            raise
         raise Exception(f"Error al crear incidente: {str(e)}")
     finally:
         session.close()
@@ -86,16 +412,32 @@ def create_incidente_cache(incidente: Incidente, session: Session, redis_client:
             session_replica.close()
 
 
+def _desarchivar(archivado: Optional[IncidenteArchivado]) -> Optional[Incidente]:
+    return Incidente(**archivado.model_dump()) if archivado else None
+
+
+def incidente_archivado(session: Session, incidente_id) -> Optional[Incidente]:
+    """Busca en la tabla fría un incidente que ya no está en ``incidente`` (ver app/archivo.py)."""
+    return _desarchivar(session.get(IncidenteArchivado, incidente_id))
+
+
+def incidente_archivado_por_radicado(session: Session, radicado: str) -> Optional[Incidente]:
+    return _desarchivar(session.exec(
+        select(IncidenteArchivado).where(IncidenteArchivado.radicado == radicado)).scalars().first())
+
+
 def obtener_incidente_cache(incidente_id, session, redis_client):
     incidente = redis_client.get(f"incidente:{incidente_id}")
     if incidente:
-        return json.loads(incidente)
+        CACHE_CONSULTAS.inc("id", "hit")
+        return decodificar(incidente)
     else:
-        incidente = session.get(Incidente, incidente_id)
+        CACHE_CONSULTAS.inc("id", "miss")
+        incidente = session.get(Incidente, incidente_id) or incidente_archivado(session, incidente_id)
         if incidente:
-            incidente_json = incidente.model_dump_json()
-            redis_client.set(f"incidente:{incidente_id}", incidente_json)
-            return incidente_json
+            valor = codificar(incidente)
+            redis_client.set(f"incidente:{incidente_id}", valor)
+            return decodificar(valor)
         return None
 
 
@@ -103,19 +445,97 @@ def obtener_incidente_por_radicado(radicado: str, session: Session, redis_client
     incidente = redis_client.get(f"incidente:radicado:{radicado}")
     
     if incidente:
-        incidente_data = json.loads(incidente)
+        CACHE_CONSULTAS.inc("radicado", "hit")
+        incidente_data = decodificar(incidente)
         return Incidente(**incidente_data) 
     
     else:
-        incidente = session.query(Incidente).filter_by(radicado=radicado).first()
+        CACHE_CONSULTAS.inc("radicado", "miss")
+        incidente = (session.query(Incidente).filter_by(radicado=radicado).first()
+                     or _desarchivar(session.query(IncidenteArchivado).filter_by(radicado=radicado).first()))
         
         if incidente:
-            incidente_json = incidente.model_dump_json()
-            redis_client.set(f"incidente:radicado:{radicado}", incidente_json)
+            redis_client.set(f"incidente:radicado:{radicado}", codificar(incidente))
             return incidente
         return None
     
 
+async def create_incidente_cache_async(incidente: Incidente, session: Session, redis_async: AsyncRedis):
+    try:
+        if not incidente.radicado:
+            incidente.radicado = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(8))
+        session.add(incidente)
+        with span("db.commit", tabla="incidente"):
+            session.commit()
+        # Ya confirmado: un 503 haría que el cliente reintente y duplique el incidente
+        with sin_rechazos():
+            with span("db.refresh", tabla="incidente"):
+                session.refresh(incidente)
+
+            with span("redis.set", clave="incidente:{id}"):
+                await redis_async.set(f"incidente:{incidente.id}", codificar(incidente),
+                                      ex=config.INCIDENTE_CACHE_TTL or None)
+            await registrar_creacion_async(redis_async, incidente)
+        return incidente
+    except Exception as e:
+        session.rollback()
+        if isinstance(e, DependenciaSaturada):
+            raise
+        raise Exception(f"Error al crear incidente: {str(e)}")
+    finally:
+        session.close()
+
+
+async def obtener_incidente_cache_async(incidente_id, session: Session, redis_async: AsyncRedis):
+    async def cargar():
+        if await ausente_seguro(redis_async, "id", incidente_id):
+            return None
+        incidente = session.get(Incidente, incidente_id) or incidente_archivado(session, incidente_id)
+        if incidente is None:
+            await recordar_ausente(redis_async, "id", incidente_id)
+            return None
+        return codificar(incidente)
+
+    valor = await carga_unica.obtener(redis_async, "id", f"incidente:{incidente_id}", cargar)
+    return decodificar(valor) if valor else None
+
+
+async def obtener_incidente_por_radicado_async(radicado: str, session: Session, redis_async: AsyncRedis):
+    async def cargar():
+        if await ausente_seguro(redis_async, "radicado", radicado):
+            return None
+        incidente = (session.exec(select(Incidente).where(Incidente.radicado == radicado)).scalars().first()
+                     or incidente_archivado_por_radicado(session, radicado))
+        if incidente is None:
+            await recordar_ausente(redis_async, "radicado", radicado)
+            return None
+        return codificar(incidente)
+
+    valor = await carga_unica.obtener(redis_async, "radicado", f"incidente:radicado:{radicado}", cargar)
+    return Incidente(**decodificar(valor)) if valor else None
+
+
+async def marcar_incidente_modificado_async(incidente: Incidente, redis_async: AsyncRedis,
+                                           guardar_cache: bool = True):
+    """Renueva las versiones (ETag) del incidente y de los listados que lo contienen.
+
+    ``incidente`` viene de la primaria y se cachea antes de publicar la versión: si
+    la clave solo se borrara, el lector que la llenara desde la réplica atrasada
+    dejaría el cuerpo anterior bajo el ETag nuevo (ver ``ConsumidorReplica``).
+    """
+    version = nueva_version()
+    async with redis_async.pipeline(transaction=False) as pipe:
+        if guardar_cache:
+            valor = codificar(incidente)
+            for clave in (f"incidente:{incidente.id}", f"incidente:radicado:{incidente.radicado}"):
+                pipe.set(clave, valor, ex=config.INCIDENTE_CACHE_TTL or None)
+        # El pipeline conserva el orden: el cuerpo queda cacheado antes de publicar la versión
+        for clave in (clave_version_incidente(incidente.id), clave_version_incidentes(incidente.cliente_id),
+                      clave_version_incidentes(None)):
+            pipe.set(clave, version)
+        await pipe.execute()
+
+
 def custom_serializer(obj): #
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
@@ -129,16 +549,30 @@ def publish_message(data, topic):
         publisher = pubsub_v1.PublisherClient()
         topic_path = publisher.topic_path(config.PROJECT_ID, topic)
         message_data = json.dumps(data, default=custom_serializer).encode("utf-8")
-        future = publisher.publish(topic_path, message_data)
-        message_id = future.result()
+        with PUBSUB_DURACION.cronometrar(topic), span("pubsub.publish", topic=topic):
+            future = publisher.publish(topic_path, message_data)
+            message_id = future.result()
         return message_id
     
 
-def create_problema_comun(problema: ProblemaComun, session: Session):
+def create_problema_comun(problema: ProblemaComun, session: Session, redis_client: Optional[Redis] = None):
     try:
         session.add(problema)
         session.commit()
         session.refresh(problema)
+        if redis_client is None:
+            indexar_problema_comun(problema)
+        else:
+            # Los catálogos de la nueva versión se llenan desde la primaria antes de
+            # publicarla: si los llenara un lector, la réplica atrasada podría dejar el
+            # catálogo anterior cacheado bajo el ETag nuevo durante SOLUCIONES_CACHE_TTL
+            version = nueva_version()
+            for cliente_id in (problema.cliente_id, None):
+                guardar_catalogo_cacheado(cliente_id, version, obtener_problemas_comunes(session, cliente_id),
+                                          redis_client)
+            incrementar_version(redis_client, clave_version_soluciones(problema.cliente_id),
+                                clave_version_soluciones(None), version=version)
+            indexar_problema_comun(problema, version)
         return problema
     except Exception as e:
         session.rollback()
@@ -147,8 +581,21 @@ def create_problema_comun(problema: ProblemaComun, session: Session):
         session.close()
 
 
-def obtener_problemas_comunes(session: Session):
-    return session.query(ProblemaComun).all()
+def obtener_problemas_comunes(session: Session, cliente_id: Optional[int] = None):
+    statement = select(ProblemaComun)
+    if cliente_id is not None:
+        statement = statement.where(ProblemaComun.cliente_id == cliente_id)
+    return session.exec(statement).scalars().all()
+
+
+def obtener_catalogo_cacheado(cliente_id: Optional[int], version: str, redis_client: Redis) -> Optional[bytes]:
+    return redis_client.get(clave_catalogo_soluciones(cliente_id, version))
+
+
+def guardar_catalogo_cacheado(cliente_id: Optional[int], version: str, problemas: List[ProblemaComun], redis_client: Redis) -> bytes:
+    catalogo = json.dumps([p.model_dump(mode="json") for p in problemas]).encode()
+    redis_client.set(clave_catalogo_soluciones(cliente_id, version), catalogo, ex=config.SOLUCIONES_CACHE_TTL)
+    return catalogo
 
 
 def actualizar_incidente(incidente_existente: Incidente, event_data, session: Session):
@@ -157,8 +604,10 @@ def actualizar_incidente(incidente_existente: Incidente, event_data, session: Se
         incidente_existente.estado = "cerrado"
         incidente_existente.fecha_cierre = date.today()
         session.add(incidente_existente)
-        session.commit()
-        session.refresh(incidente_existente)
+        with span("db.commit", tabla="incidente"):
+            session.commit()
+        with sin_rechazos():
+            session.refresh(incidente_existente)
 
         return incidente_existente
     except Exception as e:
@@ -178,7 +627,8 @@ def registrar_log_incidente(incidente: Incidente, origen_cambio: str, session: S
         )
 
         session.add(log)
-        session.commit()
+        with span("db.commit", tabla="logincidente"):
+            session.commit()
     except Exception as e:
         session.rollback()
         raise Exception(f"Error al registrar log del incidente: {str(e)}")
@@ -188,6 +638,10 @@ def obtener_logs_por_incidente(incidente_id: int, session: Session) -> List[LogI
     try:
         statement = select(LogIncidente).where(LogIncidente.incidente_id == incidente_id).order_by(LogIncidente.fecha_cambio)
         logs = session.exec(statement).all()
+        if not logs:
+            statement = (select(LogIncidenteArchivado).where(LogIncidenteArchivado.incidente_id == incidente_id)
+                         .order_by(LogIncidenteArchivado.fecha_cambio))
+            logs = [LogIncidente(**log.model_dump()) for log in session.exec(statement).scalars().all()]
         return logs
     except Exception as e:
         raise Exception(f"Error al obtener logs: {str(e)}")
\ No newline at end of file
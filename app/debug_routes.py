@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app.consultas_lentas import obtener_plan, registro_consultas_lentas
+from app.perfilador import listar_perfiles, ruta_perfil
+from app.security import verificar_acceso_interno
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(verificar_acceso_interno)], include_in_schema=False)
+
+
+@router.get("/slow-queries")
+def listar_consultas_lentas(explain: bool = False, limite: int = 50):
+    consultas = registro_consultas_lentas.listar()[:limite]
+    if explain:
+        for consulta in consultas:
+            obtener_plan(consulta)
+    return [consulta.a_dict() for consulta in consultas]
+
+
+@router.delete("/slow-queries", status_code=204)
+def limpiar_consultas_lentas():
+    registro_consultas_lentas.limpiar()
+
+
+@router.get("/profiles")
+def listar_perfiles_guardados():
+    return listar_perfiles()
+
+
+@router.get("/profiles/{nombre}")
+def descargar_perfil(nombre: str):
+    ruta = ruta_perfil(nombre)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="application/octet-stream", filename=nombre)
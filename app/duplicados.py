@@ -0,0 +1,201 @@
+import hashlib
+import struct
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from redis import Redis
+
+from app import config
+from app.texto import normalizar_texto, tokenizar
+
+# Firma MinHash de 64 funciones hash dividida en 16 bandas de 4 filas: dos textos
+# con similitud de Jaccard 0.8 comparten al menos una banda con probabilidad > 0.99.
+# Las 64 funciones salen de un único digest SHAKE-128 por shingle, de modo que el
+# costo es una llamada a hashlib por shingle y los mínimos se calculan en C.
+NUM_PERMUTACIONES = 64
+FILAS_POR_BANDA = 4
+TAMANO_SHINGLE = 4
+_FORMATO_FIRMA = f"<{NUM_PERMUTACIONES}I"
+_desempacar = struct.Struct(_FORMATO_FIRMA).unpack
+
+Firma = Tuple[int, ...]
+
+
+def shingles(texto: str) -> Set[bytes]:
+    normalizado = (" ".join(tokenizar(texto)) or normalizar_texto(texto or "").strip()).encode()
+    if len(normalizado) <= TAMANO_SHINGLE:
+        return {normalizado} if normalizado else set()
+    return {normalizado[i:i + TAMANO_SHINGLE] for i in range(len(normalizado) - TAMANO_SHINGLE + 1)}
+
+
+def calcular_firma(texto: str) -> Optional[Firma]:
+    valores = shingles(texto)
+    if not valores:
+        return None
+    filas = [_desempacar(hashlib.shake_128(shingle).digest(NUM_PERMUTACIONES * 4)) for shingle in valores]
+    return tuple(map(min, zip(*filas)))
+
+
+def similitud(firma_a: Firma, firma_b: Firma) -> float:
+    return sum(1 for a, b in zip(firma_a, firma_b) if a == b) / NUM_PERMUTACIONES
+
+
+def bandas(firma: Firma) -> List[str]:
+    formato = f"<{FILAS_POR_BANDA}I"
+    return [f"{i}:{zlib.crc32(struct.pack(formato, *firma[i * FILAS_POR_BANDA:(i + 1) * FILAS_POR_BANDA])):x}"
+            for i in range(NUM_PERMUTACIONES // FILAS_POR_BANDA)]
+
+
+class DetectorDuplicados(ABC):
+    """Índice LSH de firmas MinHash de los incidentes abiertos recientes de cada cliente."""
+
+    def __init__(self, umbral: float, ventana_segundos: int):
+        self.umbral = umbral
+        self.ventana_segundos = ventana_segundos
+
+    def buscar(self, cliente_id: int, texto: str, redis_client: Redis) -> Optional[Tuple[int, float]]:
+        """Retorna ``(incidente_id, similitud)`` del incidente más parecido sobre el umbral."""
+        firma = calcular_firma(texto)
+        if firma is None:
+            return None
+        mejor = None
+        for incidente_id, firma_candidato in self._candidatos(cliente_id, bandas(firma), redis_client):
+            valor = similitud(firma, firma_candidato)
+            if valor >= self.umbral and (mejor is None or valor > mejor[1]):
+                mejor = (incidente_id, valor)
+        return mejor
+
+    def registrar(self, cliente_id: int, incidente_id: int, texto: str, redis_client: Redis):
+        firma = calcular_firma(texto)
+        if firma is not None:
+            self._guardar(cliente_id, incidente_id, firma, redis_client)
+
+    @abstractmethod
+    def _candidatos(self, cliente_id, claves_bandas, redis_client) -> List[Tuple[int, Firma]]:
+        ...
+
+    @abstractmethod
+    def _guardar(self, cliente_id, incidente_id, firma, redis_client):
+        ...
+
+    @abstractmethod
+    def descartar(self, cliente_id: int, incidente_id: int, redis_client: Redis):
+        ...
+
+    def reiniciar(self):
+        """Olvida las firmas guardadas en el proceso; en Redis expiran solas."""
+
+
+class DetectorDuplicadosMemoria(DetectorDuplicados):
+    """Guarda las firmas en el proceso; los incidentes fuera de la ventana se olvidan al consultar."""
+
+    def __init__(self, umbral: float, ventana_segundos: int):
+        super().__init__(umbral, ventana_segundos)
+        self._clientes: Dict[int, Tuple[Dict[str, Set[int]], "OrderedDict[int, Tuple[Firma, float]]"]] = {}
+        self._lock = threading.Lock()
+
+    def _estado(self, cliente_id):
+        estado = self._clientes.get(cliente_id)
+        if estado is None:
+            estado = self._clientes[cliente_id] = ({}, OrderedDict())
+        return estado
+
+    def _expirar(self, cliente_id):
+        buckets, firmas = self._estado(cliente_id)
+        limite = time.monotonic() - self.ventana_segundos
+        while firmas:
+            incidente_id, (_, registrado) = next(iter(firmas.items()))
+            if registrado >= limite:
+                break
+            self._eliminar(cliente_id, incidente_id)
+
+    def _eliminar(self, cliente_id, incidente_id):
+        buckets, firmas = self._estado(cliente_id)
+        entrada = firmas.pop(incidente_id, None)
+        if entrada is None:
+            return
+        for clave in bandas(entrada[0]):
+            bucket = buckets.get(clave)
+            if bucket is not None:
+                bucket.discard(incidente_id)
+                if not bucket:
+                    del buckets[clave]
+
+    def _candidatos(self, cliente_id, claves_bandas, redis_client):
+        with self._lock:
+            self._expirar(cliente_id)
+            buckets, firmas = self._estado(cliente_id)
+            ids = set()
+            for clave in claves_bandas:
+                ids.update(buckets.get(clave, ()))
+            return [(incidente_id, firmas[incidente_id][0]) for incidente_id in ids]
+
+    def _guardar(self, cliente_id, incidente_id, firma, redis_client):
+        with self._lock:
+            self._eliminar(cliente_id, incidente_id)
+            buckets, firmas = self._estado(cliente_id)
+            firmas[incidente_id] = (firma, time.monotonic())
+            for clave in bandas(firma):
+                buckets.setdefault(clave, set()).add(incidente_id)
+
+    def descartar(self, cliente_id, incidente_id, redis_client):
+        with self._lock:
+            self._eliminar(cliente_id, incidente_id)
+
+    def reiniciar(self):
+        with self._lock:
+            self._clientes.clear()
+
+
+class DetectorDuplicadosRedis(DetectorDuplicados):
+    """Guarda buckets y firmas en Redis para compartirlos entre instancias; expiran con la ventana."""
+
+    def _clave_bucket(self, cliente_id, clave_banda):
+        return f"duplicados:{cliente_id}:{clave_banda}"
+
+    def _clave_firma(self, incidente_id):
+        return f"duplicados:firma:{incidente_id}"
+
+    def _candidatos(self, cliente_id, claves_bandas, redis_client):
+        pipe = redis_client.pipeline(transaction=False)
+        for clave in claves_bandas:
+            pipe.smembers(self._clave_bucket(cliente_id, clave))
+        ids = sorted({int(i) for miembros in pipe.execute() for i in miembros})
+        if not ids:
+            return []
+        firmas = redis_client.mget([self._clave_firma(i) for i in ids])
+        return [(incidente_id, struct.unpack(_FORMATO_FIRMA, firma))
+                for incidente_id, firma in zip(ids, firmas) if firma is not None]
+
+    def _guardar(self, cliente_id, incidente_id, firma, redis_client):
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.set(self._clave_firma(incidente_id), struct.pack(_FORMATO_FIRMA, *firma), ex=self.ventana_segundos)
+        for clave in bandas(firma):
+            clave_bucket = self._clave_bucket(cliente_id, clave)
+            pipe.sadd(clave_bucket, incidente_id)
+            pipe.expire(clave_bucket, self.ventana_segundos)
+        pipe.execute()
+
+    def descartar(self, cliente_id, incidente_id, redis_client):
+        # Los buckets pueden conservar el id hasta expirar; sin firma el candidato se ignora.
+        redis_client.delete(self._clave_firma(incidente_id))
+
+
+def crear_detector() -> DetectorDuplicados:
+    ventana = config.DUPLICADOS_VENTANA_HORAS * 3600
+    # En memoria cada proceso solo ve sus propios incidentes: con varios workers o
+    # instancias la mayoría de los duplicados pasarían sin detectarse
+    if config.DUPLICADOS_ALMACEN == "redis" or (config.DUPLICADOS_ALMACEN == "auto" and config.REDIS_SERVICE_NAME):
+        return DetectorDuplicadosRedis(config.DUPLICADOS_UMBRAL, ventana)
+    return DetectorDuplicadosMemoria(config.DUPLICADOS_UMBRAL, ventana)
+
+
+detector_duplicados = crear_detector()
+
+
+def duplicados_activos() -> bool:
+    return config.DUPLICADOS_MODO in ("marcar", "fusionar")
@@ -0,0 +1,109 @@
+import csv
+import io
+import zlib
+from datetime import date
+from typing import Callable, Iterator, List, Optional
+
+from sqlmodel import Session, select
+
+from app.models import Categoria, Estado, Incidente
+
+CAMPOS_EXPORTACION = list(Incidente.model_fields)
+TIPOS_CONTENIDO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class FiltrosExportacion:
+    def __init__(self, cliente_id: Optional[int] = None, estado: Optional[Estado] = None,
+                 categoria: Optional[Categoria] = None, desde: Optional[date] = None,
+                 hasta: Optional[date] = None):
+        self.cliente_id = cliente_id
+        self.estado = estado
+        self.categoria = categoria
+        self.desde = desde
+        self.hasta = hasta
+
+    def aplicar(self, statement):
+        if self.cliente_id is not None:
+            statement = statement.where(Incidente.cliente_id == self.cliente_id)
+        if self.estado is not None:
+            statement = statement.where(Incidente.estado == self.estado)
+        if self.categoria is not None:
+            statement = statement.where(Incidente.categoria == self.categoria)
+        if self.desde is not None:
+            statement = statement.where(Incidente.fecha_creacion >= self.desde)
+        if self.hasta is not None:
+            statement = statement.where(Incidente.fecha_creacion <= self.hasta)
+        return statement
+
+
+def iterar_lotes(session: Session, filtros: FiltrosExportacion, cursor: int = 0,
+                 tamano_lote: int = 1000) -> Iterator[List[Incidente]]:
+    """Recorre los incidentes en orden de id con paginación por llave (``id > cursor``).
+
+    Cada lote es una consulta acotada, así que la memoria no crece con el tamaño
+    de la tabla y la exportación puede retomarse desde el último id recibido.
+    """
+    while True:
+        statement = filtros.aplicar(
+            select(Incidente).where(Incidente.id > cursor)).order_by(Incidente.id).limit(tamano_lote)
+        lote = session.exec(statement).all()
+        if not lote:
+            return
+        cursor = lote[-1].id
+        yield lote
+        # Evita que el identity map de la sesión acumule todas las filas exportadas
+        session.expunge_all()
+        if len(lote) < tamano_lote:
+            return
+
+
+def _formatear_ndjson(lote: List[Incidente], incluir_encabezado: bool) -> bytes:
+    return "".join(incidente.model_dump_json() + "\n" for incidente in lote).encode()
+
+
+def _formatear_csv(lote: List[Incidente], incluir_encabezado: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if incluir_encabezado:
+        writer.writerow(CAMPOS_EXPORTACION)
+    for incidente in lote:
+        fila = incidente.model_dump(mode="json")
+        writer.writerow(["" if fila[campo] is None else fila[campo] for campo in CAMPOS_EXPORTACION])
+    return buffer.getvalue().encode()
+
+
+FORMATEADORES = {
+    "ndjson": _formatear_ndjson,
+    "csv": _formatear_csv,
+}
+
+
+def generar_exportacion(abrir_sesion: Callable[[], Session], formato: str, filtros: FiltrosExportacion,
+                        cursor: int = 0, tamano_lote: int = 1000, comprimir: bool = False) -> Iterator[bytes]:
+    """Genera la exportación con una sesión propia.
+
+    La sesión de la petición ya está cerrada cuando el cuerpo se transmite, así que
+    el generador abre la suya y la cierra tras cada lote: la conexión (y con ella el
+    cupo de la réplica) vuelve al pool mientras el cliente consume el bloque.
+    """
+    formatear = FORMATEADORES[formato]
+    compresor = zlib.compressobj(wbits=31) if comprimir else None
+    session = abrir_sesion()
+    try:
+        if formato == "csv" and cursor == 0:
+            # El encabezado sale antes de la primera consulta para que los primeros bytes lleguen de inmediato
+            bloque = formatear([], True)
+            yield compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH) if compresor else bloque
+        for lote in iterar_lotes(session, filtros, cursor, tamano_lote):
+            bloque = formatear(lote, False)
+            session.close()
+            if compresor:
+                bloque = compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH)
+            yield bloque
+        if compresor:
+            yield compresor.flush()
+    finally:
+        session.close()
@@ -1,7 +1,11 @@
 import httpx
+from app import config
+from app.concurrencia import limites
+from app.metricas import HTTP_SALIENTE_DURACION
+from app.trazas import encabezados_propagacion
 
 async def registrar_incidente_facturado(radicado_incidente: str, costo: float, fecha_incidente: str, cliente_id: int):
-    url = "https://ms-facturacion-345518488840.us-central1.run.app/incidentes"
+    url = f"{config.URL_SERVICE_FACTURACION}/incidentes"
     payload = {
         "radicado_incidente": radicado_incidente,
         "costo": costo,
@@ -9,8 +13,9 @@ async def registrar_incidente_facturado(radicado_incidente: str, costo: float, f
         "cliente_id": cliente_id
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload,  timeout=10.0)
+    async with httpx.AsyncClient(headers=encabezados_propagacion()) as client:
+        with limites["facturacion"].adquirir(), HTTP_SALIENTE_DURACION.cronometrar("facturacion"):
+            response = await client.post(url, json=payload,  timeout=10.0)
         if response.status_code != 200:
             raise Exception(f"Error al registrar incidente facturado: {response.text}")
         return response.json()
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Búsquedas negativas: respuestas 404 sin consultar la base de datos.
+
+Dos capas, consultadas solo cuando falta la clave positiva en la caché:
+
+* marcas de ausencia ``incidente:ausente:<tipo>:<valor>`` con ``CACHE_NEGATIVO_TTL``,
+  que se escriben tras una consulta sin resultado. Se borran al crear el incidente
+  y cuando el consumidor de la réplica aplica la fila, porque la consulta pudo leer
+  una réplica atrasada después del borrado. Por la misma razón no se escribe la
+  marca de un radicado que el filtro ya tiene: se acaba de crear;
+* un filtro de Bloom de todos los radicados emitidos, guardado como bitmap de
+  Redis (``SETBIT``/``GETBIT``). Se construye al arrancar desde la réplica y se
+  actualiza en cada creación. Si un radicado no está en el filtro, seguro no existe.
+
+El filtro solo se usa cuando está completo y vigente. El bit ``FILTRO_RADICADOS_BITS``
+(fuera del rango de las funciones hash) marca el fin de la construcción; como vive
+en la misma clave, si Redis pierde el bitmap también pierde la marca. Las filas
+insertadas sin pasar por ``registrar_creacion`` (cargas directas, scripts) no
+están en el filtro, así que además se exige ``<clave>:vigente``, que expira a los
+``FILTRO_RADICADOS_VIGENCIA_S`` segundos. Cada worker intenta reconstruir el filtro
+a la mitad de ese plazo; el candado hace que lo haga solo uno.
+"""
+import hashlib
+import logging
+import secrets
+from typing import Iterable, List
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import select
+
+from app import config
+from app.metricas import CACHE_CONSULTAS
+from app.models import Incidente, IncidenteArchivado
+
+logger = logging.getLogger(__name__)
+
+_LOTE_CONSTRUCCION = 5000
+_CANDADO_CONSTRUCCION_MS = 10 * 60 * 1000
+
+
+def clave_filtro() -> str:
+    # El tamaño forma parte de la clave: cambiarlo obliga a construir un filtro nuevo
+    return f"filtro:radicados:{config.FILTRO_RADICADOS_BITS}:{config.FILTRO_RADICADOS_HASHES}"
+
+
+def clave_vigencia() -> str:
+    return f"{clave_filtro()}:vigente"
+
+
+def clave_ausente(tipo: str, valor) -> str:
+    return f"incidente:ausente:{tipo}:{valor}"
+
+
+def posiciones(radicado: str) -> List[int]:
+    """Bits del radicado por doble hashing (Kirsch-Mitzenmacher) sobre un solo BLAKE2b.
+
+    Se ignoran mayúsculas porque la colación de MySQL también las ignora al buscar.
+    """
+    digest = hashlib.blake2b(radicado.lower().encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % config.FILTRO_RADICADOS_BITS for i in range(config.FILTRO_RADICADOS_HASHES)]
+
+
+def agregar_radicados(pipe, radicados: Iterable[str]):
+    clave = clave_filtro()
+    for radicado in radicados:
+        for posicion in posiciones(radicado):
+            pipe.setbit(clave, posicion, 1)
+
+
+def registrar_creacion(redis_client: Redis, incidente: Incidente):
+    """Agrega el radicado al filtro y borra las marcas de ausencia del incidente nuevo."""
+    pipe = redis_client.pipeline(transaction=False)
+    agregar_radicados(pipe, [incidente.radicado])
+    pipe.delete(clave_ausente("id", incidente.id), clave_ausente("radicado", incidente.radicado))
+    pipe.execute()
+
+
+async def registrar_creacion_async(redis_async: AsyncRedis, incidente: Incidente):
+    async with redis_async.pipeline(transaction=False) as pipe:
+        agregar_radicados(pipe, [incidente.radicado])
+        pipe.delete(clave_ausente("id", incidente.id), clave_ausente("radicado", incidente.radicado))
+        await pipe.execute()
+
+
+async def ausente_seguro(redis_async: AsyncRedis, tipo: str, valor) -> bool:
+    """``True`` si se sabe que el incidente no existe, con una sola ida a Redis."""
+    usar_filtro = tipo == "radicado" and config.FILTRO_RADICADOS_HABILITADO
+    async with redis_async.pipeline(transaction=False) as pipe:
+        pipe.exists(clave_ausente(tipo, valor))
+        if usar_filtro:
+            clave = clave_filtro()
+            pipe.exists(clave_vigencia())
+            pipe.getbit(clave, config.FILTRO_RADICADOS_BITS)
+            for posicion in posiciones(valor):
+                pipe.getbit(clave, posicion)
+        respuesta = await pipe.execute()
+
+    if respuesta[0]:
+        CACHE_CONSULTAS.inc(tipo, "negative")
+        return True
+    if usar_filtro and respuesta[1] and respuesta[2] and not all(respuesta[3:]):
+        CACHE_CONSULTAS.inc(tipo, "filtered")
+        return True
+    return False
+
+
+async def recordar_ausente(redis_async: AsyncRedis, tipo: str, valor):
+    if config.CACHE_NEGATIVO_TTL <= 0:
+        return
+    if tipo == "radicado" and config.FILTRO_RADICADOS_HABILITADO:
+        # Si el filtro lo tiene, lo más probable es que se acabe de crear y la réplica no lo tenga aún
+        async with redis_async.pipeline(transaction=False) as pipe:
+            for posicion in posiciones(valor):
+                pipe.getbit(clave_filtro(), posicion)
+            if all(await pipe.execute()):
+                return
+    await redis_async.set(clave_ausente(tipo, valor), b"1", ex=config.CACHE_NEGATIVO_TTL)
+
+
+def borrar_ausentes(pipe, incidentes: Iterable[dict]):
+    """Agrega a ``pipe`` el borrado de las marcas de ausencia de ``incidentes`` (filas como dict)."""
+    claves = [clave for incidente in incidentes
+              for clave in (clave_ausente("id", incidente["id"]), clave_ausente("radicado", incidente["radicado"]))]
+    if claves:
+        pipe.delete(*claves)
+
+
+def construir_filtro_radicados(engine, redis_client: Redis) -> bool:
+    """Carga todos los radicados en el filtro; retorna ``True`` si esta llamada lo construyó.
+
+    Solo un proceso construye a la vez (candado ``<clave>:construccion``) y no se
+    reconstruye un filtro completo y vigente. La reconstrucción es sobre la misma
+    clave (``SETBIT`` es idempotente), así que el filtro anterior sigue sirviendo
+    mientras tanto y las creaciones concurrentes no se pierden.
+    """
+    if not config.FILTRO_RADICADOS_HABILITADO:
+        return False
+    clave = clave_filtro()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.getbit(clave, config.FILTRO_RADICADOS_BITS)
+    pipe.exists(clave_vigencia())
+    if all(pipe.execute()):
+        return False
+    token = secrets.token_hex(8)
+    if not redis_client.set(f"{clave}:construccion", token, nx=True, px=_CANDADO_CONSTRUCCION_MS):
+        return False
+    try:
+        total = 0
+        with engine.connect() as conn:
+            # Los archivados también se buscan por radicado, así que deben estar en el filtro
+            for modelo in (Incidente, IncidenteArchivado):
+                ultimo_id = 0
+                while True:
+                    filas = conn.execute(
+                        select(modelo.id, modelo.radicado).where(modelo.id > ultimo_id)
+                        .order_by(modelo.id).limit(_LOTE_CONSTRUCCION)).all()
+                    if not filas:
+                        break
+                    pipe = redis_client.pipeline(transaction=False)
+                    agregar_radicados(pipe, (radicado for _, radicado in filas))
+                    pipe.execute()
+                    total += len(filas)
+                    ultimo_id = filas[-1][0]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setbit(clave, config.FILTRO_RADICADOS_BITS, 1)
+        pipe.set(clave_vigencia(), b"1", ex=config.FILTRO_RADICADOS_VIGENCIA_S)
+        pipe.execute()
+        logger.info("Filtro de radicados construido", extra={"radicados": total})
+        return True
+    finally:
+        if redis_client.get(f"{clave}:construccion") == token.encode():
+            redis_client.delete(f"{clave}:construccion")
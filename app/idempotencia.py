@@ -0,0 +1,105 @@
+"""Claves de idempotencia (``Idempotency-Key``) para escrituras que los clientes reintentan.
+
+La primera petición con una clave toma un candado en Redis (``SET NX PX``),
+ejecuta la escritura y guarda la respuesta con ``IDEMPOTENCIA_TTL``. Los
+reintentos concurrentes esperan a que aparezca la respuesta guardada en vez de
+repetir la escritura; si el dueño del candado falla sin guardar nada, el
+siguiente reintento toma el candado y ejecuta la escritura.
+
+Solo se guardan respuestas exitosas: un error deja la clave libre para reintentar.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import WatchError
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+ENCABEZADO_REPETIDA = "Idempotent-Replayed"
+_INTERVALO_ESPERA = 0.05
+
+
+def huella_cuerpo(cuerpo: bytes) -> str:
+    """Huella del cuerpo JSON independiente del orden de las claves y los espacios."""
+    try:
+        canonico = json.dumps(json.loads(cuerpo or b"null"), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        canonico = cuerpo
+    return hashlib.sha256(canonico).hexdigest()
+
+
+class SolicitudIdempotente:
+    def __init__(self, redis_async: AsyncRedis, ambito: str, clave: str, huella: str):
+        clave_hash = hashlib.sha256(clave.encode()).hexdigest()
+        self.redis = redis_async
+        self.clave_respuesta = f"idempotencia:{ambito}:{clave_hash}"
+        self.clave_candado = f"{self.clave_respuesta}:candado"
+        self.huella = huella
+        self.token: Optional[str] = None
+
+    async def _respuesta_guardada(self) -> Optional[JSONResponse]:
+        guardada = await self.redis.get(self.clave_respuesta)
+        if guardada is None:
+            return None
+        datos = json.loads(guardada)
+        if datos["huella"] != self.huella:
+            raise HTTPException(status_code=422,
+                                detail="Idempotency-Key ya fue usada con un cuerpo diferente")
+        return JSONResponse(content=datos["cuerpo"], status_code=datos["estado"],
+                            headers={**datos["encabezados"], ENCABEZADO_REPETIDA: "true"})
+
+    async def _tomar_candado(self) -> bool:
+        token = secrets.token_hex(8)
+        if await self.redis.set(self.clave_candado, token, nx=True, px=config.IDEMPOTENCIA_CANDADO_MS):
+            self.token = token
+            return True
+        return False
+
+    async def iniciar(self) -> Optional[JSONResponse]:
+        """Retorna la respuesta guardada, o ``None`` si esta petición debe ejecutar la escritura."""
+        limite = time.monotonic() + config.IDEMPOTENCIA_ESPERA_MS / 1000
+        while True:
+            respuesta = await self._respuesta_guardada()
+            if respuesta is not None:
+                return respuesta
+            if await self._tomar_candado():
+                # La respuesta pudo guardarse entre la lectura y el candado
+                respuesta = await self._respuesta_guardada()
+                if respuesta is not None:
+                    await self.liberar()
+                return respuesta
+            if time.monotonic() >= limite:
+                raise HTTPException(status_code=409, detail="Solicitud con la misma Idempotency-Key en curso",
+                                    headers={"Retry-After": "1"})
+            await asyncio.sleep(_INTERVALO_ESPERA)
+
+    async def guardar(self, cuerpo, estado: int = 200, encabezados: Optional[Dict[str, str]] = None):
+        datos = {"huella": self.huella, "estado": estado, "cuerpo": jsonable_encoder(cuerpo),
+                 "encabezados": encabezados or {}}
+        await self.redis.set(self.clave_respuesta, json.dumps(datos), ex=config.IDEMPOTENCIA_TTL)
+
+    async def liberar(self):
+        """Suelta el candado solo si sigue siendo nuestro (pudo expirar y tomarlo otro)."""
+        if self.token is None:
+            return
+        async with self.redis.pipeline() as pipe:
+            try:
+                await pipe.watch(self.clave_candado)
+                if await pipe.get(self.clave_candado) == self.token.encode():
+                    pipe.multi()
+                    pipe.delete(self.clave_candado)
+                    await pipe.execute()
+            except WatchError:
+                logger.debug("Candado de idempotencia modificado al liberar", extra={"clave": self.clave_candado})
+        self.token = None
@@ -0,0 +1,124 @@
+import heapq
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+from app.texto import tokenizar
+
+
+class IndiceBM25:
+    """Índice invertido en memoria con puntuación BM25.
+
+    Las actualizaciones son incrementales: agregar o eliminar un documento solo
+    toca las listas de sus propios términos, y el IDF se calcula al consultar.
+
+    Al consultar se calcula, una vez por término, su peso BM25 en cada documento
+    (IDF y normalización por longitud incluidos) y se guarda hasta la siguiente
+    escritura; las consultas siguientes solo suman pesos, y lo hacen fuera del lock.
+    """
+
+    # Términos con pesos precalculados; cada uno ocupa lo mismo que sus postings
+    MAX_TERMINOS_CACHEADOS = 512
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._terminos_doc: Dict[Hashable, Counter] = {}
+        self._longitudes: Dict[Hashable, int] = {}
+        self._longitud_total = 0
+        # Los diccionarios de pesos no se modifican una vez creados: se comparten fuera del lock
+        self._pesos: "OrderedDict[str, Dict[Hashable, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._longitudes)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._longitudes
+
+    def agregar(self, doc_id: Hashable, texto: str):
+        terminos = Counter(tokenizar(texto))
+        with self._lock:
+            self._eliminar_sin_lock(doc_id)
+            for termino, frecuencia in terminos.items():
+                self._postings.setdefault(termino, {})[doc_id] = frecuencia
+            longitud = sum(terminos.values())
+            self._terminos_doc[doc_id] = terminos
+            self._longitudes[doc_id] = longitud
+            self._longitud_total += longitud
+            # La longitud promedio cambió: todos los pesos quedan desactualizados
+            self._pesos.clear()
+
+    def agregar_varios(self, documentos: Iterable[Tuple[Hashable, str]]):
+        for doc_id, texto in documentos:
+            self.agregar(doc_id, texto)
+
+    def eliminar(self, doc_id: Hashable):
+        with self._lock:
+            self._eliminar_sin_lock(doc_id)
+
+    def _eliminar_sin_lock(self, doc_id: Hashable):
+        terminos = self._terminos_doc.pop(doc_id, None)
+        if terminos is None:
+            return
+        for termino in terminos:
+            postings = self._postings.get(termino)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[termino]
+        self._longitud_total -= self._longitudes.pop(doc_id)
+        self._pesos.clear()
+
+    def buscar(self, consulta: str, k: int = 10, offset: int = 0) -> List[Tuple[Hashable, float]]:
+        """Retorna los ``k`` documentos con mayor puntuación, saltando los primeros ``offset``."""
+        puntajes = self._puntuar(consulta)
+        mejores = heapq.nlargest(offset + k, puntajes, key=puntajes.__getitem__)
+        return [(doc_id, puntajes[doc_id]) for doc_id in mejores[offset:]]
+
+    def contar(self, consulta: str) -> int:
+        return len(self._puntuar(consulta))
+
+    def _pesos_consulta(self, consulta: str) -> List[Dict[Hashable, float]]:
+        terminos = set(tokenizar(consulta))
+        with self._lock:
+            if not self._longitudes:
+                return []
+            return [pesos for pesos in map(self._pesos_termino, terminos) if pesos]
+
+    def _pesos_termino(self, termino: str) -> Dict[Hashable, float]:
+        """Peso BM25 de ``termino`` en cada documento que lo contiene; requiere el lock."""
+        pesos = self._pesos.get(termino)
+        if pesos is not None:
+            self._pesos.move_to_end(termino)
+            return pesos
+        postings = self._postings.get(termino)
+        if not postings:
+            return {}
+        total_docs = len(self._longitudes)
+        promedio = (self._longitud_total / total_docs) or 1.0
+        df = len(postings)
+        peso = math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) * (self.k1 + 1)
+        # norma = k1 * (1 - b + b * longitud / promedio) = base + pendiente * longitud
+        base, pendiente = self.k1 * (1 - self.b), self.k1 * self.b / promedio
+        longitudes = self._longitudes
+        pesos = {doc_id: peso * tf / (tf + base + pendiente * longitudes[doc_id]) for doc_id, tf in postings.items()}
+        self._pesos[termino] = pesos
+        if len(self._pesos) > self.MAX_TERMINOS_CACHEADOS:
+            self._pesos.popitem(last=False)
+        return pesos
+
+    def _puntuar(self, consulta: str) -> Dict[Hashable, float]:
+        """Puntaje de cada documento con algún término de la consulta; el resultado es de solo lectura."""
+        pesos = sorted(self._pesos_consulta(consulta), key=len, reverse=True)
+        if len(pesos) <= 1:
+            return pesos[0] if pesos else {}
+        # Se parte de una copia del término más frecuente, que dict() hace en C
+        puntajes = dict(pesos[0])
+        obtener = puntajes.get
+        for pesos_termino in pesos[1:]:
+            for doc_id, peso in pesos_termino.items():
+                puntajes[doc_id] = obtener(doc_id, 0.0) + peso
+        return puntajes
@@ -0,0 +1,27 @@
+"""Crea los índices de los modelos que faltan en bases existentes.
+
+``sincronizar_esquema`` solo avisa de los índices faltantes: construir el
+FULLTEXT ``ft_incidente_texto`` sobre una tabla ``incidente`` grande bloquearía el
+arranque de cada instancia. Este comando los crea en la primaria y en la réplica,
+y se ejecuta una vez por despliegue, por ejemplo como paso de migración::
+
+    python -m app.indices
+"""
+import argparse
+import sys
+
+from app.database import crear_indices_faltantes, obtener_engine, obtener_engine_replica
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args(argv)
+
+    for nombre, engine in (("primaria", obtener_engine()), ("réplica", obtener_engine_replica())):
+        creados = crear_indices_faltantes(engine)
+        print(f"{nombre}: {', '.join(creados) if creados else 'sin índices faltantes'}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Límite de peticiones por cliente con presupuestos separados de lectura y escritura.
+
+Se usa una ventana deslizante aproximada: el consumo de la ventana anterior se
+pondera por la fracción que aún se solapa con la ventana actual. Para no ir a
+Redis en cada petición, cada proceso reserva lotes de cupos (``INCRBY``) y los
+consume localmente; mientras un cliente está limitado el rechazo también se
+resuelve en memoria hasta que termina la ventana.
+
+Si Redis no responde se deja pasar la petición (fail open).
+"""
+import logging
+import math
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request
+from jose import JWTError, jwt
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from app import config
+from app.database import get_redis_async
+from app.metricas import registro
+
+logger = logging.getLogger(__name__)
+
+PETICIONES_LIMITADAS = registro.contador(
+    "rate_limited_requests_total", "Peticiones rechazadas por el límite de cada cliente", ("budget",))
+
+
+class LimiteExcedido(HTTPException):
+    def __init__(self, reintentar_en: float):
+        super().__init__(status_code=429, detail="Demasiadas peticiones",
+                         headers={"Retry-After": str(max(1, math.ceil(reintentar_en)))})
+
+
+class _Reserva:
+    __slots__ = ("ventana", "disponibles", "bloqueado_hasta")
+
+    def __init__(self, ventana: int):
+        self.ventana = ventana
+        self.disponibles = 0
+        self.bloqueado_hasta = 0.0
+
+
+class Limitador:
+    def __init__(self, presupuesto: str, limite: int, ventana_s: int = 60, lote: int = 10):
+        self.presupuesto = presupuesto
+        self.limite = limite
+        self.ventana_s = ventana_s
+        self.lote = max(1, min(lote, limite // 10 or 1))
+        self._reservas: Dict[str, _Reserva] = {}
+        self._ventana = 0
+        self._lock = threading.Lock()
+
+    def _clave(self, identidad: str, ventana: int) -> str:
+        return f"limite:{self.presupuesto}:{identidad}:{ventana}"
+
+    def _encolar_reserva(self, pipe, identidad: str, ventana: int):
+        pipe.incrby(self._clave(identidad, ventana), self.lote)
+        pipe.expire(self._clave(identidad, ventana), self.ventana_s * 2)
+        pipe.get(self._clave(identidad, ventana - 1))
+
+    def _concedidos(self, resultados, ahora: float) -> Tuple[int, float]:
+        """Cupos concedidos por la reserva en Redis y fracción transcurrida de la ventana."""
+        consumido, _, anterior = resultados
+        transcurrido = (ahora % self.ventana_s) / self.ventana_s
+        disponible = self.limite - int(int(anterior or 0) * (1 - transcurrido))
+        return max(0, min(self.lote, disponible - (consumido - self.lote))), transcurrido
+
+    def _reservar(self, redis_client: Redis, identidad: str, ventana: int, ahora: float) -> Tuple[int, float]:
+        pipe = redis_client.pipeline(transaction=False)
+        self._encolar_reserva(pipe, identidad, ventana)
+        return self._concedidos(pipe.execute(), ahora)
+
+    async def _reservar_async(self, redis_async: AsyncRedis, identidad: str, ventana: int,
+                              ahora: float) -> Tuple[int, float]:
+        async with redis_async.pipeline(transaction=False) as pipe:
+            self._encolar_reserva(pipe, identidad, ventana)
+            return self._concedidos(await pipe.execute(), ahora)
+
+    def _consumir_local(self, identidad: str, ventana: int, ahora: float) -> Optional[_Reserva]:
+        """Consume un cupo ya reservado; retorna la reserva si hay que pedir más a Redis."""
+        with self._lock:
+            if ventana != self._ventana:
+                # Las reservas de ventanas pasadas ya no sirven: sin esto el diccionario
+                # crece con cada identidad vista desde que arrancó el proceso
+                self._reservas = {clave: reserva for clave, reserva in self._reservas.items()
+                                  if reserva.ventana >= ventana}
+                self._ventana = ventana
+            reserva = self._reservas.get(identidad)
+            if reserva is None or reserva.ventana != ventana:
+                reserva = self._reservas[identidad] = _Reserva(ventana)
+            if reserva.disponibles > 0:
+                reserva.disponibles -= 1
+                return None
+            if reserva.bloqueado_hasta > ahora:
+                PETICIONES_LIMITADAS.inc(self.presupuesto)
+                raise LimiteExcedido(reserva.bloqueado_hasta - ahora)
+            return reserva
+
+    def _asignar(self, reserva: _Reserva, concedidos: int, transcurrido: float):
+        with self._lock:
+            if concedidos > 0:
+                reserva.disponibles += concedidos - 1
+                return
+            # Sin cupo hasta que la ventana anterior deje de pesar lo suficiente; como
+            # cota simple se espera al fin de la ventana actual.
+            reserva.bloqueado_hasta = (reserva.ventana + 1) * self.ventana_s
+        PETICIONES_LIMITADAS.inc(self.presupuesto)
+        raise LimiteExcedido((1 - transcurrido) * self.ventana_s)
+
+    def _sin_redis(self, error: Exception):
+        logger.warning("Límite de peticiones sin Redis, se permite la petición",
+                       extra={"presupuesto": self.presupuesto, "error": str(error)})
+
+    def verificar(self, redis_client: Redis, identidad: str):
+        if not config.LIMITES_HABILITADO:
+            return
+        ahora = time.time()
+        ventana = int(ahora // self.ventana_s)
+        reserva = self._consumir_local(identidad, ventana, ahora)
+        if reserva is None:
+            return
+        try:
+            concedidos, transcurrido = self._reservar(redis_client, identidad, ventana, ahora)
+        except Exception as e:
+            self._sin_redis(e)
+            return
+        self._asignar(reserva, concedidos, transcurrido)
+
+    async def verificar_async(self, redis_async: AsyncRedis, identidad: str):
+        """Igual que ``verificar`` pero sin bloquear el event loop en la ida a Redis."""
+        if not config.LIMITES_HABILITADO:
+            return
+        ahora = time.time()
+        ventana = int(ahora // self.ventana_s)
+        reserva = self._consumir_local(identidad, ventana, ahora)
+        if reserva is None:
+            return
+        try:
+            concedidos, transcurrido = await self._reservar_async(redis_async, identidad, ventana, ahora)
+        except Exception as e:
+            self._sin_redis(e)
+            return
+        self._asignar(reserva, concedidos, transcurrido)
+
+    def reiniciar(self):
+        with self._lock:
+            self._reservas.clear()
+
+
+@lru_cache(maxsize=4096)
+def _sujeto_token(token: str) -> Optional[str]:
+    try:
+        return jwt.decode(token, config.SECRET_KEY, algorithms=["HS256"]).get("sub")
+    except JWTError:
+        return None
+
+
+def identidad_peticion(request: Request) -> str:
+    """Sujeto del token si lo hay; si no, la IP del cliente.
+
+    Nada que el cliente elija (query, cuerpo) sirve de identidad: cambiarlo en cada
+    petición evadiría el límite. La IP es la que agregó el proxy de confianza a
+    ``X-Forwarded-For`` (ver ``configuracion_uvicorn`` en app/servidor.py).
+    """
+    autorizacion = request.headers.get("X-Forwarded-Authorization") or request.headers.get("Authorization")
+    if autorizacion and autorizacion.startswith("Bearer "):
+        sujeto = _sujeto_token(autorizacion[7:])
+        if sujeto:
+            return f"sub:{sujeto}"
+    return f"ip:{request.client.host if request.client else 'desconocida'}"
+
+
+limitador_lectura = Limitador("lectura", config.LIMITES_LECTURA_POR_MINUTO, lote=config.LIMITES_LOTE)
+limitador_escritura = Limitador("escritura", config.LIMITES_ESCRITURA_POR_MINUTO, lote=config.LIMITES_LOTE)
+
+
+async def limitar_lectura(request: Request, redis_async: AsyncRedis = Depends(get_redis_async)):
+    await limitador_lectura.verificar_async(redis_async, identidad_peticion(request))
+
+
+async def limitar_escritura(request: Request, redis_async: AsyncRedis = Depends(get_redis_async)):
+    await limitador_escritura.verificar_async(redis_async, identidad_peticion(request))
+
+
+def reiniciar_limites():
+    limitador_lectura.reiniciar()
+    limitador_escritura.reiniciar()
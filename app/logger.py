@@ -0,0 +1,129 @@
+"""Logging estructurado en JSON con escritura en segundo plano.
+
+Los handlers de la aplicación solo encolan el registro (``QueueHandler``); un
+``QueueListener`` en otro hilo lo formatea y escribe en stdout, así que las
+peticiones no esperan la escritura. Antes de encolar se redactan secretos y se
+muestrean los mensajes DEBUG de alto volumen.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from app import config
+
+CAMPOS_SENSIBLES = frozenset({"authorization", "x-forwarded-authorization", "cookie", "password",
+                              "secret", "secret_key", "token", "api_key"})
+_PATRONES_SECRETOS = [
+    (re.compile(r"(?i)(bearer\s+)[A-Za-z0-9\-._~+/]+=*"), r"\1[REDACTED]"),
+    (re.compile(r"(://[^:/@\s]+:)[^@\s]+@"), r"\1[REDACTED]@"),
+    (re.compile(r"(?i)((?:authorization|password|secret|token)['\"]?\s*[:=]\s*['\"]?)[^'\"\s,}]+"), r"\1[REDACTED]"),
+]
+
+_RESERVADOS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def redactar(valor):
+    if isinstance(valor, str):
+        for patron, reemplazo in _PATRONES_SECRETOS:
+            valor = patron.sub(reemplazo, valor)
+        return valor
+    if isinstance(valor, dict) or hasattr(valor, "items"):
+        return {k: "[REDACTED]" if str(k).lower() in CAMPOS_SENSIBLES else redactar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [redactar(v) for v in valor]
+    return valor
+
+
+class FiltroRedaccion(logging.Filter):
+    """Redacta el mensaje y los campos extra antes de que el registro salga del hilo de la petición."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redactar(record.getMessage())
+        record.args = None
+        for clave, valor in list(vars(record).items()):
+            if clave not in _RESERVADOS:
+                setattr(record, clave, "[REDACTED]" if clave.lower() in CAMPOS_SENSIBLES else redactar(valor))
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar solo una fracción de los mensajes DEBUG."""
+
+    def __init__(self, fraccion: float):
+        super().__init__()
+        self.fraccion = fraccion
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.fraccion >= 1 or random.random() < self.fraccion
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        documento = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _RESERVADOS:
+                documento[clave] = valor
+        if record.exc_info:
+            documento["exception"] = self.formatException(record.exc_info)
+        return json.dumps(documento, default=str, ensure_ascii=False)
+
+
+def _niveles_por_modulo(especificacion: str):
+    for parte in filter(None, (p.strip() for p in especificacion.split(","))):
+        nombre, _, nivel = parte.partition("=")
+        if nivel:
+            yield nombre.strip(), nivel.strip().upper()
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configurar_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    cola: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    manejador_cola = logging.handlers.QueueHandler(cola)
+    # QueueHandler.prepare formatea el mensaje en el hilo de la petición; aquí ya viene redactado
+    manejador_cola.prepare = lambda record: record
+    manejador_cola.addFilter(FiltroMuestreo(config.LOG_MUESTREO_DEBUG))
+    manejador_cola.addFilter(FiltroRedaccion())
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON())
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=False)
+    _listener.start()
+
+    logger_app = logging.getLogger("app")
+    logger_app.handlers[:] = [manejador_cola]
+    logger_app.setLevel(config.LOG_LEVEL)
+    logger_app.propagate = False
+    if config.DB_ECHO:
+        logger_sql = logging.getLogger("sqlalchemy.engine")
+        logger_sql.handlers[:] = [manejador_cola]
+        logger_sql.setLevel(logging.INFO)
+        logger_sql.propagate = False
+    for nombre, nivel in _niveles_por_modulo(config.LOG_NIVELES):
+        logging.getLogger(nombre).setLevel(nivel)
+    atexit.register(detener_logging)
+
+
+def detener_logging():
+    """Vacía la cola de logs; se llama al apagar la aplicación."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,288 @@
+"""Métricas en formato de exposición de Prometheus sin dependencias externas.
+
+Cada hilo escribe en su propio fragmento (``threading.local``), de modo que
+registrar una observación no toma ningún lock; los fragmentos solo se suman al
+exponer ``/metrics``.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Fragmentado:
+    def __init__(self):
+        self._local = threading.local()
+        self._fragmentos: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _fragmento(self) -> dict:
+        fragmento = getattr(self._local, "valores", None)
+        if fragmento is None:
+            fragmento = self._local.valores = {}
+            with self._lock:
+                self._fragmentos.append(fragmento)
+        return fragmento
+
+    def _copias(self) -> List[dict]:
+        with self._lock:
+            fragmentos = list(self._fragmentos)
+        # dict() copia en C sin liberar el GIL, así que no ve escrituras a medias
+        return [dict(fragmento) for fragmento in fragmentos]
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple) -> str:
+    if not nombres:
+        return ""
+    pares = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(nombres, valores))
+    return "{" + pares + "}"
+
+
+class Contador(_Fragmentado):
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__()
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def inc(self, *valores, cantidad: float = 1):
+        fragmento = self._fragmento()
+        fragmento[valores] = fragmento.get(valores, 0) + cantidad
+
+    def valores(self) -> Dict[Tuple, float]:
+        total: Dict[Tuple, float] = {}
+        for copia in self._copias():
+            for clave, valor in copia.items():
+                total[clave] = total.get(clave, 0) + valor
+        return total
+
+    def exponer(self) -> List[str]:
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}"
+                for clave, valor in sorted(self.valores().items())]
+
+
+class Histograma(_Fragmentado):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), buckets=BUCKETS_LATENCIA):
+        super().__init__()
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor: float, *valores):
+        fragmento = self._fragmento()
+        serie = fragmento.get(valores)
+        if serie is None:
+            # [conteo por bucket (no acumulado) ..., +Inf, suma]
+            serie = fragmento[valores] = [0] * (len(self.buckets) + 1) + [0.0]
+        serie[bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def cronometrar(self, *valores) -> "_Cronometro":
+        return _Cronometro(self, valores)
+
+    def exponer(self) -> List[str]:
+        total: Dict[Tuple, list] = {}
+        for copia in self._copias():
+            for clave, serie in copia.items():
+                acumulado = total.get(clave)
+                if acumulado is None:
+                    total[clave] = list(serie)
+                else:
+                    for i, valor in enumerate(serie):
+                        acumulado[i] += valor
+        lineas = []
+        nombres = self.etiquetas + ("le",)
+        for clave, serie in sorted(total.items()):
+            conteo = 0
+            for limite, cantidad in zip(self.buckets + ("+Inf",), serie):
+                conteo += cantidad
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, clave + (limite,))} {conteo}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {conteo}")
+        return lineas
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "valores", "inicio")
+
+    def __init__(self, histograma: Histograma, valores: Tuple):
+        self.histograma = histograma
+        self.valores = valores
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.valores)
+        return False
+
+
+class Medidor:
+    """Gauge cuyo valor se calcula al exponer, a partir de una función."""
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str], funcion: Callable[[], Dict[Tuple, float]]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.funcion = funcion
+
+    def exponer(self) -> List[str]:
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}"
+                for clave, valor in sorted(self.funcion().items())]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, etiquetas, funcion) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas, funcion))
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._metricas.values():
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+HTTP_DURACION = registro.histograma(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta", ("method", "route"))
+HTTP_PETICIONES = registro.contador(
+    "http_requests_total", "Peticiones HTTP por ruta y código de estado", ("method", "route", "status"))
+SQL_DURACION = registro.histograma(
+    "db_statement_duration_seconds", "Duración de las sentencias SQL", ("engine", "statement"))
+REDIS_DURACION = registro.histograma(
+    "redis_command_duration_seconds", "Duración de los comandos de Redis", ("command",))
+PUBSUB_DURACION = registro.histograma(
+    "pubsub_publish_duration_seconds", "Duración de publish_message por tópico", ("topic",))
+HTTP_SALIENTE_DURACION = registro.histograma(
+    "http_client_duration_seconds", "Duración de las llamadas HTTP salientes", ("service",))
+CACHE_CONSULTAS = registro.contador(
+    "cache_requests_total", "Aciertos y fallos de las claves incidente:*", ("key", "result"))
+
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide latencia y códigos de estado por plantilla de ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = [500]
+
+        async def send_con_estado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", "sin_ruta")
+            metodo = scope["method"]
+            HTTP_DURACION.observar(time.perf_counter() - inicio, metodo, plantilla)
+            HTTP_PETICIONES.inc(metodo, plantilla, estado[0])
+
+
+def _tipo_sentencia(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTRO"
+
+
+# Un solo juego de eventos cronometra cada sentencia de todos los engines. Quien
+# necesite la duración (consultas lentas) o los fallos (límite de concurrencia) se
+# suscribe con observar_sentencias / observar_fallos_sql en vez de registrar sus
+# propios listeners, así hay una sola pila de inicios por conexión que se limpia
+# también cuando la sentencia falla.
+_observadores_sentencias: List[Callable] = []
+_observadores_fallos: List[Callable] = []
+
+
+def observar_sentencias(observador: Callable) -> Callable:
+    """Registra ``observador(conn, statement, parameters, executemany, duracion_s)``."""
+    _observadores_sentencias.append(observador)
+    return observador
+
+
+def observar_fallos_sql(observador: Callable) -> Callable:
+    """Registra ``observador(contexto)`` para el evento ``handle_error``."""
+    _observadores_fallos.append(observador)
+    return observador
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sentencia_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("sentencia_inicio")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    SQL_DURACION.observar(duracion, conn.info.get("metricas_engine", "default"), _tipo_sentencia(statement))
+    for observador in _observadores_sentencias:
+        observador(conn, statement, parameters, executemany, duracion)
+
+
+@event.listens_for(Engine, "handle_error")
+def _al_fallar(contexto):
+    conexion = contexto.connection
+    if conexion is not None:
+        inicios = conexion.info.get("sentencia_inicio")
+        if inicios:
+            inicios.pop()
+    for observador in _observadores_fallos:
+        observador(contexto)
+
+
+def nombrar_engine(engine: Engine, nombre: str):
+    """Etiqueta las métricas SQL de ``engine`` con ``nombre`` (primary/replica)."""
+
+    @event.listens_for(engine, "engine_connect")
+    def _al_conectar(conn):
+        conn.info["metricas_engine"] = nombre
+
+
+def estado_pool(engines: Dict[str, Engine]) -> Dict[Tuple, float]:
+    valores = {}
+    for nombre, engine in engines.items():
+        pool = engine.pool
+        for estado, funcion in (("checked_out", "checkedout"), ("checked_in", "checkedin"),
+                                ("overflow", "overflow"), ("size", "size")):
+            medir = getattr(pool, funcion, None)
+            if medir is not None:
+                valores[(nombre, estado)] = medir()
+    return valores
@@ -1,4 +1,4 @@
-from sqlalchemy import TEXT, Column
+from sqlalchemy import TEXT, Column, Index
 from sqlmodel import Field, SQLModel
 from typing import Optional
 from enum import Enum
@@ -38,6 +38,10 @@ def bogota_date():
     return datetime.now(bogota_tz).date()
 
 class Incidente(SQLModel, table=True):
+    __table_args__ = (
+        Index("ft_incidente_texto", "description", "solucion", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     description: str = Field(sa_column=Column(TEXT))
     categoria: Categoria
@@ -59,11 +63,34 @@ class ProblemaComun(SQLModel, table=True):
     description: str = Field(sa_column=Column(TEXT))
     categoria: Categoria
     solucion: str = Field(sa_column=Column(TEXT))
-    cliente_id: int
+    cliente_id: int = Field(index=True)
 
 class LogIncidente(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     incidente_id: int = Field(index=True)
     cuerpo_completo: str = Field(sa_column=Column(TEXT))
     fecha_cambio: datetime = Field(default_factory=datetime.utcnow)
-    origen_cambio: str  
\ No newline at end of file
+    origen_cambio: str  
+
+# Tablas frías: incidentes cerrados hace más de ARCHIVO_DIAS y sus logs (ver app/archivo.py).
+# Mismas columnas que las tablas calientes para poder mover filas con INSERT ... SELECT.
+class IncidenteArchivado(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    description: str = Field(sa_column=Column(TEXT))
+    categoria: Categoria
+    prioridad: Prioridad
+    canal: Canal
+    cliente_id: int
+    estado: Estado
+    fecha_creacion: Optional[date] = None
+    fecha_cierre: Optional[date] = None
+    solucion: Optional[str] = Field(sa_column=Column(TEXT))
+    radicado: str = Field(index=True)
+    identificacion_usuario: str = Field(max_length=15, nullable=True)
+
+class LogIncidenteArchivado(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    incidente_id: int = Field(index=True)
+    cuerpo_completo: str = Field(sa_column=Column(TEXT))
+    fecha_cambio: datetime
+    origen_cambio: str
@@ -0,0 +1,174 @@
+"""Perfilado bajo demanda de peticiones individuales.
+
+El middleware solo se instala si ``PERFILADOR_HABILITADO`` está activo, así
+que deshabilitado no agrega ningún costo. Una petición se perfila cuando trae
+``X-Profile`` con el valor de ``PERFILADOR_TOKEN`` o cae en la fracción
+``PERFILADOR_MUESTREO``.
+
+Modos:
+- ``cprofile``: guarda un ``.prof`` de pstats (snakeviz, flameprof).
+- ``muestreo``: un hilo toma la pila del hilo del event loop cada
+  ``PERFILADOR_INTERVALO_MS`` y guarda pilas colapsadas (``.collapsed``),
+  el formato de flamegraph.pl y speedscope.
+
+Ambos observan el hilo del event loop, por lo que otras peticiones
+concurrentes pueden aparecer en el perfil. Se perfila una petición a la vez
+(desde 3.12 solo puede haber un ``cProfile`` activo por proceso): si ya hay una
+en curso, la siguiente se atiende sin perfilar. Un fallo del perfilador nunca
+hace fallar la petición.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = {"cprofile": ".prof", "muestreo": ".collapsed"}
+_NOMBRE_VALIDO = re.compile(r"^[\w.\-]+\.(prof|collapsed)$")
+_perfilando = threading.Lock()
+
+
+class MuestreadorPilas:
+    def __init__(self, hilo_id: int, intervalo: float):
+        self._hilo_id = hilo_id
+        self._intervalo = intervalo
+        self._pilas: Counter = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="perfilador-muestreo", daemon=True)
+
+    def _ejecutar(self):
+        while not self._detener.wait(self._intervalo):
+            frame = sys._current_frames().get(self._hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if pila:
+                self._pilas[";".join(reversed(pila))] += 1
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def guardar(self, ruta: str):
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            for pila, conteo in self._pilas.items():
+                archivo.write(f"{pila} {conteo}\n")
+
+
+def _directorio() -> str:
+    os.makedirs(config.PERFILADOR_DIRECTORIO, exist_ok=True)
+    return config.PERFILADOR_DIRECTORIO
+
+
+def listar_perfiles() -> List[dict]:
+    if not os.path.isdir(config.PERFILADOR_DIRECTORIO):
+        return []
+    perfiles = []
+    for entrada in os.scandir(config.PERFILADOR_DIRECTORIO):
+        if entrada.is_file() and _NOMBRE_VALIDO.match(entrada.name):
+            estado = entrada.stat()
+            perfiles.append({"nombre": entrada.name, "bytes": estado.st_size, "creado": estado.st_mtime})
+    return sorted(perfiles, key=lambda p: p["creado"], reverse=True)
+
+
+def ruta_perfil(nombre: str) -> Optional[str]:
+    if not _NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = os.path.join(config.PERFILADOR_DIRECTORIO, nombre)
+    return ruta if os.path.isfile(ruta) else None
+
+
+def _podar():
+    perfiles = listar_perfiles()
+    for perfil in perfiles[config.PERFILADOR_MAX_ARCHIVOS:]:
+        try:
+            os.remove(os.path.join(config.PERFILADOR_DIRECTORIO, perfil["nombre"]))
+        except FileNotFoundError:
+            pass
+
+
+def _nombre_archivo(scope, modo: str) -> str:
+    ruta = getattr(scope.get("route"), "path", scope["path"])
+    ruta = re.sub(r"[^\w]+", "_", ruta).strip("_") or "raiz"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}-{scope['method']}-{ruta}{EXTENSIONES[modo]}"
+
+
+class PerfiladorMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _modo(self, scope) -> Optional[str]:
+        encabezados = dict(scope["headers"])
+        solicitado = encabezados.get(b"x-profile")
+        if solicitado is not None and config.PERFILADOR_TOKEN and secrets.compare_digest(
+                solicitado.decode("latin-1"), config.PERFILADOR_TOKEN):
+            modo = encabezados.get(b"x-profile-mode", config.PERFILADOR_MODO.encode()).decode("latin-1")
+            return modo if modo in EXTENSIONES else config.PERFILADOR_MODO
+        if config.PERFILADOR_MUESTREO > 0 and random.random() < config.PERFILADOR_MUESTREO:
+            return config.PERFILADOR_MODO
+        return None
+
+    async def __call__(self, scope, receive, send):
+        modo = self._modo(scope) if scope["type"] == "http" else None
+        if modo is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not _perfilando.acquire(blocking=False):
+            logger.info("Perfil omitido: ya hay una petición perfilándose", extra={"ruta": scope["path"]})
+            await self.app(scope, receive, send)
+            return
+        try:
+            perfil = self._iniciar(modo)
+        except Exception:
+            _perfilando.release()
+            logger.exception("No se pudo iniciar el perfilador")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            try:
+                self._guardar(perfil, modo, scope)
+            except Exception:
+                logger.exception("No se pudo guardar el perfil")
+            finally:
+                _perfilando.release()
+
+    @staticmethod
+    def _iniciar(modo: str):
+        if modo == "cprofile":
+            perfil = cProfile.Profile()
+            perfil.enable()
+        else:
+            perfil = MuestreadorPilas(threading.get_ident(), config.PERFILADOR_INTERVALO_MS / 1000)
+            perfil.iniciar()
+        return perfil
+
+    @staticmethod
+    def _guardar(perfil, modo: str, scope):
+        if modo == "cprofile":
+            perfil.disable()
+        else:
+            perfil.detener()
+        ruta = os.path.join(_directorio(), _nombre_archivo(scope, modo))
+        if modo == "cprofile":
+            perfil.dump_stats(ruta)
+        else:
+            perfil.guardar(ruta)
+        _podar()
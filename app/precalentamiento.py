@@ -0,0 +1,165 @@
+"""Precalentamiento de la caché de incidentes tras un despliegue o un reinicio de Redis.
+
+Recorre desde la réplica, por lotes y en orden de id, los incidentes abiertos y
+escalados y los que cambiaron en los últimos ``dias_recientes`` días, y escribe
+``incidente:<id>`` e ``incidente:radicado:<radicado>`` con un pipeline por lote.
+Las escrituras usan ``NX``: una réplica atrasada no pisa un valor más reciente
+que ya esté en la caché. Tampoco se escriben, o se deshacen si ya se escribieron,
+los incidentes cuya versión (``incidente:version:<id>``) cambió después de leer el
+lote: la fila leída puede ser anterior al cambio cuya clave se acaba de borrar. El
+TTL lleva un margen aleatorio para que las claves cargadas juntas no expiren juntas.
+
+El ritmo se limita a ``filas_por_segundo`` para no saturar la réplica. Se puede
+ejecutar en el lifespan (``CACHE_PRECALENTAR=true``) o como comando::
+
+    python -m app.precalentamiento --filas-por-segundo 2000 --dias-recientes 7
+"""
+import argparse
+import logging
+import random
+import secrets
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from redis import Redis
+from sqlalchemy import or_, select
+from sqlmodel import Session
+
+from app import config
+from app.codec_cache import codificar
+from app.models import Estado, Incidente, LogIncidente
+from app.versiones import clave_version_incidente, nueva_version
+
+logger = logging.getLogger(__name__)
+
+CLAVE_CANDADO = "precalentamiento:candado"
+_CANDADO_MS = 30 * 60 * 1000
+
+
+def consulta_precalentamiento(dias_recientes: int, ultimo_id: int, lote: int):
+    desde = date.today() - timedelta(days=dias_recientes)
+    modificados = select(LogIncidente.incidente_id).where(
+        LogIncidente.fecha_cambio >= datetime.combine(desde, datetime.min.time()))
+    return (select(Incidente)
+            .where(Incidente.id > ultimo_id,
+                   or_(Incidente.estado.in_([Estado.abierto, Estado.escalado]),
+                       Incidente.fecha_cierre >= desde,
+                       Incidente.id.in_(modificados)))
+            .order_by(Incidente.id)
+            .limit(lote))
+
+
+def _ttl_con_margen() -> Optional[int]:
+    if config.INCIDENTE_CACHE_TTL <= 0:
+        return None
+    return config.INCIDENTE_CACHE_TTL + random.randint(0, config.INCIDENTE_CACHE_TTL // 10)
+
+
+def _cambiados_desde(redis_client: Redis, ids: Iterable[int], marca: int) -> Set[int]:
+    ids = list(ids)
+    if not ids:
+        return set()
+    versiones = redis_client.mget([clave_version_incidente(incidente_id) for incidente_id in ids])
+    return {incidente_id for incidente_id, version in zip(ids, versiones)
+            if version is not None and int(version) >= marca}
+
+
+def _informar(progreso: Dict):
+    logger.info("Precalentando caché", extra=progreso)
+
+
+def precalentar_cache(engine, redis_client: Redis, lote: int = 500, filas_por_segundo: float = 2000,
+                      dias_recientes: int = 7, progreso: Callable[[Dict], None] = _informar) -> Optional[Dict]:
+    """Carga los incidentes activos en Redis; retorna el resumen, o ``None`` si otro proceso ya lo hace."""
+    token = secrets.token_hex(8)
+    if not redis_client.set(CLAVE_CANDADO, token, nx=True, px=_CANDADO_MS):
+        return None
+    try:
+        inicio = time.perf_counter()
+        leidas = escritas = omitidos = 0
+        tiempo_base = tiempo_redis = 0.0
+        ultimo_id = 0
+        with Session(engine) as session:
+            while True:
+                t0 = time.perf_counter()
+                # Un cambio que la réplica aplique después de esta lectura publica una
+                # versión posterior a la marca (marcar_incidente_modificado o el consumidor
+                # de app/sincronizacion.py)
+                marca = int(nueva_version())
+                incidentes = session.exec(consulta_precalentamiento(dias_recientes, ultimo_id, lote)).scalars().all()
+                tiempo_base += time.perf_counter() - t0
+                if not incidentes:
+                    break
+
+                t0 = time.perf_counter()
+                cambiados = _cambiados_desde(redis_client, (incidente.id for incidente in incidentes), marca)
+                vigentes = [incidente for incidente in incidentes if incidente.id not in cambiados]
+                pipe = redis_client.pipeline(transaction=False)
+                for incidente in vigentes:
+                    valor = codificar(incidente)
+                    ttl = _ttl_con_margen()
+                    pipe.set(f"incidente:{incidente.id}", valor, ex=ttl, nx=True)
+                    pipe.set(f"incidente:radicado:{incidente.radicado}", valor, ex=ttl, nx=True)
+                resultados = pipe.execute() if vigentes else []
+                claves = {}
+                for incidente, por_id, por_radicado in zip(vigentes, resultados[::2], resultados[1::2]):
+                    claves[incidente.id] = [clave for clave, escrita in (
+                        (f"incidente:{incidente.id}", por_id),
+                        (f"incidente:radicado:{incidente.radicado}", por_radicado)) if escrita]
+                # Cambios publicados mientras se escribía el lote: se deshacen esas claves
+                cambiados_al_escribir = _cambiados_desde(redis_client, claves, marca)
+                deshacer = [clave for incidente_id in cambiados_al_escribir for clave in claves[incidente_id]]
+                if deshacer:
+                    redis_client.delete(*deshacer)
+                escritas += sum(map(len, claves.values())) - len(deshacer)
+                omitidos += len(cambiados) + len(cambiados_al_escribir)
+                tiempo_redis += time.perf_counter() - t0
+
+                leidas += len(incidentes)
+                ultimo_id = incidentes[-1].id
+                session.expunge_all()
+                transcurrido = time.perf_counter() - inicio
+                progreso({"incidentes": leidas, "claves_escritas": escritas,
+                          "filas_por_segundo": round(leidas / transcurrido) if transcurrido else None})
+
+                # Ritmo máximo: cada lote debe "costar" al menos lote / filas_por_segundo
+                if filas_por_segundo > 0:
+                    espera = leidas / filas_por_segundo - (time.perf_counter() - inicio)
+                    if espera > 0:
+                        time.sleep(espera)
+
+        return {"incidentes": leidas, "claves_escritas": escritas, "omitidos_por_cambios": omitidos,
+                "segundos": round(time.perf_counter() - inicio, 3),
+                "segundos_base_datos": round(tiempo_base, 3), "segundos_redis": round(tiempo_redis, 3)}
+    finally:
+        if redis_client.get(CLAVE_CANDADO) == token.encode():
+            redis_client.delete(CLAVE_CANDADO)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--filas-por-segundo", type=float, default=2000, help="0 = sin límite")
+    parser.add_argument("--dias-recientes", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    from app.database import obtener_engine_replica, obtener_redis
+
+    def imprimir(progreso: Dict):
+        print(f"{progreso['incidentes']} incidentes, {progreso['claves_escritas']} claves escritas "
+              f"({progreso['filas_por_segundo']} filas/s)", flush=True)
+
+    resumen = precalentar_cache(obtener_engine_replica(), obtener_redis(), args.lote, args.filas_por_segundo,
+                                args.dias_recientes, imprimir)
+    if resumen is None:
+        print("Otro proceso está precalentando la caché", file=sys.stderr)
+        return 1
+    print(f"{resumen['incidentes']} incidentes en {resumen['segundos']}s "
+          f"(base de datos {resumen['segundos_base_datos']}s, Redis {resumen['segundos_redis']}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
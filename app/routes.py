@@ -1,16 +1,32 @@
+import logging
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from app.busqueda import BusquedaNoDisponible, buscar_incidentes, indexar_incidente
 from app.cliente_service import verificar_agente_existente, verificar_cliente_existente
+from app.concurrencia import DependenciaSaturada, sin_rechazos
+from app.duplicados import detector_duplicados, duplicados_activos
+from app.exportacion import TIPOS_CONTENIDO, FiltrosExportacion, generar_exportacion
 from app.external_services import registrar_incidente_facturado
+from app.idempotencia import SolicitudIdempotente, huella_cuerpo
+from app.limites import identidad_peticion, limitador_escritura, limitar_escritura, limitar_lectura
+from app.metricas import registro
 from app.models import Canal, Categoria, Estado, Incidente, LogIncidente, Prioridad
-from app.database import actualizar_incidente, create_incidente_cache, get_session, get_redis_client, obtener_incidente_cache, obtener_incidente_por_radicado, get_session_replica, obtener_logs_por_incidente, publish_message, create_problema_comun, obtener_problemas_comunes, ProblemaComun, registrar_log_incidente
+from app.database import actualizar_incidente, create_incidente_cache_async, get_session, get_redis_async, get_redis_client, obtener_incidente_cache_async, obtener_incidente_por_radicado_async, get_session_replica, get_fabrica_sesiones_replica, marcar_incidente_modificado_async, obtener_logs_por_incidente, publish_message, create_problema_comun, obtener_problemas_comunes, obtener_catalogo_cacheado, guardar_catalogo_cacheado, ProblemaComun, registrar_log_incidente
 from sqlmodel import Session, select
 from redis import Redis
-from typing import List
+from redis.asyncio import Redis as AsyncRedis
+from typing import Callable, List, Literal, Optional
 from app import config
 from app.security import ClientToken, get_current_client_token
+from app.sugerencias import sugerir_soluciones
+from app.trazas import span
 from app.utils import determinar_origen_cambio
+from app.versiones import clave_version_incidente, clave_version_incidentes, clave_version_soluciones, encabezados_condicionales, generar_etag, leer_version_async, no_modificado, obtener_version, obtener_version_async
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -20,84 +36,236 @@ async def health():
     return {"status": "ok"}
 
 
+@router.get("/metrics", include_in_schema=False)
+def metricas():
+    return PlainTextResponse(registro.exponer(), media_type="text/plain; version=0.0.4")
+
+
 @router.post("/incidente", response_model=Incidente)
 async def crear_incidente(
     event_data: Incidente,
     request: Request,
+    response: Response,
     session: Session = Depends(get_session),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_client: Redis = Depends(get_redis_client),
+    redis_async: AsyncRedis = Depends(get_redis_async),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=255)
 ):
-    event_data.id = None
+    await limitador_escritura.verificar_async(redis_async, identidad_peticion(request))
+    if not idempotency_key:
+        return await _crear_incidente(event_data, request, response, session, redis_client, redis_async)
+
+    solicitud = SolicitudIdempotente(redis_async, str(event_data.cliente_id), idempotency_key,
+                                     huella_cuerpo(await request.body()))
+    guardada = await solicitud.iniciar()
+    if guardada is not None:
+        return guardada
     try:
-        incidente = create_incidente_cache(
-            event_data, session, redis_client)
-        message_data = incidente.model_dump()
-        message_data["operation"] = "create"
-        publish_message(message_data, config.TOPIC_ID)
-        publish_message(message_data, config.NOTIFICATIONS_TOPIC_ID)
+        incidente = await _crear_incidente(event_data, request, response, session, redis_client, redis_async)
+        encabezados = {k: v for k, v in response.headers.items() if k.lower().startswith("x-incidente")}
+        with sin_rechazos():
+            await solicitud.guardar(incidente, encabezados=encabezados)
+        return incidente
+    finally:
+        with sin_rechazos():
+            await solicitud.liberar()
 
-        origen_cambio = determinar_origen_cambio(request.headers)
-        registrar_log_incidente(incidente, origen_cambio, session)
-        
+
+async def _crear_incidente(event_data: Incidente, request: Request, response: Response,
+                           session: Session, redis_client: Redis, redis_async: AsyncRedis):
+    event_data.id = None
+    try:
+        duplicado = None
+        if duplicados_activos():
+            # El detector usa el cliente Redis síncrono: corre fuera del event loop
+            duplicado = await run_in_threadpool(
+                detector_duplicados.buscar, event_data.cliente_id, event_data.description, redis_client)
+        if duplicado:
+            response.headers["X-Incidente-Duplicado"] = str(duplicado[0])
+            if config.DUPLICADOS_MODO == "fusionar":
+                existente = session.get(Incidente, duplicado[0])
+                if existente and existente.estado != Estado.cerrado:
+                    return existente
+
+        incidente = await create_incidente_cache_async(event_data, session, redis_async)
+        # Confirmado el incidente ya no se rechaza por saturación: el reintento lo duplicaría
+        with sin_rechazos():
+            indexar_incidente(incidente)
+            await marcar_incidente_modificado_async(incidente, redis_async, guardar_cache=False)
+            if duplicados_activos():
+                await run_in_threadpool(detector_duplicados.registrar,
+                                        incidente.cliente_id, incidente.id, incidente.description, redis_client)
+            message_data = incidente.model_dump()
+            message_data["operation"] = "create"
+            publish_message(message_data, config.TOPIC_ID)
+            publish_message(message_data, config.NOTIFICATIONS_TOPIC_ID)
+
+            origen_cambio = determinar_origen_cambio(request.headers)
+            registrar_log_incidente(incidente, origen_cambio, session)
+
+        # Los fallos de facturación ya se toleran: si está saturada solo queda el aviso
         try:
-            factura_response = await registrar_incidente_facturado(
-                radicado_incidente=incidente.radicado,
-                costo=100,  # Costo fijo de $100cop
-                fecha_incidente=incidente.fecha_creacion.isoformat(),
-                cliente_id=incidente.cliente_id
-            )
-            print("Incidente facturado registrado con éxito:", factura_response)
+            with span("facturacion.registrar"):
+                factura_response = await registrar_incidente_facturado(
+                    radicado_incidente=incidente.radicado,
+                    costo=100,  # Costo fijo de $100cop
+                    fecha_incidente=incidente.fecha_creacion.isoformat(),
+                    cliente_id=incidente.cliente_id
+                )
+            logger.info("Incidente facturado registrado con éxito", extra={"radicado": incidente.radicado, "factura": factura_response})
         except Exception as e:
-            print("Error al registrar el incidente facturado:", str(e))        
-        
+            logger.warning("Error al registrar el incidente facturado", extra={"radicado": incidente.radicado, "error": str(e)})
+
         return incidente
+    except DependenciaSaturada:
+        raise
     except Exception as e:
-        print("Error creating incident:", str(e))
+        logger.exception("Error al crear incidente")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/incidente/{incidente_id}", response_model=Incidente)
+@router.get("/incidente/{incidente_id}", response_model=Incidente, dependencies=[Depends(limitar_lectura)])
 async def obtener_incidente(
     incidente_id: int,
+    request: Request,
+    response: Response,
     session: Session = Depends(get_session_replica),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_async: AsyncRedis = Depends(get_redis_async)
 ):
-    incidente = obtener_incidente_cache(incidente_id, session, redis_client)
+    # La versión se lee sin cargar el incidente; solo se crea si el incidente existe
+    version = await leer_version_async(redis_async, clave_version_incidente(incidente_id))
+    if version is not None:
+        etag = generar_etag("incidente", incidente_id, version)
+        if no_modificado(request, etag, version):
+            return Response(status_code=304, headers=encabezados_condicionales(etag, version))
+
+    incidente = await obtener_incidente_cache_async(incidente_id, session, redis_async)
     if incidente:
+        if version is None:
+            version = await obtener_version_async(redis_async, clave_version_incidente(incidente_id))
+        response.headers.update(encabezados_condicionales(
+            generar_etag("incidente", incidente_id, version), version))
         return incidente
     else:
         raise HTTPException(status_code=404, detail="Incidente no encontrado")
 
 
-@router.get("/incidentes", response_model=list[Incidente])
+async def obtener_cliente_del_token(client_token: ClientToken):
+    """Retorna el id del cliente dueño del token, o ``None`` si el token es de un agente."""
+    try:
+        id_cliente = await verificar_cliente_existente(client_token.email, client_token.token)
+        logger.debug("Cliente encontrado", extra={"cliente_id": id_cliente})
+        return id_cliente
+    except HTTPException as client_exception:
+        if client_exception.status_code != 404:
+            raise client_exception
+        # Si no es un cliente, intentar verificar si es un agente
+        nit_agente = await verificar_agente_existente(client_token.email, client_token.token)
+        logger.debug("Agente encontrado", extra={"nit": nit_agente})
+        return None
+
+
+@router.get("/incidentes", response_model=list[Incidente], dependencies=[Depends(limitar_lectura)])
 async def obtener_todos_los_incidentes(
     request: Request,
+    response: Response,
     session: Session = Depends(get_session_replica),
+    redis_async: AsyncRedis = Depends(get_redis_async),
     client_token: ClientToken = Depends(get_current_client_token)
 ):
     try:
-        try:
-            id_cliente = await verificar_cliente_existente(client_token.email, client_token.token)
-            print("Cliente encontrado:", id_cliente)
-            statement = select(Incidente).where(
-                Incidente.cliente_id == id_cliente)
-        except HTTPException as client_exception:
-            if client_exception.status_code == 404:
-                # Si no es un cliente, intentar verificar si es un agente
-                nit_agente = await verificar_agente_existente(client_token.email, client_token.token)
-                print("Agente encontrado:", nit_agente)
-                statement = select(Incidente)
-            else:
-                raise client_exception
+        id_cliente = await obtener_cliente_del_token(client_token)
+        version = await obtener_version_async(redis_async, clave_version_incidentes(id_cliente))
+        etag = generar_etag("incidentes", id_cliente if id_cliente is not None else "todos", version)
+        encabezados = encabezados_condicionales(etag, version)
+        if no_modificado(request, etag, version):
+            return Response(status_code=304, headers=encabezados)
+        response.headers.update(encabezados)
+
+        statement = select(Incidente)
+        if id_cliente is not None:
+            statement = statement.where(Incidente.cliente_id == id_cliente)
 
         results = session.exec(statement).all()
-        print("Incidentes encontrados:", len(results))
+        logger.debug("Incidentes encontrados", extra={"cantidad": len(results)})
         return results
+    except DependenciaSaturada:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail="Error al obtener incidentes")
 
 
+class ResultadoBusqueda(BaseModel):
+    incidente: Incidente
+    score: float
+
+
+class PaginaBusqueda(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    resultados: List[ResultadoBusqueda]
+
+
+@router.get("/incidentes/search", response_model=PaginaBusqueda, dependencies=[Depends(limitar_lectura)])
+async def buscar_incidentes_endpoint(
+    q: str = Query(min_length=1),
+    page: int = Query(default=1, ge=1),
+    page_size: int = Query(default=20, ge=1, le=100),
+    session: Session = Depends(get_session_replica),
+    client_token: ClientToken = Depends(get_current_client_token)
+):
+    try:
+        id_cliente = await obtener_cliente_del_token(client_token)
+    except HTTPException as e:
+        raise HTTPException(status_code=403 if e.status_code == 404 else e.status_code, detail=e.detail)
+
+    try:
+        total, resultados = buscar_incidentes(
+            q, id_cliente, session, offset=(page - 1) * page_size, limite=page_size)
+    except BusquedaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+    return PaginaBusqueda(
+        total=total,
+        page=page,
+        page_size=page_size,
+        resultados=[ResultadoBusqueda(incidente=incidente, score=score) for incidente, score in resultados]
+    )
+
+
+@router.get("/incidentes/export", dependencies=[Depends(limitar_lectura)])
+async def exportar_incidentes(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    estado: Optional[Estado] = None,
+    categoria: Optional[Categoria] = None,
+    cliente_id: Optional[int] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    cursor: int = Query(default=0, ge=0),
+    gzip: bool = False,
+    abrir_sesion: Callable[[], Session] = Depends(get_fabrica_sesiones_replica),
+    client_token: ClientToken = Depends(get_current_client_token)
+):
+    try:
+        id_cliente = await obtener_cliente_del_token(client_token)
+    except HTTPException as e:
+        raise HTTPException(status_code=403 if e.status_code == 404 else e.status_code, detail=e.detail)
+
+    # Los clientes solo exportan sus propios incidentes; los agentes pueden filtrar por cliente
+    filtros = FiltrosExportacion(
+        cliente_id=id_cliente if id_cliente is not None else cliente_id,
+        estado=estado, categoria=categoria, desde=desde, hasta=hasta)
+    headers = {"Content-Disposition": f'attachment; filename="incidentes.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        generar_exportacion(abrir_sesion, format, filtros, cursor, config.EXPORTACION_TAMANO_LOTE, gzip),
+        media_type=TIPOS_CONTENIDO[format],
+        headers=headers
+    )
+
+
 @router.get("/incidentes/fields")
 async def obtener_valores_permitidos():
     return {
@@ -113,12 +281,14 @@ class SolucionRequest(BaseModel):
 # Ruta para solucionar un incidente
 
 
-@router.put("/incidente/{incidente_id}/solucionar", response_model=Incidente)
+@router.put("/incidente/{incidente_id}/solucionar", response_model=Incidente, dependencies=[Depends(limitar_escritura)])
 async def solucionar_incidente(
     incidente_id: int,
     event_data: SolucionRequest,
     request: Request,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_session),
+    redis_client: Redis = Depends(get_redis_client),
+    redis_async: AsyncRedis = Depends(get_redis_async)
 ):
 
     incidente_existente = session.get(Incidente, incidente_id)
@@ -128,25 +298,33 @@ async def solucionar_incidente(
 
     incidente_actualizado = actualizar_incidente(
         incidente_existente, event_data, session)
+    # Cambio confirmado: lo que sigue no se rechaza por saturación (ver app/concurrencia.py)
+    with sin_rechazos():
+        indexar_incidente(incidente_actualizado)
+        await marcar_incidente_modificado_async(incidente_actualizado, redis_async)
+        if duplicados_activos():
+            await run_in_threadpool(detector_duplicados.descartar,
+                                    incidente_actualizado.cliente_id, incidente_actualizado.id, redis_client)
+
+        message_data = incidente_actualizado.model_dump()
+        message_data["operation"] = "update"
+        publish_message(message_data, config.TOPIC_ID)
+        publish_message(message_data, config.NOTIFICATIONS_TOPIC_ID)
 
-    message_data = incidente_actualizado.model_dump()
-    message_data["operation"] = "update"
-    publish_message(message_data, config.TOPIC_ID)
-    publish_message(message_data, config.NOTIFICATIONS_TOPIC_ID)
-
-    origen_cambio = determinar_origen_cambio(request.headers)
+        origen_cambio = determinar_origen_cambio(request.headers)
 
-    registrar_log_incidente(incidente_actualizado, origen_cambio, session)
+        registrar_log_incidente(incidente_actualizado, origen_cambio, session)
 
     return incidente_actualizado
 
 # Ruta para escalar un incidente
 
 
-@router.put("/incidente/{incidente_id}/escalar", response_model=Incidente)
+@router.put("/incidente/{incidente_id}/escalar", response_model=Incidente, dependencies=[Depends(limitar_escritura)])
 async def escalar_incidente(
     incidente_id: int,
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_session),
+    redis_async: AsyncRedis = Depends(get_redis_async)
 ):
     incidente_existente = session.get(Incidente, incidente_id)
 
@@ -156,44 +334,85 @@ async def escalar_incidente(
     # Cambiar el estado a "escalado"
     incidente_existente.estado = "escalado"
     session.add(incidente_existente)
-    session.commit()
-    session.refresh(incidente_existente)
-
-    message_data = incidente_existente.model_dump()
-    message_data["operation"] = "update"
-    publish_message(message_data, config.TOPIC_ID)
+    with span("db.commit", tabla="incidente"):
+        session.commit()
+    with sin_rechazos():
+        session.refresh(incidente_existente)
+        await marcar_incidente_modificado_async(incidente_existente, redis_async)
+
+        message_data = incidente_existente.model_dump()
+        message_data["operation"] = "update"
+        publish_message(message_data, config.TOPIC_ID)
 
     return incidente_existente
 
 
-@router.get("/incidente/radicado/{radicado}", response_model=Incidente)
+@router.get("/incidente/radicado/{radicado}", response_model=Incidente, dependencies=[Depends(limitar_lectura)])
 async def obtener_incidente_por_radicado_endpoint(
     radicado: str,
     session: Session = Depends(get_session_replica),
-    redis_client: Redis = Depends(get_redis_client)
+    redis_async: AsyncRedis = Depends(get_redis_async)
 ):
-    incidente = obtener_incidente_por_radicado(radicado, session, redis_client)
+    incidente = await obtener_incidente_por_radicado_async(radicado, session, redis_async)
     if not incidente:
         raise HTTPException(status_code=404, detail="Incidente no encontrado")
     return incidente
 
 
-@router.post("/soluciones", response_model=ProblemaComun)
-def registrar_problema_comun(problema: ProblemaComun, session: Session = Depends(get_session)):
+@router.post("/soluciones", response_model=ProblemaComun, dependencies=[Depends(limitar_escritura)])
+def registrar_problema_comun(
+    problema: ProblemaComun,
+    session: Session = Depends(get_session),
+    redis_client: Redis = Depends(get_redis_client)
+):
     try:
-        return create_problema_comun(problema, session)
+        return create_problema_comun(problema, session, redis_client)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/soluciones", response_model=List[ProblemaComun])
-def listar_problemas_comunes(session: Session = Depends(get_session)):
+@router.get("/soluciones", response_model=List[ProblemaComun], dependencies=[Depends(limitar_lectura)])
+def listar_problemas_comunes(
+    request: Request,
+    cliente_id: Optional[int] = None,
+    session: Session = Depends(get_session_replica),
+    redis_client: Redis = Depends(get_redis_client)
+):
     try:
-        return obtener_problemas_comunes(session)
+        version = obtener_version(redis_client, clave_version_soluciones(cliente_id))
+        etag = generar_etag("soluciones", cliente_id if cliente_id is not None else "todos", version)
+        headers = encabezados_condicionales(etag, version)
+        if no_modificado(request, etag, version):
+            return Response(status_code=304, headers=headers)
+
+        catalogo = obtener_catalogo_cacheado(cliente_id, version, redis_client)
+        if catalogo is None:
+            problemas = obtener_problemas_comunes(session, cliente_id)
+            catalogo = guardar_catalogo_cacheado(cliente_id, version, problemas, redis_client)
+        return Response(content=catalogo, media_type="application/json", headers=headers)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/incidente/{incidente_id}/logs", response_model=List[LogIncidente])
+class SugerenciaRequest(BaseModel):
+    description: str
+    cliente_id: int
+    k: int = Field(default=5, ge=1, le=50)
+
+
+class SugerenciaSolucion(BaseModel):
+    problema: ProblemaComun
+    score: float
+
+
+@router.post("/soluciones/sugerencias", response_model=List[SugerenciaSolucion], dependencies=[Depends(limitar_lectura)])
+def sugerir_soluciones_incidente(event_data: SugerenciaRequest, session: Session = Depends(get_session_replica),
+                                 redis_client: Redis = Depends(get_redis_client)):
+    sugerencias = sugerir_soluciones(
+        event_data.description, event_data.cliente_id, session, event_data.k, redis_client)
+    return [SugerenciaSolucion(problema=problema, score=score) for problema, score in sugerencias]
+
+
+@router.get("/incidente/{incidente_id}/logs", response_model=List[LogIncidente], dependencies=[Depends(limitar_lectura)])
 async def obtener_logs_incidente(incidente_id: int, session: Session = Depends(get_session_replica)):
     return obtener_logs_por_incidente(incidente_id, session)
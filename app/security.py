@@ -1,3 +1,5 @@
+import logging
+import secrets
 from fastapi import Request, HTTPException, Depends
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
@@ -7,6 +9,8 @@ from app import config
 SECRET_KEY = config.SECRET_KEY
 ALGORITHM = "HS256"
 
+logger = logging.getLogger(__name__)
+
 class ClientToken:
     def __init__(self, email: str, token: str):
         self.email = email
@@ -14,7 +18,7 @@ class ClientToken:
 
 def get_current_client_token(request: Request, db: Session = Depends(get_session)) -> ClientToken:
 
-    print("get_current_client_token", request.headers)
+    logger.debug("get_current_client_token", extra={"headers": request.headers})
     credentials_exception = HTTPException(
         status_code=401,
         detail="No se pudieron validar las credenciales",
@@ -36,4 +40,12 @@ def get_current_client_token(request: Request, db: Session = Depends(get_session
     except JWTError:
         raise credentials_exception
     
-    return ClientToken(email=email, token=token)
\ No newline at end of file
+    return ClientToken(email=email, token=token)
+
+
+def verificar_acceso_interno(request: Request):
+    """Protege los endpoints internos (/debug/*) con el token configurado en DEBUG_TOKEN."""
+    if not config.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("X-Debug-Token", ""), config.DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Acceso interno no autorizado")
@@ -0,0 +1,257 @@
+"""Lanzador de producción: ``python -m app.servidor``.
+
+El proceso supervisor importa la aplicación una sola vez (los workers la heredan
+con ``fork``), abre el socket y mantiene ``SERVIDOR_WORKERS`` procesos uvicorn.
+Antes del fork el supervisor sincroniza el esquema de la base (una sola vez).
+Cada worker ejecuta su propio lifespan, de modo que conexiones, hilos de logging
+y exportadores se crean después del fork. Un worker se recicla al atender
+``SERVIDOR_MAX_PETICIONES`` peticiones (con un margen aleatorio para que no
+reinicien todos a la vez) o al superar ``SERVIDOR_MAX_MEMORIA_MB`` de RSS.
+
+Un worker que termina con error antes de ``SERVIDOR_VIDA_MINIMA_S`` cuenta como
+fallo de arranque: los reinicios siguientes esperan el doble cada vez (hasta
+``SERVIDOR_REINICIO_ESPERA_MAX_S``) para no entrar en un ciclo de forks.
+
+SIGTERM/SIGINT detienen los workers con apagado ordenado: uvicorn deja de aceptar
+conexiones, espera las peticiones en curso hasta ``SERVIDOR_TIEMPO_APAGADO``
+segundos y luego corre el shutdown del lifespan, que vacía trazas y logs.
+"""
+import importlib.util
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional, Set
+
+import uvicorn
+
+from app import config
+from app.database import detener_preparacion_cache, liberar_recursos, sincronizar_esquemas
+from app.logger import FormatoJSON
+
+logger = logging.getLogger("app.servidor")
+
+
+def cpus_disponibles() -> int:
+    """CPUs utilizables por el proceso, respetando la afinidad y la cuota de cgroups."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as archivo:
+            cuota, periodo = archivo.read().split()
+        if cuota != "max":
+            cpus = min(cpus, max(1, int(int(cuota) / int(periodo) + 0.5)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def calcular_workers() -> int:
+    if config.SERVIDOR_WORKERS > 0:
+        return config.SERVIDOR_WORKERS
+    return cpus_disponibles()
+
+
+def _disponible(modulo: str) -> bool:
+    return importlib.util.find_spec(modulo) is not None
+
+
+def configuracion_uvicorn(app) -> uvicorn.Config:
+    max_peticiones = None
+    if config.SERVIDOR_MAX_PETICIONES > 0:
+        max_peticiones = config.SERVIDOR_MAX_PETICIONES + random.randint(0, config.SERVIDOR_MAX_PETICIONES // 10)
+    return uvicorn.Config(
+        app,
+        loop="uvloop" if _disponible("uvloop") else "asyncio",
+        http="httptools" if _disponible("httptools") else "h11",
+        lifespan="on",
+        access_log=config.SERVIDOR_ACCESS_LOG,
+        proxy_headers=True,
+        # Con "*" cualquier cliente elegiría su IP con X-Forwarded-For (ver app/limites.py)
+        forwarded_allow_ips=config.SERVIDOR_PROXIES_CONFIABLES,
+        timeout_keep_alive=config.SERVIDOR_KEEPALIVE,
+        timeout_graceful_shutdown=config.SERVIDOR_TIEMPO_APAGADO,
+        limit_max_requests=max_peticiones,
+        backlog=config.SERVIDOR_BACKLOG,
+    )
+
+
+def memoria_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/statm", encoding="utf-8") as archivo:
+            paginas = int(archivo.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def crear_socket(host: str, puerto: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.cantidad = workers
+        self.workers: Dict[int, float] = {}
+        # Workers que ya recibieron SIGTERM y están drenando
+        self.saliendo: Set[int] = set()
+        self.deteniendo = False
+        self.fallos_seguidos = 0
+        self.proximo_inicio = 0.0
+
+    def iniciar_worker(self):
+        # Un hilo vivo durante el fork deja en el hijo sus locks tomados y sin dueño
+        detener_preparacion_cache()
+        pid = os.fork()
+        if pid == 0:
+            self._ejecutar_worker()
+        self.workers[pid] = time.monotonic()
+        logger.info("Worker iniciado", extra={"pid": pid})
+
+    def _ejecutar_worker(self):
+        codigo = 0
+        try:
+            for senal in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(senal, signal.SIG_DFL)
+            servidor = uvicorn.Server(configuracion_uvicorn(self.app))
+            servidor.run(sockets=[self.sock])
+            if not servidor.started:
+                # uvicorn retorna sin error cuando falla el startup del lifespan
+                codigo = 1
+        except BaseException:
+            logger.exception("El worker terminó con error")
+            codigo = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(codigo)
+
+    def _terminar(self, senal, _frame):
+        if not self.deteniendo:
+            logger.info("Apagando workers", extra={"senal": signal.Signals(senal).name})
+        self.deteniendo = True
+
+    def _recoger(self):
+        while self.workers:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            inicio = self.workers.pop(pid, None)
+            reciclado = pid in self.saliendo
+            self.saliendo.discard(pid)
+            if inicio is None or self.deteniendo:
+                continue
+            codigo = os.waitstatus_to_exitcode(estado)
+            logger.info("Worker finalizado", extra={"pid": pid, "codigo": codigo})
+            if not reciclado:
+                self._registrar_salida(codigo, time.monotonic() - inicio)
+
+    def _registrar_salida(self, codigo: int, vida: float):
+        if codigo == 0 or vida >= config.SERVIDOR_VIDA_MINIMA_S:
+            self.fallos_seguidos = 0
+            return
+        self.fallos_seguidos += 1
+        espera = min(config.SERVIDOR_REINICIO_ESPERA_MAX_S,
+                     config.SERVIDOR_REINICIO_ESPERA_S * 2 ** (self.fallos_seguidos - 1))
+        self.proximo_inicio = time.monotonic() + espera
+        logger.warning("Worker falló al arrancar, esperando antes de reiniciarlo",
+                       extra={"fallos_seguidos": self.fallos_seguidos, "espera_s": espera})
+
+    def _faltantes(self) -> int:
+        if time.monotonic() < self.proximo_inicio:
+            return 0
+        faltan = self.cantidad - (len(self.workers) - len(self.saliendo))
+        # Mientras los workers fallan se prueba de a uno
+        return min(faltan, 1) if self.fallos_seguidos else faltan
+
+    def _vigilar_memoria(self):
+        if config.SERVIDOR_MAX_MEMORIA_MB <= 0:
+            return
+        for pid in list(self.workers):
+            if pid in self.saliendo:
+                continue
+            rss = memoria_rss_mb(pid)
+            if rss is not None and rss > config.SERVIDOR_MAX_MEMORIA_MB:
+                logger.warning("Worker supera el límite de memoria, reciclando",
+                               extra={"pid": pid, "rss_mb": round(rss, 1)})
+                os.kill(pid, signal.SIGTERM)
+                # Se reemplaza de inmediato; mientras drena no cuenta como worker activo
+                self.saliendo.add(pid)
+
+    def ejecutar(self) -> int:
+        signal.signal(signal.SIGTERM, self._terminar)
+        signal.signal(signal.SIGINT, self._terminar)
+        while not self.deteniendo:
+            self._recoger()
+            for _ in range(self._faltantes()):
+                self.iniciar_worker()
+            self._vigilar_memoria()
+            time.sleep(0.5)
+        return self.detener()
+
+    def detener(self) -> int:
+        for pid in list(self.workers):
+            if pid in self.saliendo:
+                continue
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        limite = time.monotonic() + config.SERVIDOR_TIEMPO_APAGADO + 5
+        while self.workers and time.monotonic() < limite:
+            self._recoger()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Worker no terminó a tiempo, forzando", extra={"pid": pid})
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.sock.close()
+        return 0
+
+
+def _configurar_logging_supervisor():
+    # El supervisor no arranca el QueueListener de app.logger: sus hilos no
+    # sobreviven al fork y cada worker configura el suyo en el lifespan.
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON())
+    logger.handlers[:] = [salida]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def main(app_ruta: str = "main:app") -> int:
+    _configurar_logging_supervisor()
+    modulo, _, atributo = app_ruta.partition(":")
+    app = getattr(importlib.import_module(modulo), atributo)
+    if not config.is_testing():
+        # El DDL corre una sola vez aquí y no en cada worker; las conexiones se
+        # cierran antes del fork para que ningún worker herede los sockets
+        sincronizar_esquemas()
+        liberar_recursos()
+    sock = crear_socket(config.SERVIDOR_HOST, config.SERVIDOR_PUERTO, config.SERVIDOR_BACKLOG)
+    workers = calcular_workers()
+    logger.info("Servidor escuchando", extra={
+        "host": config.SERVIDOR_HOST, "puerto": config.SERVIDOR_PUERTO, "workers": workers,
+        "loop": "uvloop" if _disponible("uvloop") else "asyncio",
+        "http": "httptools" if _disponible("httptools") else "h11"})
+    return Supervisor(app, sock, workers).ejecutar()
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
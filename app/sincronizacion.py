@@ -0,0 +1,374 @@
+"""Consumidor que aplica en la réplica los mensajes del tópico ``incidentes-db-sync``.
+
+``crear_incidente``, ``solucionar_incidente`` y ``escalar_incidente`` publican la
+fila completa con ``operation`` (``create``/``update``) y el archivo publica
+``{"operation": "archive", "ids": [...]}``. El consumidor extrae mensajes por
+lotes (pull) y aplica cada lote en una sola transacción de la réplica:
+
+* las filas se deduplican por incidente (gana la publicada más tarde) y se
+  escriben ordenadas por id con un upsert masivo según el dialecto
+  (``ON DUPLICATE KEY UPDATE`` en MySQL, ``ON CONFLICT`` en SQLite/PostgreSQL),
+  así que reaplicar un mensaje no cambia nada;
+* ``sincronizacion_version`` guarda, por incidente, la fecha de publicación (en
+  microsegundos) de la fila aplicada. Una fila solo se escribe si es más reciente,
+  así que un mensaje atrasado o reentregado en otro lote no pisa uno posterior;
+* tras el commit se borran las marcas de ausencia de las filas aplicadas y, si
+  son actualizaciones, las claves ``incidente:*`` cacheadas, y se renuevan las
+  versiones (ETag) del incidente y de sus listados;
+* los ``archive`` usan ``mover_a_archivo``, que también es idempotente, y un
+  incidente ya archivado no vuelve a la tabla caliente;
+* el punto de control (``sincronizacion_replica``) guarda la fecha de publicación
+  del último mensaje aplicado y el total de mensajes, en la misma transacción.
+
+Los mensajes se confirman (ack) solo después del commit. Si la base no está
+disponible (error de conexión) no se confirma nada y Pub/Sub los vuelve a entregar.
+Si el lote falla por otra causa se aplica mensaje por mensaje, y los que fallan
+solos se guardan en ``sincronizacion_descartados`` y se confirman: una fila que
+nunca se puede escribir no bloquea la suscripción. Los mensajes que no se pueden
+interpretar se registran y se confirman.
+
+El retraso de replicación (aplicación - publicación) se expone en
+``replica_sync_lag_seconds`` y se registra en el log cada ``_INTERVALO_REPORTE``
+segundos. Se ejecuta como proceso aparte (uno por réplica)::
+
+    python -m app.sincronizacion
+"""
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+from redis import Redis
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, MetaData, String, Table, Text, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app import config
+from app.archivo import mover_a_archivo
+from app.filtro_negativo import borrar_ausentes
+from app.metricas import registro
+from app.models import Incidente, IncidenteArchivado
+from app.versiones import clave_version_incidente, clave_version_incidentes, nueva_version
+
+logger = logging.getLogger(__name__)
+
+MENSAJES_APLICADOS = registro.contador(
+    "replica_sync_messages_total", "Mensajes de sincronización procesados por operación", ("operation",))
+RETRASO_REPLICA = registro.histograma(
+    "replica_sync_lag_seconds", "Tiempo entre la publicación de un mensaje y su aplicación en la réplica",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+_INTERVALO_REPORTE = 60.0
+
+_metadata = MetaData()
+punto_control = Table(
+    "sincronizacion_replica", _metadata,
+    Column("suscripcion", String(255), primary_key=True),
+    Column("ultimo_publicado", DateTime),
+    Column("mensajes", BigInteger, nullable=False),
+    Column("actualizado", DateTime, nullable=False),
+)
+version_incidente = Table(
+    "sincronizacion_version", _metadata,
+    Column("incidente_id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False),
+    Column("version", BigInteger, nullable=False),
+)
+descartados = Table(
+    "sincronizacion_descartados", _metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("suscripcion", String(255), nullable=False),
+    Column("publicado", DateTime, nullable=False),
+    Column("datos", Text, nullable=False),
+    Column("error", Text, nullable=False),
+    Column("registrado", DateTime, nullable=False),
+)
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Mensaje:
+    __slots__ = ("ack_id", "datos", "publicado")
+
+    def __init__(self, ack_id: str, datos: bytes, publicado: datetime):
+        self.ack_id = ack_id
+        self.datos = datos
+        self.publicado = publicado
+
+
+class Suscriptor(Protocol):
+    def extraer(self, maximo: int) -> List[Mensaje]: ...
+
+    def confirmar(self, ack_ids: List[str]): ...
+
+
+class SuscriptorPubSub:
+    """Pull síncrono sobre ``google.cloud.pubsub_v1.SubscriberClient``."""
+
+    def __init__(self, proyecto: str, suscripcion: str, timeout_s: float = 10.0):
+        from google.cloud import pubsub_v1
+        self.cliente = pubsub_v1.SubscriberClient()
+        self.ruta = self.cliente.subscription_path(proyecto, suscripcion)
+        self.timeout_s = timeout_s
+
+    def extraer(self, maximo: int) -> List[Mensaje]:
+        from google.api_core.exceptions import DeadlineExceeded
+        try:
+            respuesta = self.cliente.pull(request={"subscription": self.ruta, "max_messages": maximo},
+                                          timeout=self.timeout_s)
+        except DeadlineExceeded:
+            return []
+        return [Mensaje(recibido.ack_id, recibido.message.data, recibido.message.publish_time)
+                for recibido in respuesta.received_messages]
+
+    def confirmar(self, ack_ids: List[str]):
+        if ack_ids:
+            self.cliente.acknowledge(request={"subscription": self.ruta, "ack_ids": ack_ids})
+
+
+def upsert(conn: Connection, tabla: Table, filas: List[Dict], clave: str = "id"):
+    """INSERT masivo que actualiza las filas existentes, con la sintaxis del dialecto."""
+    if not filas:
+        return
+    columnas = [columna for columna in filas[0] if columna != clave]
+    dialecto = conn.dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as insert_mysql
+        sentencia = insert_mysql(tabla).values(filas)
+        sentencia = sentencia.on_duplicate_key_update({c: sentencia.inserted[c] for c in columnas})
+    elif dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+        sentencia = insert_dialecto(tabla).values(filas)
+        sentencia = sentencia.on_conflict_do_update(index_elements=[clave],
+                                                    set_={c: sentencia.excluded[c] for c in columnas})
+    else:
+        raise ValueError(f"Upsert no soportado para el dialecto {dialecto}")
+    conn.execute(sentencia)
+
+
+def _fila_incidente(datos: Dict) -> Dict:
+    """Fila con todas las columnas de ``incidente``; las fechas llegan como texto ISO."""
+    fila = {}
+    for columna in Incidente.__table__.columns:
+        valor = datos.get(columna.name)
+        if isinstance(valor, str) and isinstance(columna.type, DateTime):
+            valor = datetime.fromisoformat(valor)
+        elif isinstance(valor, str) and isinstance(columna.type, Date):
+            valor = date.fromisoformat(valor)
+        fila[columna.name] = valor
+    return fila
+
+
+def _utc(momento: datetime) -> datetime:
+    return momento.astimezone(timezone.utc) if momento.tzinfo else momento.replace(tzinfo=timezone.utc)
+
+
+def _version(momento: datetime) -> int:
+    # Entero exacto: DATETIME de MySQL guarda segundos y el float de timestamp() redondea
+    return (_utc(momento) - _EPOCA) // timedelta(microseconds=1)
+
+
+def _transitorio(error: BaseException) -> bool:
+    """``True`` si el error es de la conexión y reintentar el lote puede funcionar."""
+    return isinstance(error, (OperationalError, InterfaceError)) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+Operacion = Tuple[Mensaje, str, Dict]
+
+
+class ConsumidorReplica:
+    def __init__(self, engine, suscriptor: Suscriptor, suscripcion: str, lote: int = 100,
+                 redis_client: Optional[Redis] = None):
+        self.engine = engine
+        self.suscriptor = suscriptor
+        self.suscripcion = suscripcion
+        self.lote = lote
+        self.redis = redis_client
+        self.ultimo_retraso: Optional[float] = None
+        _metadata.create_all(engine)
+
+    def procesar_lote(self) -> int:
+        """Extrae y aplica un lote; retorna la cantidad de mensajes procesados."""
+        mensajes = self.suscriptor.extraer(self.lote)
+        if not mensajes:
+            return 0
+
+        operaciones = [operacion for operacion in map(self._interpretar, mensajes) if operacion is not None]
+        try:
+            self._aplicar(operaciones)
+        except Exception as e:
+            if _transitorio(e):
+                raise
+            logger.warning("Lote de sincronización rechazado, se aplica mensaje por mensaje",
+                           extra={"mensajes": len(operaciones), "error": str(e)})
+            for operacion in operaciones:
+                try:
+                    self._aplicar([operacion])
+                except Exception as error:
+                    if _transitorio(error):
+                        raise
+                    self._descartar(operacion[0], error)
+        self.suscriptor.confirmar([mensaje.ack_id for mensaje in mensajes])
+
+        ahora = datetime.now(timezone.utc)
+        for mensaje in mensajes:
+            RETRASO_REPLICA.observar((ahora - _utc(mensaje.publicado)).total_seconds())
+        self.ultimo_retraso = (ahora - max(_utc(m.publicado) for m in mensajes)).total_seconds()
+        return len(mensajes)
+
+    def _interpretar(self, mensaje: Mensaje) -> Optional[Operacion]:
+        try:
+            datos = json.loads(mensaje.datos)
+            operacion = datos.pop("operation")
+            if operacion == "archive":
+                datos["ids"] = [int(i) for i in datos["ids"]]
+            elif operacion in ("create", "update"):
+                datos = _fila_incidente(datos)
+                datos["id"] = int(datos["id"])
+            else:
+                raise ValueError(f"Operación desconocida: {operacion}")
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Mensaje de sincronización inválido, se descarta",
+                           extra={"ack_id": mensaje.ack_id, "error": str(e)})
+            MENSAJES_APLICADOS.inc("invalid")
+            return None
+        return mensaje, operacion, datos
+
+    def _aplicar(self, operaciones: List[Operacion]):
+        """Aplica las operaciones en una transacción de la réplica."""
+        if not operaciones:
+            return
+        filas: Dict[int, Dict] = {}
+        versiones: Dict[int, int] = {}
+        actualizados, archivar = set(), set()
+        for mensaje, operacion, datos in sorted(operaciones, key=lambda o: _utc(o[0].publicado)):
+            if operacion == "archive":
+                archivar.update(datos["ids"])
+                for incidente_id in datos["ids"]:
+                    filas.pop(incidente_id, None)
+            else:
+                filas[datos["id"]] = datos
+                versiones[datos["id"]] = _version(mensaje.publicado)
+                if operacion == "update":
+                    actualizados.add(datos["id"])
+
+        with self.engine.begin() as conn:
+            if filas:
+                ids = list(filas)
+                archivados = set(conn.execute(
+                    select(IncidenteArchivado.id).where(IncidenteArchivado.id.in_(ids))).scalars())
+                # FOR UPDATE: dos consumidores no deciden a la vez sobre la misma versión
+                aplicadas = dict(conn.execute(
+                    select(version_incidente.c.incidente_id, version_incidente.c.version)
+                    .where(version_incidente.c.incidente_id.in_(ids)).with_for_update()).all())
+                vigentes = [incidente_id for incidente_id in sorted(filas) if incidente_id not in archivados
+                            and versiones[incidente_id] > aplicadas.get(incidente_id, -1)]
+                # Orden por id: dos consumidores concurrentes toman los bloqueos en el mismo orden
+                upsert(conn, Incidente.__table__, [filas[incidente_id] for incidente_id in vigentes])
+                upsert(conn, version_incidente, [{"incidente_id": incidente_id, "version": versiones[incidente_id]}
+                                                 for incidente_id in vigentes], clave="incidente_id")
+                filas = {incidente_id: filas[incidente_id] for incidente_id in vigentes}
+            mover_a_archivo(conn, sorted(archivar))
+            self._guardar_punto_control(conn, max(_utc(o[0].publicado) for o in operaciones), len(operaciones))
+
+        for _, operacion, _ in operaciones:
+            MENSAJES_APLICADOS.inc(operacion)
+        self._invalidar_cache(list(filas.values()), actualizados)
+
+    def _descartar(self, mensaje: Mensaje, error: Exception):
+        """Guarda un mensaje que no se puede aplicar para revisarlo y reenviarlo a mano."""
+        logger.error("Mensaje de sincronización descartado", extra={"ack_id": mensaje.ack_id, "error": str(error)})
+        datos = mensaje.datos.decode(errors="replace") if isinstance(mensaje.datos, bytes) else str(mensaje.datos)
+        with self.engine.begin() as conn:
+            conn.execute(insert(descartados).values(
+                suscripcion=self.suscripcion, publicado=_utc(mensaje.publicado).replace(tzinfo=None), datos=datos,
+                error=str(error), registrado=datetime.now(timezone.utc).replace(tzinfo=None)))
+        MENSAJES_APLICADOS.inc("dead_letter")
+
+    def _guardar_punto_control(self, conn: Connection, ultimo_publicado: datetime, cantidad: int):
+        anterior = conn.execute(select(punto_control.c.ultimo_publicado, punto_control.c.mensajes)
+                                .where(punto_control.c.suscripcion == self.suscripcion)).first()
+        publicado = ultimo_publicado.replace(tzinfo=None)
+        if anterior is not None and anterior.ultimo_publicado is not None:
+            publicado = max(publicado, anterior.ultimo_publicado)
+        upsert(conn, punto_control, [{
+            "suscripcion": self.suscripcion, "ultimo_publicado": publicado,
+            "mensajes": (anterior.mensajes if anterior is not None else 0) + cantidad,
+            "actualizado": datetime.now(timezone.utc).replace(tzinfo=None),
+        }], clave="suscripcion")
+
+    def _invalidar_cache(self, filas: List[Dict], actualizados: Iterable[int]):
+        # Una lectura entre el commit en la primaria y la aplicación en la réplica pudo
+        # cachear la versión anterior del incidente, o marcarlo como ausente. Renovar
+        # las versiones evita que ese contenido siga respondiendo 304 con el ETag nuevo
+        if self.redis is None or not filas:
+            return
+        actualizados = set(actualizados)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            borrar_ausentes(pipe, filas)
+            claves = [clave for fila in filas if fila["id"] in actualizados
+                      for clave in (f"incidente:{fila['id']}", f"incidente:radicado:{fila['radicado']}")]
+            if claves:
+                pipe.delete(*claves)
+            version = nueva_version()
+            versiones = {clave_version_incidentes(None)}
+            for fila in filas:
+                versiones.add(clave_version_incidentes(fila["cliente_id"]))
+                if fila["id"] in actualizados:
+                    versiones.add(clave_version_incidente(fila["id"]))
+            for clave in sorted(versiones):
+                pipe.set(clave, version)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("No se pudo invalidar la caché tras sincronizar", extra={"error": str(e)})
+
+    def punto_control(self) -> Optional[Dict]:
+        with self.engine.connect() as conn:
+            fila = conn.execute(select(punto_control).where(punto_control.c.suscripcion == self.suscripcion)).first()
+        return dict(fila._mapping) if fila is not None else None
+
+    def ejecutar(self, detener: threading.Event, espera_s: float = 1.0):
+        procesados_total, ultimo_reporte = 0, time.monotonic()
+        while not detener.is_set():
+            try:
+                procesados = self.procesar_lote()
+            except Exception:
+                logger.exception("Error aplicando el lote de sincronización")
+                procesados = 0
+            procesados_total += procesados
+            if time.monotonic() - ultimo_reporte >= _INTERVALO_REPORTE:
+                logger.info("Sincronización de la réplica", extra={
+                    "mensajes": procesados_total, "retraso_s": self.ultimo_retraso})
+                procesados_total, ultimo_reporte = 0, time.monotonic()
+            if procesados == 0:
+                detener.wait(espera_s)
+
+
+def main() -> int:
+    from app.database import obtener_engine_replica, obtener_redis
+    from app.logger import configurar_logging, detener_logging
+
+    configurar_logging()
+    detener = threading.Event()
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(senal, lambda *_: detener.set())
+
+    consumidor = ConsumidorReplica(
+        obtener_engine_replica(), SuscriptorPubSub(config.PROJECT_ID, config.SINCRONIZACION_SUSCRIPCION),
+        config.SINCRONIZACION_SUSCRIPCION, config.SINCRONIZACION_LOTE, obtener_redis())
+    logger.info("Consumidor de sincronización iniciado", extra={"suscripcion": config.SINCRONIZACION_SUSCRIPCION})
+    consumidor.ejecutar(detener, config.SINCRONIZACION_ESPERA_S)
+    detener_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
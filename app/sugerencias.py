@@ -0,0 +1,110 @@
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from redis import Redis
+from sqlmodel import Session, select
+
+from app.indice_texto import IndiceBM25
+from app.models import ProblemaComun
+from app.versiones import clave_catalogo_soluciones, clave_version_soluciones, leer_version
+
+# Un índice por cliente, construido la primera vez que se consulta y
+# actualizado incrementalmente al registrar nuevos problemas comunes. Cada índice
+# recuerda la versión del catálogo del cliente (app.versiones) con que se
+# construyó; si otra instancia registra un problema la versión cambia y el índice
+# se reconstruye en la siguiente consulta. Toda escritura y lectura de estos
+# diccionarios ocurre bajo ``_lock``; la carga desde la base o Redis, no.
+_indices: Dict[int, IndiceBM25] = {}
+_problemas: Dict[int, Dict[int, ProblemaComun]] = {}
+_versiones: Dict[int, Optional[str]] = {}
+_lock = threading.Lock()
+
+
+def _texto_problema(problema: ProblemaComun) -> str:
+    return f"{problema.description} {problema.solucion}"
+
+
+def _copiar_problema(problema: ProblemaComun) -> ProblemaComun:
+    # Copia desligada de la sesión para que el índice no dependa de su ciclo de vida
+    return ProblemaComun(**problema.model_dump())
+
+
+def _cargar_problemas(cliente_id: int, session: Session, version: Optional[str],
+                      redis_client: Optional[Redis]) -> List[ProblemaComun]:
+    # El catálogo cacheado de la versión se llenó desde la primaria (create_problema_comun),
+    # así que trae el problema nuevo aunque la réplica aún no lo tenga
+    if redis_client is not None and version is not None:
+        catalogo = redis_client.get(clave_catalogo_soluciones(cliente_id, version))
+        if catalogo is not None:
+            return [ProblemaComun(**datos) for datos in json.loads(catalogo)]
+    return session.exec(select(ProblemaComun).where(ProblemaComun.cliente_id == cliente_id)).all()
+
+
+def _indice_vigente(cliente_id: int, version: Optional[str]) -> Optional[Tuple[IndiceBM25, Dict[int, ProblemaComun]]]:
+    # Requiere _lock
+    indice = _indices.get(cliente_id)
+    if indice is not None and (version is None or _versiones.get(cliente_id) == version):
+        return indice, _problemas[cliente_id]
+    return None
+
+
+def obtener_indice_problemas(cliente_id: int, session: Session, version: Optional[str] = None,
+                             redis_client: Optional[Redis] = None) -> Tuple[IndiceBM25, Dict[int, ProblemaComun]]:
+    """Índice del cliente y sus problemas; se reconstruye si ``version`` no es con la que se construyó.
+
+    ``version`` en ``None`` (sin Redis o sin versión publicada) usa el índice existente.
+    """
+    with _lock:
+        vigente = _indice_vigente(cliente_id, version)
+    if vigente is not None:
+        return vigente
+
+    # La carga ocurre fuera del lock: no frena las consultas de los demás clientes
+    problemas = {p.id: _copiar_problema(p) for p in _cargar_problemas(cliente_id, session, version, redis_client)}
+    indice = IndiceBM25()
+    indice.agregar_varios((p.id, _texto_problema(p)) for p in problemas.values())
+
+    with _lock:
+        vigente = _indice_vigente(cliente_id, version)
+        if vigente is not None:
+            # Otra petición publicó la misma versión mientras cargábamos
+            return vigente
+        # Los problemas comunes no se borran: los ya indexados (también los registrados
+        # durante la carga) se conservan por si la réplica todavía no tiene alguno
+        for problema_id, problema in _problemas.get(cliente_id, {}).items():
+            if problema_id not in problemas:
+                problemas[problema_id] = problema
+                indice.agregar(problema_id, _texto_problema(problema))
+        _indices[cliente_id] = indice
+        _problemas[cliente_id] = problemas
+        _versiones[cliente_id] = version
+    return indice, problemas
+
+
+def indexar_problema_comun(problema: ProblemaComun, version: Optional[str] = None):
+    """Agrega ``problema`` al índice del cliente; ``version`` es la del catálogo que ya lo incluye."""
+    with _lock:
+        # Si el índice del cliente aún no existe se construirá desde la base de datos
+        # en la primera consulta, así que no hace falta crearlo aquí.
+        indice = _indices.get(problema.cliente_id)
+        if indice is None:
+            return
+        _problemas[problema.cliente_id][problema.id] = _copiar_problema(problema)
+        indice.agregar(problema.id, _texto_problema(problema))
+        if version is not None:
+            _versiones[problema.cliente_id] = version
+
+
+def sugerir_soluciones(description: str, cliente_id: int, session: Session, k: int = 5,
+                       redis_client: Optional[Redis] = None) -> List[Tuple[ProblemaComun, float]]:
+    version = leer_version(redis_client, clave_version_soluciones(cliente_id)) if redis_client is not None else None
+    indice, problemas = obtener_indice_problemas(cliente_id, session, version, redis_client)
+    return [(problemas[problema_id], puntaje) for problema_id, puntaje in indice.buscar(description, k)]
+
+
+def reiniciar_indices():
+    with _lock:
+        _indices.clear()
+        _problemas.clear()
+        _versiones.clear()
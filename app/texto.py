@@ -0,0 +1,24 @@
+import re
+import unicodedata
+from typing import List
+
+_PATRON_PALABRA = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset({
+    "a", "al", "algo", "ante", "con", "como", "de", "del", "desde", "el", "ella",
+    "en", "entre", "era", "es", "esta", "este", "esto", "fue", "ha", "hay", "la",
+    "las", "le", "les", "lo", "los", "me", "mi", "mas", "muy", "no", "nos", "o",
+    "para", "pero", "por", "que", "se", "si", "sin", "sobre", "su", "sus", "te",
+    "tiene", "un", "una", "uno", "unos", "unas", "y", "ya", "yo",
+})
+
+
+def normalizar_texto(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str) -> List[str]:
+    if not texto:
+        return []
+    return [t for t in _PATRON_PALABRA.findall(normalizar_texto(texto)) if t not in STOPWORDS]
@@ -0,0 +1,194 @@
+"""Trazas distribuidas con propagación W3C Trace Context.
+
+Cada petición muestreada abre un span raíz en ``TrazasMiddleware`` y los pasos
+costosos (commit, refresh, publicaciones, log, facturación) abren spans hijos
+con ``span(...)``. Los spans terminados se exportan desde un hilo en segundo
+plano a la consola o a un archivo JSON lines, así que no se necesita un
+colector para ver la cascada de una petición.
+"""
+import contextvars
+import json
+import queue
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app import config
+
+_PATRON_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "nombre", "inicio", "fin", "atributos", "error", "muestreado")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], nombre: str, muestreado: bool):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.nombre = nombre
+        self.inicio = time.time_ns()
+        self.fin = None
+        self.atributos: Dict[str, object] = {}
+        self.error = None
+        self.muestreado = muestreado
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.muestreado else '00'}"
+
+    def a_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.nombre,
+            "start_unix_nano": self.inicio,
+            "duration_ms": round((self.fin - self.inicio) / 1e6, 3),
+            "attributes": self.atributos,
+            "error": self.error,
+        }
+
+
+_span_actual: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span_actual", default=None)
+
+
+class Exportador:
+    """Escribe los spans terminados desde un hilo propio para no bloquear las peticiones."""
+
+    def __init__(self, destino):
+        self._destino = destino
+        self._cola: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._hilo = threading.Thread(target=self._ejecutar, name="exportador-trazas", daemon=True)
+        self._hilo.start()
+
+    def exportar(self, span: Span):
+        self._cola.put(span)
+
+    def _ejecutar(self):
+        while True:
+            span = self._cola.get()
+            if span is None:
+                return
+            self._destino.write(json.dumps(span.a_dict(), default=str) + "\n")
+            if self._cola.empty():
+                self._destino.flush()
+
+    def detener(self, timeout: float = 5.0):
+        self._cola.put(None)
+        self._hilo.join(timeout)
+        self._destino.flush()
+
+
+_exportador: Optional[Exportador] = None
+_exportador_lock = threading.Lock()
+
+
+def _obtener_exportador() -> Optional[Exportador]:
+    global _exportador
+    if _exportador is None and config.TRAZAS_EXPORTADOR != "ninguno":
+        with _exportador_lock:
+            if _exportador is None:
+                if config.TRAZAS_EXPORTADOR == "archivo":
+                    destino = open(config.TRAZAS_ARCHIVO, "a", encoding="utf-8")
+                else:
+                    destino = sys.stdout
+                _exportador = Exportador(destino)
+    return _exportador
+
+
+def detener_exportador():
+    global _exportador
+    with _exportador_lock:
+        if _exportador is not None:
+            _exportador.detener()
+            _exportador = None
+
+
+def trazas_activas() -> bool:
+    return config.TRAZAS_EXPORTADOR != "ninguno" and config.TRAZAS_MUESTREO > 0
+
+
+def _terminar(span: Span):
+    span.fin = time.time_ns()
+    exportador = _obtener_exportador()
+    if exportador is not None:
+        exportador.exportar(span)
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """Abre un span hijo del span actual; no hace nada si la petición no está muestreada."""
+    padre = _span_actual.get()
+    if padre is None or not padre.muestreado:
+        yield None
+        return
+    actual = Span(padre.trace_id, padre.span_id, nombre, True)
+    actual.atributos.update(atributos)
+    token = _span_actual.set(actual)
+    try:
+        yield actual
+    except BaseException as e:
+        actual.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_actual.reset(token)
+        _terminar(actual)
+
+
+def encabezados_propagacion() -> Dict[str, str]:
+    """Encabezado ``traceparent`` para las llamadas salientes de la petición actual."""
+    actual = _span_actual.get()
+    return {"traceparent": actual.traceparent()} if actual is not None else {}
+
+
+def _contexto_entrante(encabezado: Optional[str]):
+    if encabezado:
+        coincidencia = _PATRON_TRACEPARENT.match(encabezado.strip().lower())
+        if coincidencia and coincidencia.group(1) != "0" * 32 and coincidencia.group(2) != "0" * 16:
+            trace_id, parent_id, banderas = coincidencia.groups()
+            return trace_id, parent_id, bool(int(banderas, 16) & 1)
+    return None
+
+
+class TrazasMiddleware:
+    """Crea el span raíz de cada petición HTTP continuando el ``traceparent`` entrante."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not trazas_activas():
+            await self.app(scope, receive, send)
+            return
+
+        encabezados = dict(scope["headers"])
+        entrante = _contexto_entrante(encabezados.get(b"traceparent", b"").decode("latin-1"))
+        if entrante:
+            trace_id, parent_id, muestreado = entrante
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            muestreado = random.random() < config.TRAZAS_MUESTREO
+
+        raiz = Span(trace_id, parent_id, f"{scope['method']} {scope['path']}", muestreado)
+        token = _span_actual.set(raiz)
+        estado = [500]
+
+        async def send_con_estado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            _span_actual.reset(token)
+            if muestreado:
+                ruta = scope.get("route")
+                if ruta is not None:
+                    raiz.nombre = f"{scope['method']} {ruta.path}"
+                raiz.atributos["http.status_code"] = estado[0]
+                _terminar(raiz)
@@ -0,0 +1,143 @@
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+# Las versiones son marcas de tiempo en nanosegundos en lugar de contadores:
+# si Redis pierde una clave la nueva versión nunca repite una anterior, así
+# que un ETag viejo no puede volver a coincidir con contenido distinto.
+
+
+def _nueva_version() -> str:
+    return str(time.time_ns())
+
+
+def _decodificar(version) -> Optional[str]:
+    if version is None:
+        return None
+    return version.decode() if isinstance(version, bytes) else str(version)
+
+
+def leer_version(redis_client: Redis, clave: str) -> Optional[str]:
+    return _decodificar(redis_client.get(clave))
+
+
+def obtener_version(redis_client: Redis, clave: str) -> str:
+    version = redis_client.get(clave)
+    if version is None:
+        redis_client.set(clave, _nueva_version(), nx=True)
+        version = redis_client.get(clave)
+    return _decodificar(version)
+
+
+async def leer_version_async(redis_async: AsyncRedis, clave: str) -> Optional[str]:
+    return _decodificar(await redis_async.get(clave))
+
+
+async def obtener_version_async(redis_async: AsyncRedis, clave: str) -> str:
+    version = await redis_async.get(clave)
+    if version is None:
+        await redis_async.set(clave, _nueva_version(), nx=True)
+        version = await redis_async.get(clave)
+    return _decodificar(version)
+
+
+def nueva_version() -> str:
+    return _nueva_version()
+
+
+def incrementar_version(redis_client: Redis, *claves: str, version: Optional[str] = None) -> str:
+    """Publica ``version`` (o una nueva) en ``claves``; retorna la versión publicada."""
+    version = version or _nueva_version()
+    if len(claves) == 1:
+        redis_client.set(claves[0], version)
+    else:
+        pipe = redis_client.pipeline(transaction=False)
+        for clave in claves:
+            pipe.set(clave, version)
+        pipe.execute()
+    return version
+
+
+def generar_etag(*partes) -> str:
+    return '"' + "-".join(str(parte) for parte in partes) + '"'
+
+
+def _segundos(version: str) -> int:
+    return int(version) // 10**9
+
+
+def _segundo_actual() -> int:
+    return int(time.time())
+
+
+def fecha_confiable(version: str) -> bool:
+    """Indica si la fecha de ``version`` sirve como validador fuerte (RFC 9110 §8.8.2.2).
+
+    Las versiones tienen resolución de nanosegundos y ``Last-Modified`` de segundos:
+    mientras el segundo de la versión no termine puede llegar otro cambio con la
+    misma fecha, así que hasta entonces solo el ETag distingue las versiones.
+    """
+    return _segundos(version) < _segundo_actual()
+
+
+def ultima_modificacion(version: str) -> str:
+    """Convierte una versión en el valor HTTP-date del encabezado ``Last-Modified``."""
+    return format_datetime(datetime.fromtimestamp(_segundos(version), tz=timezone.utc), usegmt=True)
+
+
+def no_modificado(request: Request, etag: str, version: str) -> bool:
+    """Indica si la petición condicional puede responderse con 304.
+
+    ``If-None-Match`` tiene prioridad; ``If-Modified-Since`` solo se evalúa sin él.
+    """
+    if request.headers.get("if-none-match"):
+        return etag_coincide(request, etag)
+    desde = request.headers.get("if-modified-since")
+    if not desde:
+        return False
+    try:
+        fecha = parsedate_to_datetime(desde)
+    except (TypeError, ValueError):
+        return False
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha_confiable(version) and _segundos(version) <= int(fecha.timestamp())
+
+
+def encabezados_condicionales(etag: str, version: str) -> dict:
+    encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+    if fecha_confiable(version):
+        encabezados["Last-Modified"] = ultima_modificacion(version)
+    return encabezados
+
+
+def etag_coincide(request: Request, etag: str) -> bool:
+    """Evalúa ``If-None-Match`` con comparación débil, como indica RFC 9110 para GET."""
+    encabezado: Optional[str] = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+    if encabezado.strip() == "*":
+        return True
+    etiquetas = (valor.strip() for valor in encabezado.split(","))
+    return any(etiqueta.removeprefix("W/") == etag for etiqueta in etiquetas)
+
+
+def clave_version_soluciones(cliente_id: Optional[int]) -> str:
+    return f"soluciones:version:{cliente_id if cliente_id is not None else 'todos'}"
+
+
+def clave_catalogo_soluciones(cliente_id: Optional[int], version: str) -> str:
+    return f"soluciones:{cliente_id if cliente_id is not None else 'todos'}:{version}"
+
+
+def clave_version_incidente(incidente_id: int) -> str:
+    return f"incidente:version:{incidente_id}"
+
+
+def clave_version_incidentes(cliente_id: Optional[int]) -> str:
+    return f"incidentes:version:{cliente_id if cliente_id is not None else 'todos'}"
@@ -0,0 +1,75 @@
+"""Benchmark del arranque en frío de la aplicación.
+
+Uso::
+
+    python -m benchmarks.bench_arranque --repeticiones 10
+    python -m benchmarks.bench_arranque --con-recursos   # incluye base de datos y Redis configurados
+
+Cada repetición corre en un intérprete nuevo y mide por separado el import de
+``main``, el lifespan (sin recursos externos salvo ``--con-recursos``) y la
+primera respuesta a ``GET /``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MEDICION = r"""
+import json, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as cliente:
+    arrancado = time.perf_counter()
+    cliente.get("/")
+    respondido = time.perf_counter()
+print(json.dumps({
+    "import_ms": (importado - inicio) * 1000,
+    "lifespan_ms": (arrancado - importado) * 1000,
+    "primera_respuesta_ms": (respondido - arrancado) * 1000,
+    "total_ms": (respondido - inicio) * 1000,
+}))
+"""
+
+
+def medir_una_vez(con_recursos: bool) -> dict:
+    entorno = dict(os.environ)
+    if not con_recursos:
+        entorno["TESTING"] = "True"
+    salida = subprocess.run([sys.executable, "-c", MEDICION], capture_output=True, text=True,
+                            check=True, env=entorno)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--con-recursos", action="store_true",
+                        help="Ejecuta preparar_recursos() contra la base de datos y Redis configurados")
+    parser.add_argument("--importtime", action="store_true",
+                        help="Muestra los 15 módulos más lentos de importar (python -X importtime)")
+    args = parser.parse_args()
+
+    mediciones = [medir_una_vez(args.con_recursos) for _ in range(args.repeticiones)]
+    for fase in ("import_ms", "lifespan_ms", "primera_respuesta_ms", "total_ms"):
+        valores = [m[fase] for m in mediciones]
+        print(f"{fase:<22} p50={statistics.median(valores):8.1f}ms min={min(valores):8.1f}ms max={max(valores):8.1f}ms")
+
+    if args.importtime:
+        salida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                                capture_output=True, text=True, env={**os.environ, "TESTING": "True"})
+        filas = []
+        for linea in salida.stderr.splitlines():
+            partes = linea.split("|")
+            if len(partes) == 3 and partes[1].strip().isdigit():
+                filas.append((int(partes[1]), partes[2].rstrip()))
+        print("\nMódulos con mayor tiempo acumulado de import:")
+        for microsegundos, modulo in sorted(filas, reverse=True)[:15]:
+            print(f"  {microsegundos / 1000:8.1f}ms {modulo}")
+
+
+if __name__ == "__main__":
+    main()
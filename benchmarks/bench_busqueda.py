@@ -0,0 +1,122 @@
+"""Benchmark de la búsqueda de incidentes sobre un corpus sintético.
+
+Uso::
+
+    python -m benchmarks.bench_busqueda --incidentes 1000000 --clientes 2000
+
+Sin ``--database-url`` mide el índice en memoria directamente. Con una URL de
+MySQL inserta el corpus y mide el motor FULLTEXT a través de ``buscar_incidentes``.
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from app.indice_texto import IndiceBM25
+
+VOCABULARIO = [
+    "acceso", "portal", "contraseña", "sesion", "factura", "cobro", "duplicado", "pago", "tarjeta",
+    "aplicacion", "celular", "correo", "notificacion", "error", "lento", "caido", "bloqueado",
+    "usuario", "cuenta", "saldo", "transferencia", "reembolso", "cancelar", "retiro", "queja",
+    "llamada", "agente", "demora", "respuesta", "pantalla", "blanco", "actualizacion", "version",
+    "instalar", "datos", "perfil", "direccion", "envio", "pedido", "producto", "garantia",
+]
+
+
+def generar_descripcion(rng: random.Random) -> str:
+    palabras = rng.choices(VOCABULARIO, k=rng.randint(6, 18))
+    palabras.append(f"ref{rng.randint(0, 50000)}")
+    return " ".join(palabras)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def medir_consultas(buscar, consultas):
+    tiempos = []
+    for consulta, cliente_id in consultas:
+        inicio = time.perf_counter()
+        buscar(consulta, cliente_id)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def reportar(nombre, tiempos):
+    print(f"{nombre}: n={len(tiempos)} p50={statistics.median(tiempos):.2f}ms "
+          f"p99={percentil(tiempos, 0.99):.2f}ms max={max(tiempos):.2f}ms")
+
+
+def bench_en_memoria(args, rng):
+    indices = {}
+    inicio = time.perf_counter()
+    for incidente_id in range(1, args.incidentes + 1):
+        cliente_id = rng.randrange(args.clientes)
+        indice = indices.get(cliente_id)
+        if indice is None:
+            indice = indices[cliente_id] = IndiceBM25()
+        indice.agregar(incidente_id, generar_descripcion(rng))
+    construccion = time.perf_counter() - inicio
+    memoria_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Índice construido: {args.incidentes} incidentes, {len(indices)} clientes, "
+          f"{construccion:.1f}s, RSS máximo {memoria_mb:.0f}MB")
+
+    consultas = [(" ".join(rng.choices(VOCABULARIO, k=3)), rng.randrange(args.clientes))
+                 for _ in range(args.consultas)]
+    reportar("Búsqueda por cliente",
+             medir_consultas(lambda q, c: indices[c].buscar(q, args.page_size) if c in indices else [], consultas))
+
+    todos = list(indices.values())
+    reportar("Búsqueda de agente (todos los clientes)",
+             medir_consultas(lambda q, c: [i.buscar(q, args.page_size) for i in todos], consultas[:20]))
+
+
+def bench_base_de_datos(args, rng):
+    from sqlalchemy import insert
+    from sqlmodel import Session, SQLModel, create_engine
+    from app.busqueda import buscar_incidentes
+    from app.models import Incidente
+
+    engine = create_engine(args.database_url)
+    SQLModel.metadata.create_all(engine)
+    inicio = time.perf_counter()
+    with Session(engine) as session:
+        for base in range(0, args.incidentes, args.lote):
+            filas = [{
+                "description": generar_descripcion(rng), "categoria": "acceso", "prioridad": "media",
+                "canal": "correo", "estado": "abierto", "cliente_id": rng.randrange(args.clientes),
+                "radicado": f"{base + i:08d}", "solucion": None, "identificacion_usuario": None,
+            } for i in range(min(args.lote, args.incidentes - base))]
+            session.execute(insert(Incidente), filas)
+            session.commit()
+    print(f"Corpus insertado en {time.perf_counter() - inicio:.1f}s")
+
+    consultas = [(" ".join(rng.choices(VOCABULARIO, k=3)), rng.randrange(args.clientes))
+                 for _ in range(args.consultas)]
+    with Session(engine) as session:
+        reportar("Búsqueda por cliente", medir_consultas(
+            lambda q, c: buscar_incidentes(q, c, session, 0, args.page_size), consultas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidentes", type=int, default=1_000_000)
+    parser.add_argument("--clientes", type=int, default=2_000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--lote", type=int, default=5_000)
+    parser.add_argument("--database-url")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    if args.database_url:
+        bench_base_de_datos(args, rng)
+    else:
+        bench_en_memoria(args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Throughput de lecturas cacheadas concurrentes: cliente Redis síncrono vs asíncrono.
+
+Uso::
+
+    python -m benchmarks.bench_cache_async --redis-url redis://localhost:6379/0 --concurrencia 64
+
+Simula ``--concurrencia`` peticiones simultáneas dentro de un event loop, como
+en un worker de uvicorn. Con el cliente síncrono cada GET bloquea el loop y las
+lecturas se serializan; con ``redis.asyncio`` los viajes a Redis se solapan.
+La diferencia crece con la latencia de red hasta Redis (Memorystore en otra zona,
+por ejemplo). ``--fake`` usa fakeredis, útil solo para verificar el script.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from redis import Redis
+from redis.asyncio import BlockingConnectionPool, Redis as AsyncRedis
+
+from app.database import obtener_incidente_cache, obtener_incidente_cache_async
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+
+
+def _incidentes(cantidad):
+    return [Incidente(id=i, cliente_id=1, description=f"Incidente de prueba {i}", categoria=Categoria.acceso,
+                      prioridad=Prioridad.media, canal=Canal.correo, estado=Estado.abierto, radicado=f"{i:08d}")
+            for i in range(1, cantidad + 1)]
+
+
+async def medir(nombre, leer, concurrencia, lecturas, claves):
+    latencias = []
+
+    async def trabajador(desplazamiento):
+        for i in range(lecturas):
+            inicio = time.perf_counter()
+            await leer(claves[(desplazamiento + i) % len(claves)])
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador(t * 7) for t in range(concurrencia)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    print(f"{nombre:<10} {len(latencias) / total:>10.0f} lecturas/s  "
+          f"p50={statistics.median(latencias) * 1000:.3f}ms p99={latencias[int(len(latencias) * 0.99)] * 1000:.3f}ms")
+
+
+async def principal(args):
+    if args.fake:
+        from fakeredis import FakeRedis, FakeServer
+        from fakeredis.aioredis import FakeRedis as FakeRedisAsync
+        servidor = FakeServer()
+        sincrono, asincrono = FakeRedis(server=servidor), FakeRedisAsync(server=servidor)
+    else:
+        sincrono = Redis.from_url(args.redis_url)
+        asincrono = AsyncRedis(connection_pool=BlockingConnectionPool.from_url(
+            args.redis_url, max_connections=args.conexiones))
+
+    incidentes = _incidentes(args.claves)
+    for incidente in incidentes:
+        sincrono.set(f"incidente:{incidente.id}", incidente.model_dump_json())
+    ids = [incidente.id for incidente in incidentes]
+
+    async def leer_sincrono(incidente_id):
+        return obtener_incidente_cache(incidente_id, None, sincrono)
+
+    async def leer_asincrono(incidente_id):
+        return await obtener_incidente_cache_async(incidente_id, None, asincrono)
+
+    print(f"{args.concurrencia} lecturas concurrentes x {args.lecturas} por tarea")
+    await medir("síncrono", leer_sincrono, args.concurrencia, args.lecturas, ids)
+    await medir("asíncrono", leer_asincrono, args.concurrencia, args.lecturas, ids)
+
+    sincrono.delete(*(f"incidente:{i}" for i in ids))
+    await asincrono.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--concurrencia", type=int, default=64)
+    parser.add_argument("--lecturas", type=int, default=200, help="Lecturas por tarea concurrente")
+    parser.add_argument("--conexiones", type=int, default=50, help="Tamaño del pool asíncrono")
+    parser.add_argument("--claves", type=int, default=1000)
+    asyncio.run(principal(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
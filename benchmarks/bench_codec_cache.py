@@ -0,0 +1,115 @@
+"""Memoria y CPU de los formatos de las claves ``incidente:*`` (ver ``app/codec_cache.py``).
+
+Uso::
+
+    python -m benchmarks.bench_codec_cache --incidentes 20000
+    python -m benchmarks.bench_codec_cache --redis-url redis://localhost:6379/15
+
+Genera incidentes con la misma distribución que ``benchmarks.sembrar_datos`` y,
+por formato, reporta el tamaño medio del valor y el costo de codificar y
+decodificar. Con ``--redis-url`` además escribe los valores en esa base (que se
+vacía) y mide ``used_memory`` de Redis, que incluye la sobrecarga por clave.
+``--descripcion-larga`` agrega texto a cada incidente para ver el efecto de la
+compresión.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date
+
+from app import config
+from app.codec_cache import codificar_binario, decodificar
+from app.models import Incidente
+from benchmarks.bench_busqueda import generar_descripcion
+from benchmarks.sembrar_datos import generar_incidente
+
+
+def _formatos():
+    def binario(comprimir_desde):
+        def codificar(incidente):
+            config.CACHE_CODEC_COMPRIMIR_DESDE = comprimir_desde
+            return codificar_binario(incidente)
+        return codificar
+
+    return {
+        "json": lambda incidente: incidente.model_dump_json(),
+        "binario": binario(0),
+        "binario+zlib": binario(config.CACHE_CODEC_COMPRIMIR_DESDE or 512),
+    }
+
+
+def _incidentes(cantidad: int, descripcion_larga: int, semilla: int):
+    rng = random.Random(semilla)
+    hoy = date.today()
+    incidentes = []
+    for i in range(1, cantidad + 1):
+        datos = generar_incidente(rng, i, 2000, hoy)
+        for _ in range(descripcion_larga):
+            datos["description"] += " " + generar_descripcion(rng)
+        incidentes.append(Incidente(**datos))
+    return incidentes
+
+
+def _cronometrar(funcion, elementos, repeticiones: int = 3) -> float:
+    """Mejor de ``repeticiones`` pasadas, en microsegundos por elemento."""
+    mejores = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for elemento in elementos:
+            funcion(elemento)
+        mejores.append((time.perf_counter() - inicio) / len(elementos) * 1e6)
+    return min(mejores)
+
+
+def _memoria_redis(redis_client, valores) -> float:
+    """Bytes de ``used_memory`` por clave tras escribir ``valores`` en una base vacía."""
+    redis_client.flushdb()
+    antes = redis_client.info("memory")["used_memory"]
+    pipe = redis_client.pipeline(transaction=False)
+    for i, valor in enumerate(valores, start=1):
+        pipe.set(f"incidente:{i}", valor)
+        if i % 1000 == 0:
+            pipe.execute()
+    pipe.execute()
+    despues = redis_client.info("memory")["used_memory"]
+    redis_client.flushdb()
+    return (despues - antes) / len(valores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidentes", type=int, default=20_000)
+    parser.add_argument("--descripcion-larga", type=int, default=0,
+                        help="Descripciones adicionales concatenadas a cada incidente")
+    parser.add_argument("--redis-url", help="Redis de pruebas (se vacía la base indicada)")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    redis_client = None
+    if args.redis_url:
+        from redis import Redis
+        redis_client = Redis.from_url(args.redis_url)
+
+    incidentes = _incidentes(args.incidentes, args.descripcion_larga, args.semilla)
+    comprimir_original = config.CACHE_CODEC_COMPRIMIR_DESDE
+    print(f"{len(incidentes)} incidentes")
+    print(f"{'formato':<14}{'bytes/valor':>12}{'p99 bytes':>11}{'codificar':>12}{'decodificar':>13}"
+          + (f"{'Redis B/clave':>15}" if redis_client else ""))
+    try:
+        for nombre, codificar in _formatos().items():
+            valores = [codificar(incidente) for incidente in incidentes]
+            tamanos = sorted(len(valor) for valor in valores)
+            # Los valores llegan de Redis como bytes
+            leidos = [valor.encode() if isinstance(valor, str) else valor for valor in valores]
+            linea = (f"{nombre:<14}{statistics.mean(tamanos):>12.1f}{tamanos[int(len(tamanos) * 0.99)]:>11}"
+                     f"{_cronometrar(codificar, incidentes):>10.2f}µs{_cronometrar(decodificar, leidos):>11.2f}µs")
+            if redis_client:
+                linea += f"{_memoria_redis(redis_client, valores):>15.1f}"
+            print(linea)
+    finally:
+        config.CACHE_CODEC_COMPRIMIR_DESDE = comprimir_original
+
+
+if __name__ == "__main__":
+    main()
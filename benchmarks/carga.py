@@ -0,0 +1,182 @@
+"""Generador de carga de extremo a extremo contra la aplicación en ejecución.
+
+Uso::
+
+    python -m benchmarks.carga --url http://localhost:8080 --duracion 60 --concurrencia 64 \\
+        --mezcla crear=10,obtener=50,listar=30,solucionar=10 --clientes 2000 --id-max 1000000
+
+Cada trabajador ejecuta peticiones en lazo cerrado eligiendo la operación según
+los pesos de ``--mezcla``. Las operaciones sobre incidentes existentes usan ids
+entre 1 y ``--id-max`` (los sembrados por ``benchmarks.sembrar_datos``) más los
+creados durante la prueba. Los tokens se firman con ``SECRET_KEY`` para los
+correos que entiende ``benchmarks.servicios_stub``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from jose import jwt
+
+from app.models import Canal, Categoria, Estado, Prioridad
+from app.security import ALGORITHM, SECRET_KEY
+from benchmarks.bench_busqueda import generar_descripcion, percentil
+
+OPERACIONES = ("crear", "obtener", "listar", "solucionar")
+
+
+def parsear_mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in OPERACIONES:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {nombre}")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+def firmar_token(email: str) -> str:
+    return jwt.encode({"sub": email, "exp": datetime.utcnow() + timedelta(hours=12)},
+                      SECRET_KEY, algorithm=ALGORITHM)
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.estados = defaultdict(Counter)
+
+    def registrar(self, operacion: str, segundos: float, estado):
+        self.latencias[operacion].append(segundos * 1000)
+        self.estados[operacion][estado] += 1
+
+    def resumen(self, duracion: float) -> dict:
+        resumen = {}
+        for operacion, latencias in sorted(self.latencias.items()):
+            estados = self.estados[operacion]
+            errores = sum(n for estado, n in estados.items() if not (isinstance(estado, int) and estado < 400))
+            resumen[operacion] = {
+                "peticiones": len(latencias),
+                "por_segundo": round(len(latencias) / duracion, 1),
+                "tasa_error": round(errores / len(latencias), 4),
+                "p50_ms": round(statistics.median(latencias), 2),
+                "p90_ms": round(percentil(latencias, 0.90), 2),
+                "p99_ms": round(percentil(latencias, 0.99), 2),
+                "max_ms": round(max(latencias), 2),
+                "estados": {str(estado): n for estado, n in estados.items()},
+            }
+        return resumen
+
+
+class GeneradorCarga:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.semilla)
+        self.operaciones = list(args.mezcla)
+        self.pesos = list(args.mezcla.values())
+        self.creados = []
+        self.resultados = Resultados()
+        self.tokens_clientes = {}
+        self.token_agente = firmar_token("agente1@carga.test")
+
+    def _id_existente(self):
+        if self.creados and (not self.args.id_max or self.rng.random() < 0.5):
+            return self.rng.choice(self.creados)
+        return self.rng.randint(1, self.args.id_max or 1)
+
+    def _token_cliente(self, cliente_id: int) -> str:
+        token = self.tokens_clientes.get(cliente_id)
+        if token is None:
+            token = self.tokens_clientes[cliente_id] = firmar_token(f"cliente{cliente_id}@carga.test")
+        return token
+
+    async def crear(self, http: httpx.AsyncClient):
+        respuesta = await http.post("/incidente", json={
+            "description": generar_descripcion(self.rng),
+            "categoria": self.rng.choice(list(Categoria)).value,
+            "prioridad": self.rng.choice(list(Prioridad)).value,
+            "canal": self.rng.choice(list(Canal)).value,
+            "cliente_id": self.rng.randint(1, self.args.clientes),
+            "estado": Estado.abierto.value,
+            "identificacion_usuario": str(self.rng.randrange(10**9, 10**10)),
+        }, headers={"User-Agent": "carga"})
+        if respuesta.status_code == 200:
+            self.creados.append(respuesta.json()["id"])
+        return respuesta
+
+    async def obtener(self, http: httpx.AsyncClient):
+        return await http.get(f"/incidente/{self._id_existente()}")
+
+    async def listar(self, http: httpx.AsyncClient):
+        if self.rng.random() < self.args.fraccion_agentes:
+            token = self.token_agente
+        else:
+            token = self._token_cliente(self.rng.randint(1, self.args.clientes))
+        return await http.get("/incidentes", headers={"Authorization": f"Bearer {token}"})
+
+    async def solucionar(self, http: httpx.AsyncClient):
+        return await http.put(f"/incidente/{self._id_existente()}/solucionar",
+                              json={"solucion": generar_descripcion(self.rng)})
+
+    async def trabajador(self, http: httpx.AsyncClient, fin: float):
+        while time.perf_counter() < fin:
+            operacion = self.rng.choices(self.operaciones, self.pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                respuesta = await getattr(self, operacion)(http)
+                estado = respuesta.status_code
+            except httpx.HTTPError as e:
+                estado = type(e).__name__
+            self.resultados.registrar(operacion, time.perf_counter() - inicio, estado)
+
+    async def ejecutar(self) -> dict:
+        limites = httpx.Limits(max_connections=self.args.concurrencia,
+                               max_keepalive_connections=self.args.concurrencia)
+        async with httpx.AsyncClient(base_url=self.args.url, limits=limites, timeout=self.args.timeout) as http:
+            inicio = time.perf_counter()
+            fin = inicio + self.args.duracion
+            await asyncio.gather(*(self.trabajador(http, fin) for _ in range(self.args.concurrencia)))
+            duracion = time.perf_counter() - inicio
+        return {"duracion_s": round(duracion, 1), "concurrencia": self.args.concurrencia,
+                "operaciones": self.resultados.resumen(duracion)}
+
+
+def imprimir(reporte: dict):
+    total = sum(o["peticiones"] for o in reporte["operaciones"].values())
+    print(f"{total} peticiones en {reporte['duracion_s']}s "
+          f"({total / reporte['duracion_s']:.1f} req/s, concurrencia {reporte['concurrencia']})")
+    for operacion, r in reporte["operaciones"].items():
+        print(f"  {operacion:<11} {r['peticiones']:>8} {r['por_segundo']:>8.1f}/s "
+              f"p50={r['p50_ms']:>8.2f}ms p90={r['p90_ms']:>8.2f}ms p99={r['p99_ms']:>8.2f}ms "
+              f"errores={r['tasa_error']:.2%} {r['estados']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de carga")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--mezcla", type=parsear_mezcla, default=parsear_mezcla("crear=10,obtener=50,listar=30,solucionar=10"))
+    parser.add_argument("--clientes", type=int, default=2_000)
+    parser.add_argument("--id-max", type=int, default=0, help="Mayor id de incidente sembrado")
+    parser.add_argument("--fraccion-agentes", type=float, default=0.05,
+                        help="Fracción de listados hechos como agente (todos los incidentes)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar el reporte")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    reporte = asyncio.run(GeneradorCarga(args).ejecutar())
+    imprimir(reporte)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
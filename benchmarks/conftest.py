@@ -0,0 +1,118 @@
+"""Suite de microbenchmarks de los caminos calientes.
+
+Reutiliza los fixtures de ``test/conftest.py`` (SQLite, FakeRedis, TestClient).
+
+    python -m pytest benchmarks                                        # solo medir
+    python -m pytest benchmarks --bench-guardar benchmarks/baseline.json
+    python -m pytest benchmarks --bench-comparar benchmarks/baseline.json --bench-tolerancia 25
+
+En modo comparación cada benchmark falla si su p50 (o su p99, con
+``--bench-tolerancia-p99``) empeora más que el porcentaje indicado.
+"""
+import json
+import os
+import statistics
+import time
+
+import pytest
+
+# Todos los fixtures de las pruebas, incluidos los que se agreguen después. No se usa
+# pytest_plugins porque falla al correr test/ y benchmarks/ juntos (doble registro).
+from test.conftest import *  # noqa: F401,F403
+
+_resultados = {}
+
+
+def pytest_addoption(parser):
+    grupo = parser.getgroup("benchmarks")
+    grupo.addoption("--bench-iteraciones", type=int, default=200, help="Iteraciones medidas por benchmark")
+    grupo.addoption("--bench-calentamiento", type=int, default=20, help="Iteraciones previas sin medir")
+    grupo.addoption("--bench-guardar", help="Archivo JSON donde guardar los resultados como línea base")
+    grupo.addoption("--bench-comparar", help="Línea base JSON contra la cual comparar")
+    grupo.addoption("--bench-tolerancia", type=float, default=25.0, help="Regresión máxima del p50, en %%")
+    grupo.addoption("--bench-tolerancia-p99", type=float, default=50.0, help="Regresión máxima del p99, en %%")
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+class Medidor:
+    def __init__(self, config, linea_base):
+        self.iteraciones = config.getoption("--bench-iteraciones")
+        self.calentamiento = config.getoption("--bench-calentamiento")
+        self.tolerancia = config.getoption("--bench-tolerancia")
+        self.tolerancia_p99 = config.getoption("--bench-tolerancia-p99")
+        self.linea_base = linea_base
+
+    def __call__(self, nombre, funcion, preparar=None, iteraciones=None):
+        """Mide ``funcion``; ``preparar`` corre antes de cada iteración y no se cuenta."""
+        iteraciones = iteraciones or self.iteraciones
+        for _ in range(self.calentamiento):
+            if preparar:
+                preparar()
+            funcion()
+
+        tiempos = []
+        for _ in range(iteraciones):
+            if preparar:
+                preparar()
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+
+        resultado = {
+            "iteraciones": iteraciones,
+            "p50_ms": round(statistics.median(tiempos) * 1000, 4),
+            "p99_ms": round(_percentil(tiempos, 0.99) * 1000, 4),
+            "ops_por_segundo": round(iteraciones / sum(tiempos), 1),
+        }
+        _resultados[nombre] = resultado
+        self._comparar(nombre, resultado)
+        return resultado
+
+    def _comparar(self, nombre, resultado):
+        base = self.linea_base.get(nombre)
+        if not base:
+            return
+        regresiones = []
+        for metrica, tolerancia in (("p50_ms", self.tolerancia), ("p99_ms", self.tolerancia_p99)):
+            limite = base[metrica] * (1 + tolerancia / 100)
+            if resultado[metrica] > limite:
+                regresiones.append(f"{metrica} {resultado[metrica]:.3f}ms > {limite:.3f}ms "
+                                   f"(base {base[metrica]:.3f}ms, +{tolerancia:.0f}%)")
+        if regresiones:
+            pytest.fail(f"Regresión en {nombre}: " + "; ".join(regresiones))
+
+
+@pytest.fixture(scope="session")
+def linea_base(pytestconfig):
+    ruta = pytestconfig.getoption("--bench-comparar")
+    if not ruta:
+        return {}
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+@pytest.fixture
+def medir(pytestconfig, linea_base):
+    return Medidor(pytestconfig, linea_base)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _resultados:
+        return
+    terminalreporter.section("benchmarks")
+    for nombre, r in sorted(_resultados.items()):
+        terminalreporter.write_line(
+            f"{nombre:<45} p50={r['p50_ms']:>9.3f}ms p99={r['p99_ms']:>9.3f}ms {r['ops_por_segundo']:>10.1f} ops/s")
+
+
+def pytest_sessionfinish(session):
+    ruta = session.config.getoption("--bench-guardar", default=None)
+    if ruta and _resultados:
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump(dict(sorted(_resultados.items())), archivo, indent=2)
+            archivo.write("\n")
@@ -0,0 +1,147 @@
+"""Generador de datos sintéticos para pruebas de carga y planeación de capacidad.
+
+Uso::
+
+    python -m benchmarks.sembrar_datos --database-url mysql+mysqlconnector://u:p@host/db \\
+        --clientes 2000 --incidentes 2000000 --logs-por-incidente 3 --problemas-por-cliente 25
+
+Inserta con sentencias INSERT de múltiples filas por lotes, asignando los ids
+explícitamente a partir del máximo actual para que los logs puedan referenciar
+sus incidentes sin consultas adicionales. Los ``cliente_id`` van de 1 a
+``--clientes``, igual que los que responde ``benchmarks.servicios_stub``.
+"""
+import argparse
+import random
+import string
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select
+from sqlmodel import SQLModel, create_engine
+
+from app.models import Canal, Categoria, Estado, Incidente, LogIncidente, Prioridad, ProblemaComun
+from benchmarks.bench_busqueda import generar_descripcion
+
+ALFABETO_RADICADO = string.ascii_letters + string.digits
+ORIGENES = ["Postman", "Frontend", "Otro"]
+ESTADOS = [Estado.abierto.value] * 6 + [Estado.cerrado.value] * 3 + [Estado.escalado.value]
+CATEGORIAS = [c.value for c in Categoria]
+PRIORIDADES = [p.value for p in Prioridad]
+CANALES = [c.value for c in Canal]
+
+
+def _siguiente_id(conn, modelo) -> int:
+    return (conn.execute(select(func.max(modelo.id))).scalar() or 0) + 1
+
+
+def _insertar(conn, modelo, filas):
+    # Una sola sentencia INSERT ... VALUES (...), (...), ... por lote
+    if filas:
+        conn.execute(insert(modelo.__table__).values(filas))
+
+
+def generar_incidente(rng: random.Random, incidente_id: int, clientes: int, hoy: date) -> dict:
+    estado = rng.choice(ESTADOS)
+    creacion = hoy - timedelta(days=rng.randrange(730))
+    cerrado = estado == Estado.cerrado.value
+    return {
+        "id": incidente_id,
+        "description": generar_descripcion(rng),
+        "categoria": rng.choice(CATEGORIAS),
+        "prioridad": rng.choice(PRIORIDADES),
+        "canal": rng.choice(CANALES),
+        "cliente_id": rng.randint(1, clientes),
+        "estado": estado,
+        "fecha_creacion": creacion,
+        "fecha_cierre": creacion + timedelta(days=rng.randrange(15)) if cerrado else None,
+        "solucion": generar_descripcion(rng) if cerrado else None,
+        "radicado": "".join(rng.choices(ALFABETO_RADICADO, k=8)),
+        "identificacion_usuario": str(rng.randrange(10**9, 10**10)),
+    }
+
+
+def generar_log(rng: random.Random, incidente: dict) -> dict:
+    return {
+        "incidente_id": incidente["id"],
+        "cuerpo_completo": f'{{"estado": "{incidente["estado"]}", "description": "{incidente["description"]}"}}',
+        "fecha_cambio": datetime.combine(incidente["fecha_creacion"], datetime.min.time())
+        + timedelta(seconds=rng.randrange(86400 * 15)),
+        "origen_cambio": rng.choice(ORIGENES),
+    }
+
+
+def sembrar_incidentes(engine, args, rng):
+    hoy = date.today()
+    insertados = logs = 0
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        siguiente = _siguiente_id(conn, Incidente)
+    while insertados < args.incidentes:
+        cantidad = min(args.lote, args.incidentes - insertados)
+        incidentes = [generar_incidente(rng, siguiente + i, args.clientes, hoy) for i in range(cantidad)]
+        filas_logs = [generar_log(rng, incidente)
+                      for incidente in incidentes for _ in range(args.logs_por_incidente)]
+        with engine.begin() as conn:
+            _insertar(conn, Incidente, incidentes)
+            for base in range(0, len(filas_logs), args.lote):
+                _insertar(conn, LogIncidente, filas_logs[base:base + args.lote])
+        siguiente += cantidad
+        insertados += cantidad
+        logs += len(filas_logs)
+        if insertados % (args.lote * 100) == 0 or insertados == args.incidentes:
+            transcurrido = time.perf_counter() - inicio
+            print(f"  {insertados}/{args.incidentes} incidentes, {logs} logs "
+                  f"({insertados / transcurrido:.0f} incidentes/s)", flush=True)
+    return insertados, logs
+
+
+def sembrar_problemas(engine, args, rng):
+    total = args.clientes * args.problemas_por_cliente
+    filas = ({
+        "description": generar_descripcion(rng),
+        "categoria": rng.choice(CATEGORIAS),
+        "solucion": generar_descripcion(rng),
+        "cliente_id": cliente_id,
+    } for cliente_id in range(1, args.clientes + 1) for _ in range(args.problemas_por_cliente))
+    lote = []
+    with engine.begin() as conn:
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) == args.lote:
+                _insertar(conn, ProblemaComun, lote)
+                lote = []
+        _insertar(conn, ProblemaComun, lote)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///carga.db")
+    parser.add_argument("--clientes", type=int, default=2_000)
+    parser.add_argument("--incidentes", type=int, default=1_000_000)
+    parser.add_argument("--logs-por-incidente", type=int, default=3)
+    parser.add_argument("--problemas-por-cliente", type=int, default=25)
+    parser.add_argument("--lote", type=int, default=1_000,
+                        help="Filas por sentencia INSERT (SQLite admite hasta ~2900 incidentes por lote)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--sin-crear-tablas", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    engine = create_engine(args.database_url)
+    if not args.sin_crear_tablas:
+        SQLModel.metadata.create_all(engine)
+
+    inicio = time.perf_counter()
+    problemas = sembrar_problemas(engine, args, rng)
+    print(f"{problemas} problemas comunes en {time.perf_counter() - inicio:.1f}s", flush=True)
+
+    inicio = time.perf_counter()
+    incidentes, logs = sembrar_incidentes(engine, args, rng)
+    transcurrido = time.perf_counter() - inicio
+    print(f"{incidentes} incidentes y {logs} logs en {transcurrido:.1f}s "
+          f"({(incidentes + logs) / transcurrido:.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
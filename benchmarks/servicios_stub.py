@@ -0,0 +1,85 @@
+"""Servidor local que reemplaza los servicios de clientes y facturación en pruebas de carga.
+
+Uso::
+
+    python -m benchmarks.servicios_stub --puerto 8001 --clientes 2000 --latencia-ms 5
+
+y arrancar la aplicación con::
+
+    URL_SERVICE_CLIENT=http://localhost:8001 URL_SERVICE_FACTURACION=http://localhost:8001
+
+Los correos ``cliente<N>@carga.test`` corresponden al cliente ``N``; los
+``agente<N>@carga.test`` responden 404 como cliente y existen como agentes,
+igual que el servicio real. Para Pub/Sub usar el emulador (``PUBSUB_EMULATOR_HOST``).
+"""
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CORREO = re.compile(r"^(cliente|agente)(\d+)@")
+
+
+class ManejadorStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    clientes = 2_000
+    latencia = 0.0
+
+    def _responder(self, estado: int, cuerpo: dict):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self) -> dict:
+        longitud = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(longitud) or b"{}")
+
+    def do_POST(self):
+        cuerpo = self._leer_json()
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        if self.path == "/incidentes":
+            return self._responder(200, {"message": "Incidente registrado con éxito",
+                                         "radicado_incidente": cuerpo.get("radicado_incidente")})
+
+        coincidencia = _CORREO.match(cuerpo.get("email", ""))
+        tipo, numero = coincidencia.groups() if coincidencia else (None, 0)
+        numero = int(numero)
+        if self.path == "/clientes/email" and tipo == "cliente" and 1 <= numero <= self.clientes:
+            return self._responder(200, {"id": numero, "email": cuerpo["email"]})
+        if self.path == "/agentes/email" and tipo == "agente":
+            return self._responder(200, {"nit": f"900{numero:06d}", "email": cuerpo["email"]})
+        self._responder(404, {"detail": "No encontrado"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8001)
+    parser.add_argument("--clientes", type=int, default=2_000)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia artificial por respuesta")
+    args = parser.parse_args()
+
+    ManejadorStub.clientes = args.clientes
+    ManejadorStub.latencia = args.latencia_ms / 1000
+    servidor = ThreadingHTTPServer((args.host, args.puerto), ManejadorStub)
+    servidor.daemon_threads = True
+    print(f"Servicios stub escuchando en http://{args.host}:{args.puerto}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from jose import jwt
+from starlette.requests import Request
+
+from app import config
+from app.database import (create_incidente_cache_async, obtener_incidente_cache_async,
+                          obtener_incidente_por_radicado_async, obtener_logs_por_incidente, registrar_log_incidente)
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+from app.security import ALGORITHM, SECRET_KEY, get_current_client_token
+
+
+def _nuevo_incidente(cliente_id=1, **campos):
+    return Incidente(cliente_id=cliente_id, description="No puedo acceder al portal desde ayer",
+                     categoria=Categoria.acceso, prioridad=Prioridad.alta, canal=Canal.llamada,
+                     estado=Estado.abierto, **campos)
+
+
+def _sembrar(session, cantidad, cliente_id=1):
+    incidentes = [_nuevo_incidente(cliente_id) for _ in range(cantidad)]
+    session.add_all(incidentes)
+    session.commit()
+    return incidentes
+
+
+def _token():
+    return jwt.encode({"sub": "bench@example.com", "exp": datetime.utcnow() + timedelta(hours=1)},
+                      SECRET_KEY, algorithm=ALGORITHM)
+
+
+@pytest.fixture
+def ejecutar():
+    # Las funciones de caché del camino de servicio son async: cada iteración corre
+    # en un loop propio de la prueba, como lo haría dentro de un worker de uvicorn
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def sin_limites(monkeypatch):
+    # Los límites por cliente cortarían las iteraciones antes de terminar
+    monkeypatch.setattr(config, "LIMITES_HABILITADO", False)
+
+
+def test_create_incidente_cache_async(medir, ejecutar, session, redis_async):
+    medir("create_incidente_cache_async",
+          lambda: ejecutar(create_incidente_cache_async(_nuevo_incidente(), session, redis_async)))
+
+
+def test_obtener_incidente_cache_async(medir, ejecutar, session, redis_async):
+    incidente = _sembrar(session, 1)[0]
+    medir("obtener_incidente_cache_async.miss",
+          lambda: ejecutar(obtener_incidente_cache_async(incidente.id, session, redis_async)),
+          preparar=lambda: (ejecutar(redis_async.flushall()), session.expire_all()))
+    medir("obtener_incidente_cache_async.hit",
+          lambda: ejecutar(obtener_incidente_cache_async(incidente.id, session, redis_async)))
+
+
+def test_obtener_incidente_por_radicado_async(medir, ejecutar, session, redis_async):
+    radicado = _sembrar(session, 1)[0].radicado
+    medir("obtener_incidente_por_radicado_async.miss",
+          lambda: ejecutar(obtener_incidente_por_radicado_async(radicado, session, redis_async)),
+          preparar=lambda: (ejecutar(redis_async.flushall()), session.expire_all()))
+    medir("obtener_incidente_por_radicado_async.hit",
+          lambda: ejecutar(obtener_incidente_por_radicado_async(radicado, session, redis_async)))
+
+
+def _get(client, ruta, estado=200, **kwargs):
+    def pedir():
+        response = client.get(ruta, **kwargs)
+        assert response.status_code == estado
+    return pedir
+
+
+def test_crear_incidente(medir, client, mocker, sin_limites):
+    mocker.patch("app.routes.registrar_incidente_facturado", AsyncMock(return_value={}))
+    cuerpo = {"description": "No puedo acceder al portal desde ayer", "categoria": "acceso", "prioridad": "alta",
+              "canal": "llamada", "cliente_id": 1, "estado": "abierto"}
+
+    def crear():
+        response = client.post("/incidente", json=cuerpo)
+        assert response.status_code == 200
+
+    medir("POST /incidente", crear)
+
+
+def test_obtener_incidente(medir, client, session, redis_client, sin_limites):
+    incidente = _sembrar(session, 1)[0]
+    ruta = f"/incidente/{incidente.id}"
+    medir("GET /incidente/{id}.miss", _get(client, ruta),
+          preparar=lambda: (redis_client.flushall(), session.expire_all()))
+    medir("GET /incidente/{id}.hit", _get(client, ruta))
+    etag = client.get(ruta).headers["ETag"]
+    medir("GET /incidente/{id}.304", _get(client, ruta, 304, headers={"If-None-Match": etag}))
+
+
+def test_obtener_incidente_por_radicado(medir, client, session, redis_client, sin_limites):
+    ruta = f"/incidente/radicado/{_sembrar(session, 1)[0].radicado}"
+    medir("GET /incidente/radicado/{radicado}.miss", _get(client, ruta),
+          preparar=lambda: (redis_client.flushall(), session.expire_all()))
+    medir("GET /incidente/radicado/{radicado}.hit", _get(client, ruta))
+
+
+@pytest.mark.parametrize("cantidad", [10, 100, 1000])
+def test_listar_incidentes(medir, client, session, mocker, sin_limites, cantidad):
+    _sembrar(session, cantidad)
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+    headers = {"Authorization": f"Bearer {_token()}"}
+
+    medir(f"GET /incidentes[{cantidad}]", _get(client, "/incidentes", headers=headers),
+          iteraciones=50 if cantidad >= 1000 else None)
+
+
+def test_decodificar_jwt(medir):
+    request = Request({"type": "http", "headers": [(b"authorization", f"Bearer {_token()}".encode())]})
+    medir("get_current_client_token", lambda: get_current_client_token(request), iteraciones=2000)
+
+
+def test_obtener_logs_por_incidente(medir, session):
+    incidente = _sembrar(session, 1)[0]
+    for origen in ["Postman", "Frontend", "Otro"] * 10:
+        registrar_log_incidente(incidente, origen, session)
+    medir("obtener_logs_por_incidente[30]", lambda: obtener_logs_por_incidente(incidente.id, session))
@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from app.indice_texto import IndiceBM25
+from benchmarks.bench_busqueda import VOCABULARIO, generar_descripcion
+
+
+@pytest.fixture(scope="module")
+def indice_30k():
+    rng = random.Random(42)
+    indice = IndiceBM25()
+    indice.agregar_varios((doc_id, generar_descripcion(rng)) for doc_id in range(30_000))
+    return indice
+
+
+def test_indice_bm25_buscar(medir, indice_30k):
+    rng = random.Random(7)
+    consultas = iter([" ".join(rng.choices(VOCABULARIO, k=3)) for _ in range(100_000)])
+    # Los pesos de cada término se calculan en su primera consulta y se reutilizan después
+    for termino in VOCABULARIO:
+        indice_30k.buscar(termino)
+    medir("IndiceBM25.buscar[30000]", lambda: indice_30k.buscar(next(consultas), 5))
+
+
+def test_indice_bm25_buscar_tras_escritura(medir, indice_30k):
+    rng = random.Random(8)
+    # Cada escritura invalida los pesos: mide la consulta que los recalcula
+    medir("IndiceBM25.buscar[30000].tras_escritura", lambda: indice_30k.buscar("acceso portal error", 5),
+          preparar=lambda: indice_30k.agregar(-1, generar_descripcion(rng)), iteraciones=50)
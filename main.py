@@ -1,20 +1,32 @@
 import os
 from fastapi import FastAPI
+from app import config
 from app.routes import router as incidente_router
-# Importa la función init_db y el engine
-from app.database import init_db, engine, engine_replica
+from app.debug_routes import router as debug_router
+from app.database import cerrar_redis_async, liberar_recursos, precalentar_redis_async, preparar_recursos
 from fastapi.middleware.cors import CORSMiddleware
+from app.consultas_lentas import ConteoConsultasMiddleware
+from app.metricas import MetricasMiddleware
+from app.perfilador import PerfiladorMiddleware
+from app.trazas import TrazasMiddleware, detener_exportador
+from app.logger import configurar_logging, detener_logging
 from contextlib import asynccontextmanager
 
-app = FastAPI()
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configurar_logging()
     if os.getenv("TESTING") != "True":
-        init_db(engine, engine_replica)  # Inicializa la base de datos y crea las tablas
+        # Crea engines y Redis, sincroniza el esquema si cambió y precalienta conexiones
+        preparar_recursos()
+        await precalentar_redis_async(config.PRECALENTAR_CONEXIONES)
     yield
     # Este código se ejecuta cuando la aplicación se apaga
+    if os.getenv("TESTING") != "True":
+        liberar_recursos()
+        await cerrar_redis_async()
+    detener_exportador()
+    detener_logging()
 
 # Inicializa la aplicación FastAPI usando lifespan
 app = FastAPI(lifespan=lifespan)
@@ -22,7 +34,7 @@ app = FastAPI(lifespan=lifespan)
 # Incluir el router
 app.include_router(incidente_router)
 
-app.include_router(incidente_router)
+app.include_router(debug_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,3 +45,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],  # Permite todos los encabezados
 )
+
+if config.PERFILADOR_HABILITADO:
+    app.add_middleware(PerfiladorMiddleware)
+
+if config.DEBUG:
+    app.add_middleware(ConteoConsultasMiddleware)
+
+app.add_middleware(TrazasMiddleware)
+
+app.add_middleware(MetricasMiddleware)
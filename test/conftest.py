@@ -3,11 +3,16 @@ from datetime import date
 import os
 import pytest
 from sqlmodel import Session
-from app.database import get_engine, get_session, get_redis_client, init_db, get_session_replica, get_engine_replica
-from fakeredis import FakeRedis
+from app.database import get_engine, get_session, get_redis_async, get_redis_client, init_db, get_session_replica, get_engine_replica, get_fabrica_sesiones_replica
+from fakeredis import FakeRedis, FakeServer
+from fakeredis.aioredis import FakeRedis as FakeRedisAsync
 from fastapi.testclient import TestClient
 from app.models import Incidente, Categoria, Canal, Prioridad, Estado
 from main import app
+from app.busqueda import buscador_en_memoria
+from app.duplicados import detector_duplicados
+from app.limites import reiniciar_limites
+from app.sugerencias import reiniciar_indices
 from uuid import uuid4
 from sqlmodel import Session, create_engine, SQLModel
 # Establece la variable de entorno para indicar que estamos en pruebas
@@ -34,13 +39,24 @@ def session_fixture():
         os.remove("test_database.db")
 
 # Fixture para el cliente de Redis falso (usado para cache simulado)
+@pytest.fixture(name="redis_server")
+def redis_server_fixture():
+    return FakeServer()
+
+
 @pytest.fixture(name="redis_client")
-def redis_client_fixture():
-    return FakeRedis()
+def redis_client_fixture(redis_server: FakeServer):
+    return FakeRedis(server=redis_server)
+
+
+# Cliente asíncrono sobre el mismo servidor falso que redis_client
+@pytest.fixture(name="redis_async")
+def redis_async_fixture(redis_server: FakeServer):
+    return FakeRedisAsync(server=redis_server)
 
 # Fixture para el cliente de pruebas FastAPI
 @pytest.fixture(name="client")
-def client_fixture(session: Session, redis_client: FakeRedis):
+def client_fixture(session: Session, redis_client: FakeRedis, redis_async: FakeRedisAsync):
     # Override the session dependency to use the test session
     def _get_test_session():
         yield session
@@ -53,10 +69,21 @@ def client_fixture(session: Session, redis_client: FakeRedis):
     def _get_test_redis_client():
         return redis_client
 
+    def _get_test_redis_async():
+        return redis_async
+
+    # Los índices en memoria se construyen desde la base de datos de cada prueba
+    reiniciar_indices()
+    buscador_en_memoria.reiniciar()
+    detector_duplicados.reiniciar()
+    reiniciar_limites()
+
     # Apply dependency overrides
     app.dependency_overrides[get_session] = _get_test_session
     app.dependency_overrides[get_session_replica] = _get_test_session_replica  # Ensure this is overridden for tests
+    app.dependency_overrides[get_fabrica_sesiones_replica] = lambda: lambda: Session(session.get_bind())
     app.dependency_overrides[get_redis_client] = _get_test_redis_client
+    app.dependency_overrides[get_redis_async] = _get_test_redis_async
 
     # Use the TestClient to make API requests
     with TestClient(app) as client:
@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from app.archivo import archivar_cerrados, mover_a_archivo, publicaciones_pendientes
+from app.filtro_negativo import ausente_seguro, construir_filtro_radicados
+from app.database import (obtener_incidente_cache, obtener_incidente_cache_async,
+                          obtener_incidente_por_radicado_async, obtener_logs_por_incidente)
+from app.models import (Canal, Categoria, Estado, Incidente, IncidenteArchivado, LogIncidente,
+                        LogIncidenteArchivado, Prioridad)
+
+
+def _incidente(estado: Estado, radicado: str, cerrado_hace=None) -> Incidente:
+    return Incidente(cliente_id=1, description="Sin acceso", categoria=Categoria.acceso, prioridad=Prioridad.alta,
+                     canal=Canal.llamada, estado=estado, solucion="Listo" if cerrado_hace is not None else None,
+                     fecha_cierre=date.today() - timedelta(days=cerrado_hace) if cerrado_hace is not None else None,
+                     radicado=radicado)
+
+
+@pytest.fixture
+def sembrados(session):
+    incidentes = [
+        _incidente(Estado.cerrado, "VIEJO001", 400),
+        _incidente(Estado.abierto, "ABIERTO1"),
+        _incidente(Estado.cerrado, "VIEJO002", 200),
+        _incidente(Estado.cerrado, "RECIENTE", 5),
+        _incidente(Estado.cerrado, "VIEJO003", 365),
+    ]
+    session.add_all(incidentes)
+    session.commit()
+    for incidente in incidentes:
+        session.add(LogIncidente(incidente_id=incidente.id, cuerpo_completo=incidente.model_dump_json(),
+                                 origen_cambio="Otro", fecha_cambio=datetime(2024, 1, 1)))
+    session.commit()
+    return {incidente.radicado: incidente.id for incidente in incidentes}
+
+
+def test_archiva_cerrados_antiguos_por_lotes(session, sembrados):
+    publicados, progreso = [], []
+
+    resumen = archivar_cerrados(session.get_bind(), dias=180, lote=2, pausa_s=0,
+                                publicar=lambda datos, topic: publicados.append(datos), progreso=progreso.append)
+
+    viejos = sorted(sembrados[r] for r in ("VIEJO001", "VIEJO002", "VIEJO003"))
+    assert resumen["incidentes"] == 3
+    assert resumen["lotes"] == 2
+    assert [p["incidentes"] for p in progreso] == [2, 3]
+    assert [i for datos in publicados for i in datos["ids"]] == viejos
+    assert all(datos["operation"] == "archive" for datos in publicados)
+
+    session.expire_all()
+    calientes = session.exec(select(Incidente.id)).all()
+    assert sorted(calientes) == sorted([sembrados["ABIERTO1"], sembrados["RECIENTE"]])
+    assert sorted(session.exec(select(IncidenteArchivado.id)).all()) == viejos
+    assert sorted(session.exec(select(LogIncidenteArchivado.incidente_id)).all()) == viejos
+    assert session.exec(select(LogIncidente).where(LogIncidente.incidente_id.in_(viejos))).first() is None
+
+
+def test_publicacion_fallida_queda_en_el_outbox_y_se_publica_despues(session, sembrados, monkeypatch):
+    monkeypatch.setattr("app.archivo.time.sleep", lambda _: None)
+
+    def caido(datos, topic):
+        raise ConnectionError("Pub/Sub no disponible")
+
+    resumen = archivar_cerrados(session.get_bind(), dias=180, lote=2, pausa_s=0, publicar=caido,
+                                progreso=lambda _: None)
+    assert resumen["incidentes"] == 3
+    assert resumen["publicaciones_pendientes"] == 2
+
+    publicados = []
+    resumen = archivar_cerrados(session.get_bind(), dias=180, lote=2, pausa_s=0,
+                                publicar=lambda datos, topic: publicados.append(datos["ids"]), progreso=lambda _: None)
+    assert resumen["incidentes"] == 0
+    assert resumen["publicaciones_pendientes"] == 0
+    assert [i for ids in publicados for i in ids] == sorted(sembrados[r] for r in ("VIEJO001", "VIEJO002", "VIEJO003"))
+    with session.get_bind().connect() as conn:
+        assert conn.execute(select(publicaciones_pendientes)).first() is None
+
+
+def test_publicacion_reintenta_fallos_transitorios(session, sembrados, monkeypatch):
+    monkeypatch.setattr("app.archivo.time.sleep", lambda _: None)
+    intentos = []
+
+    def inestable(datos, topic):
+        intentos.append(datos["ids"])
+        if len(intentos) == 1:
+            raise TimeoutError()
+
+    resumen = archivar_cerrados(session.get_bind(), dias=180, pausa_s=0, publicar=inestable, progreso=lambda _: None)
+    assert resumen["publicaciones_pendientes"] == 0
+    assert len(intentos) == 2
+    assert intentos[0] == intentos[1]
+
+
+def test_mover_a_archivo_es_idempotente(session, sembrados):
+    with session.get_bind().begin() as conn:
+        assert mover_a_archivo(conn, [sembrados["VIEJO001"]]) == 1
+    with session.get_bind().begin() as conn:
+        assert mover_a_archivo(conn, [sembrados["VIEJO001"]]) == 0
+    assert len(session.exec(select(IncidenteArchivado)).all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_lecturas_caen_al_archivo(session, redis_client, redis_async, sembrados):
+    archivar_cerrados(session.get_bind(), dias=180, pausa_s=0, publicar=lambda *_: None, progreso=lambda _: None)
+    session.expire_all()
+    incidente_id = sembrados["VIEJO002"]
+    construir_filtro_radicados(session.get_bind(), redis_client)
+    assert not await ausente_seguro(redis_async, "radicado", "VIEJO002")
+
+    assert (await obtener_incidente_cache_async(incidente_id, session, redis_async))["radicado"] == "VIEJO002"
+    por_radicado = await obtener_incidente_por_radicado_async("VIEJO002", session, redis_async)
+    assert por_radicado.id == incidente_id
+    assert obtener_incidente_cache(sembrados["VIEJO003"], session, redis_client)["radicado"] == "VIEJO003"
+
+    logs = obtener_logs_por_incidente(incidente_id, session)
+    assert [log.incidente_id for log in logs] == [incidente_id]
+    assert isinstance(logs[0], LogIncidente)
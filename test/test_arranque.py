@@ -0,0 +1,99 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fakeredis import FakeRedis
+from sqlalchemy import inspect, text
+from unittest.mock import patch
+
+from app import config
+from app import database
+from app import indices
+from app.database import (crear_indices_faltantes, get_engine, huella_esquema, indices_faltantes,
+                          precalentar_conexiones, sincronizar_esquema)
+from main import app
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(f"sqlite:///{tmp_path / 'arranque.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_importar_main_no_crea_recursos():
+    codigo = "import main, app.database as d; print(sorted(d._recursos))"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).resolve().parent.parent)
+    assert salida.stdout.strip() == "[]"
+
+
+def test_rutas_registradas_una_sola_vez():
+    rutas = [(ruta.path, tuple(sorted(ruta.methods))) for ruta in app.routes if getattr(ruta, "methods", None)]
+    assert len(rutas) == len(set(rutas))
+
+
+def test_sincronizar_esquema_omite_ddl_si_la_huella_coincide(engine):
+    assert sincronizar_esquema(engine) is True
+    assert "incidente" in inspect(engine).get_table_names()
+
+    with patch("app.database.SQLModel.metadata.create_all") as create_all:
+        assert sincronizar_esquema(engine) is False
+    create_all.assert_not_called()
+
+
+def test_sincronizar_esquema_ejecuta_ddl_si_la_huella_cambia(engine):
+    sincronizar_esquema(engine)
+    with patch("app.database.huella_esquema", return_value="otra"):
+        assert sincronizar_esquema(engine) is True
+
+
+def test_sincronizar_esquema_modo_siempre(engine, monkeypatch):
+    sincronizar_esquema(engine)
+    monkeypatch.setattr(config, "ESQUEMA_SINCRONIZACION", "siempre")
+    assert sincronizar_esquema(engine) is True
+
+
+def test_indices_faltantes_se_crean_con_el_comando(engine, monkeypatch):
+    sincronizar_esquema(engine)
+    # Base creada antes de que el modelo declarara el índice
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_problemacomun_cliente_id"))
+
+    # El arranque solo avisa: construir el índice bloquearía con tablas grandes
+    with patch("app.database.huella_esquema", return_value="otra"):
+        assert sincronizar_esquema(engine) is True
+    assert not inspect(engine).has_index("problemacomun", "ix_problemacomun_cliente_id")
+    # El FULLTEXT es solo de MySQL
+    assert [indice.name for indice in indices_faltantes(engine)] == ["ix_problemacomun_cliente_id"]
+
+    monkeypatch.setattr("app.indices.obtener_engine", lambda: engine)
+    monkeypatch.setattr("app.indices.obtener_engine_replica", lambda: engine)
+    assert indices.main([]) == 0
+    assert inspect(engine).has_index("problemacomun", "ix_problemacomun_cliente_id")
+    assert not inspect(engine).has_index("incidente", "ft_incidente_texto")
+    assert crear_indices_faltantes(engine) == []
+
+
+def test_huella_esquema_es_estable(engine):
+    assert huella_esquema(engine) == huella_esquema(engine)
+    assert len(huella_esquema(engine)) == 64
+
+
+def test_precalentar_conexiones_llena_los_pools(engine):
+    redis = FakeRedis()
+    precalentar_conexiones(engine, redis, cantidad=3)
+    assert engine.pool.checkedin() == 3
+    assert engine.pool.checkedout() == 0
+    assert len(redis.connection_pool._available_connections) == 3
+
+
+def test_sincronizar_esquemas_una_vez_por_proceso(monkeypatch):
+    monkeypatch.setattr(database, "_esquemas_sincronizados", False)
+    monkeypatch.setattr(database, "obtener_engine", lambda: "primaria")
+    monkeypatch.setattr(database, "obtener_engine_replica", lambda: "replica")
+    with patch("app.database.sincronizar_esquema") as sincronizar:
+        database.sincronizar_esquemas()
+        database.sincronizar_esquemas()
+    assert [llamada.args[0] for llamada in sincronizar.call_args_list] == ["primaria", "replica"]
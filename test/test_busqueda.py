@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+from fastapi import HTTPException, status
+from jose import jwt
+import pytest
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import ProgrammingError
+from app import busqueda
+from app.busqueda import BuscadorFulltextMySQL, BuscadorEnMemoria, obtener_buscador
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+from app.security import ALGORITHM, SECRET_KEY
+
+
+def _headers():
+    token = jwt.encode({"sub": "user@example.com", "exp": datetime.utcnow() + timedelta(minutes=30)},
+                       SECRET_KEY, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _incidente(cliente_id, description, solucion=None):
+    return Incidente(cliente_id=cliente_id, description=description, solucion=solucion,
+                     categoria=Categoria.acceso, prioridad=Prioridad.media, canal=Canal.correo,
+                     estado=Estado.abierto)
+
+
+def _sembrar(session):
+    session.add(_incidente(1, "No puedo iniciar sesión en el portal", "Se restableció la contraseña"))
+    session.add(_incidente(1, "El portal muestra error 500 al pagar"))
+    session.add(_incidente(1, "Cobro duplicado en la factura"))
+    session.add(_incidente(2, "No puedo iniciar sesión desde el celular"))
+    session.commit()
+
+
+def test_buscar_incidentes_como_cliente(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+
+    response = client.get("/incidentes/search", params={"q": "iniciar sesión contraseña"}, headers=_headers())
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total"] == 1
+    assert data["resultados"][0]["incidente"]["solucion"] == "Se restableció la contraseña"
+    assert data["resultados"][0]["score"] > 0
+
+
+def test_buscar_incidentes_como_agente_paginado(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente",
+                 AsyncMock(side_effect=HTTPException(status_code=404, detail="Cliente no encontrado")))
+    mocker.patch("app.routes.verificar_agente_existente", AsyncMock(return_value="NIT"))
+
+    primera = client.get("/incidentes/search", params={"q": "iniciar sesion", "page_size": 1}, headers=_headers()).json()
+    segunda = client.get("/incidentes/search", params={"q": "iniciar sesion", "page": 2, "page_size": 1},
+                         headers=_headers()).json()
+
+    assert primera["total"] == 2
+    assert len(primera["resultados"]) == 1
+    assert len(segunda["resultados"]) == 1
+    assert primera["resultados"][0]["incidente"]["id"] != segunda["resultados"][0]["incidente"]["id"]
+
+
+def test_buscar_incidentes_usuario_desconocido(client, mocker):
+    mocker.patch("app.routes.verificar_cliente_existente",
+                 AsyncMock(side_effect=HTTPException(status_code=404, detail="Cliente no encontrado")))
+    mocker.patch("app.routes.verificar_agente_existente",
+                 AsyncMock(side_effect=HTTPException(status_code=404, detail="Agente no encontrado")))
+
+    response = client.get("/incidentes/search", params={"q": "portal"}, headers=_headers())
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_buscar_incidentes_indexa_incidentes_nuevos(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+    assert client.get("/incidentes/search", params={"q": "impresora"}, headers=_headers()).json()["total"] == 0
+
+    nuevo = client.post("/incidente", json={
+        "description": "La impresora no responde", "categoria": "funcionamiento", "prioridad": "baja",
+        "canal": "llamada", "cliente_id": 1, "estado": "abierto", "identificacion_usuario": "1"
+    }).json()
+    client.put(f"/incidente/{nuevo['id']}/solucionar", json={"solucion": "Reiniciar la cola de impresión"})
+
+    data = client.get("/incidentes/search", params={"q": "cola impresion"}, headers=_headers()).json()
+    assert data["total"] == 1
+    assert data["resultados"][0]["incidente"]["id"] == nuevo["id"]
+
+
+def test_obtener_buscador_por_dialecto(session, mocker):
+    assert isinstance(obtener_buscador(session), BuscadorEnMemoria)
+
+    mocker.patch.object(busqueda.config, "BUSQUEDA_BACKEND", "fulltext")
+    assert isinstance(obtener_buscador(session), BuscadorFulltextMySQL)
+
+
+def test_buscador_fulltext_genera_match_against(mocker):
+    session = mocker.MagicMock()
+    session.exec.return_value.one.return_value = 0
+    session.exec.return_value.all.return_value = []
+
+    BuscadorFulltextMySQL().buscar("portal", 7, session, 0, 10)
+
+    sql = str(session.exec.call_args_list[1].args[0].compile(dialect=mysql.dialect()))
+    assert "MATCH (incidente.description, incidente.solucion) AGAINST" in sql
+    assert "IN NATURAL LANGUAGE MODE" in sql
+    assert "incidente.cliente_id =" in sql
+
+
+def _sin_indice_fulltext(mocker):
+    mocker.patch.object(busqueda.config, "BUSQUEDA_BACKEND", "fulltext")
+    mocker.patch.object(busqueda.buscador_fulltext, "disponible", True)
+    mocker.patch.object(busqueda.buscador_fulltext, "reintentar_en", 0.0)
+    sin_indice = ProgrammingError("SELECT ...", {}, Exception(1191, "Can't find FULLTEXT index matching the column list"))
+    return mocker.patch.object(busqueda.buscador_fulltext, "buscar", side_effect=sin_indice)
+
+
+def test_sin_indice_fulltext_busca_solo_en_el_cliente(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+    buscar = _sin_indice_fulltext(mocker)
+
+    response = client.get("/incidentes/search", params={"q": "portal"}, headers=_headers())
+    assert response.status_code == 200
+    assert response.json()["total"] == 2
+    assert not busqueda.buscador_fulltext.disponible
+
+    # Sin índice compartido: un incidente nuevo aparece en la siguiente búsqueda
+    session.add(_incidente(1, "El portal no carga"))
+    session.commit()
+    response = client.get("/incidentes/search", params={"q": "portal"}, headers=_headers())
+    assert response.json()["total"] == 3
+    assert buscar.call_count == 1
+    assert busqueda.buscador_en_memoria._indices == {}
+
+
+def test_sin_indice_fulltext_rechaza_busqueda_de_agentes(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente",
+                 AsyncMock(side_effect=HTTPException(status_code=404, detail="Cliente no encontrado")))
+    mocker.patch("app.routes.verificar_agente_existente", AsyncMock(return_value="NIT"))
+    _sin_indice_fulltext(mocker)
+
+    response = client.get("/incidentes/search", params={"q": "portal"}, headers=_headers())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "60"
+
+
+def test_sin_indice_fulltext_reintenta_tras_el_intervalo(session, mocker):
+    buscar = _sin_indice_fulltext(mocker)
+    busqueda.buscar_incidentes("portal", 1, session)
+    busqueda.buscar_incidentes("portal", 1, session)
+    assert buscar.call_count == 1
+
+    # El comando de índices terminó: el siguiente intento vuelve al FULLTEXT
+    buscar.side_effect = None
+    buscar.return_value = (0, [])
+    mocker.patch("app.busqueda.time.monotonic", return_value=busqueda.buscador_fulltext.reintentar_en)
+    assert busqueda.buscar_incidentes("portal", None, session) == (0, [])
+    assert busqueda.buscador_fulltext.disponible
+
+
+def test_buscador_base_es_abstracto():
+    with pytest.raises(TypeError):
+        busqueda.BuscadorIncidentes()
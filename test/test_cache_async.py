@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from app.database import (create_incidente_cache_async, obtener_incidente_cache_async,
+                          obtener_incidente_por_radicado_async)
+from app.models import Incidente
+
+
+@pytest.mark.asyncio
+async def test_create_incidente_cache_async(session, redis_async, redis_client, incidente):
+    incidente.id = None
+    creado = await create_incidente_cache_async(incidente, session, redis_async)
+
+    assert creado.id is not None
+    assert json.loads(await redis_async.get(f"incidente:{creado.id}"))["radicado"] == creado.radicado
+    # Ambos clientes comparten el servidor falso
+    assert redis_client.get(f"incidente:{creado.id}") is not None
+
+
+@pytest.mark.asyncio
+async def test_obtener_incidente_cache_async_miss_y_hit(session, redis_async, incidente):
+    session.add(incidente)
+    session.commit()
+
+    desde_base = await obtener_incidente_cache_async(incidente.id, session, redis_async)
+    assert desde_base["id"] == incidente.id
+    assert await redis_async.exists(f"incidente:{incidente.id}")
+
+    session.delete(incidente)
+    session.commit()
+    desde_cache = await obtener_incidente_cache_async(incidente.id, session, redis_async)
+    assert desde_cache == desde_base
+
+
+@pytest.mark.asyncio
+async def test_obtener_incidente_cache_async_inexistente(session, redis_async):
+    assert await obtener_incidente_cache_async(999, session, redis_async) is None
+    assert not await redis_async.exists("incidente:999")
+
+
+@pytest.mark.asyncio
+async def test_obtener_incidente_por_radicado_async(session, redis_async, incidente):
+    session.add(incidente)
+    session.commit()
+
+    encontrado = await obtener_incidente_por_radicado_async(incidente.radicado, session, redis_async)
+    assert isinstance(encontrado, Incidente)
+    assert encontrado.id == incidente.id
+    assert await redis_async.exists(f"incidente:radicado:{incidente.radicado}")
+
+    cacheado = await obtener_incidente_por_radicado_async(incidente.radicado, session, redis_async)
+    assert cacheado.id == incidente.id
+    assert await obtener_incidente_por_radicado_async("noexiste", session, redis_async) is None
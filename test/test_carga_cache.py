@@ -0,0 +1,82 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.carga_cache import CargaUnica
+
+
+@pytest.mark.asyncio
+async def test_fallos_concurrentes_cargan_una_sola_vez(redis_async):
+    carga = CargaUnica()
+    llamadas = []
+
+    async def cargar():
+        llamadas.append(1)
+        await asyncio.sleep(0.02)
+        return '{"id": 1}'
+
+    valores = await asyncio.gather(*(carga.obtener(redis_async, "id", "incidente:1", cargar) for _ in range(20)))
+
+    assert valores == ['{"id": 1}'] * 20
+    assert len(llamadas) == 1
+    assert await redis_async.get("incidente:1") == b'{"id": 1}'
+    assert await redis_async.ttl("incidente:1") > 0
+    assert not await redis_async.exists("incidente:1:carga")
+
+
+@pytest.mark.asyncio
+async def test_espera_la_carga_de_otro_proceso(redis_async):
+    carga = CargaUnica()
+    await redis_async.set("incidente:1:carga", "otro", px=2000)
+
+    async def cargar():
+        raise AssertionError("no debe cargar mientras otro proceso tiene el candado")
+
+    async def otro_proceso():
+        await asyncio.sleep(0.03)
+        await redis_async.set("incidente:1", '{"id": 1}')
+
+    valor, _ = await asyncio.gather(carga.obtener(redis_async, "id", "incidente:1", cargar), otro_proceso())
+    assert valor == b'{"id": 1}'
+
+
+@pytest.mark.asyncio
+async def test_resultado_inexistente_no_se_guarda(redis_async):
+    carga = CargaUnica()
+
+    async def cargar():
+        return None
+
+    assert await carga.obtener(redis_async, "id", "incidente:9", cargar) is None
+    assert not await redis_async.exists("incidente:9")
+    assert not await redis_async.exists("incidente:9:carga")
+
+
+@pytest.mark.asyncio
+async def test_refresca_antes_de_expirar(redis_async):
+    carga = CargaUnica()
+    await redis_async.set("incidente:1", '{"version": 1}', px=50)
+
+    async def cargar():
+        return '{"version": 2}'
+
+    with patch("app.carga_cache.random.random", return_value=0.5):
+        assert await carga.obtener(redis_async, "id", "incidente:1", cargar) == b'{"version": 1}'
+
+    # Con U muy cercano a 0 la probabilidad de refrescar es casi 1
+    with patch("app.carga_cache.random.random", return_value=1 - 1e-12):
+        assert await carga.obtener(redis_async, "id", "incidente:1", cargar) == '{"version": 2}'
+    assert await redis_async.get("incidente:1") == b'{"version": 2}'
+
+
+@pytest.mark.asyncio
+async def test_sin_ttl_no_refresca(redis_async):
+    carga = CargaUnica()
+    await redis_async.set("incidente:1", '{"version": 1}')
+
+    async def cargar():
+        raise AssertionError("una clave sin TTL no se refresca")
+
+    with patch("app.carga_cache.random.random", return_value=1 - 1e-12):
+        assert await carga.obtener(redis_async, "id", "incidente:1", cargar) == b'{"version": 1}'
@@ -0,0 +1,76 @@
+import json
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from app import codec_cache
+from app.codec_cache import CABECERA, codificar, codificar_binario, decodificar
+from app.database import obtener_incidente_cache_async, obtener_incidente_por_radicado_async
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+
+
+def _incidente(**cambios) -> Incidente:
+    datos = dict(id=42, cliente_id=7, description="No puedo ingresar a la plataforma", categoria=Categoria.acceso,
+                 prioridad=Prioridad.media, canal=Canal.correo, estado=Estado.cerrado,
+                 fecha_creacion=date(2024, 3, 1), fecha_cierre=date(2024, 3, 5), solucion="Se restableció la clave",
+                 radicado="AbC12345", identificacion_usuario="1020304050")
+    datos.update(cambios)
+    return Incidente(**datos)
+
+
+@pytest.mark.parametrize("cambios", [
+    {},
+    {"fecha_cierre": None, "solucion": None, "identificacion_usuario": None, "estado": Estado.abierto},
+    {"description": "ñandú " * 400, "solucion": "x" * 2000},
+    {"categoria": "queja", "canal": "aplicacion"},
+])
+def test_binario_equivale_a_json(cambios):
+    incidente = _incidente(**cambios)
+    valor = codificar_binario(incidente)
+
+    assert valor.startswith(CABECERA)
+    assert decodificar(valor) == json.loads(incidente.model_dump_json())
+
+
+def test_binario_comprime_textos_largos():
+    incidente = _incidente(description="la impresora no imprime " * 200)
+    valor = codificar_binario(incidente)
+
+    assert valor[3] & 0x01
+    assert len(valor) < len(incidente.model_dump_json()) / 10
+
+
+def test_binario_es_mas_compacto_que_json():
+    incidente = _incidente()
+    assert len(codificar_binario(incidente)) < len(incidente.model_dump_json()) / 2
+
+
+def test_version_desconocida():
+    valor = bytearray(codificar_binario(_incidente()))
+    valor[2] = 99
+    with pytest.raises(ValueError):
+        decodificar(bytes(valor))
+
+
+def test_json_sigue_siendo_el_formato_por_defecto():
+    incidente = _incidente()
+    assert codificar(incidente) == incidente.model_dump_json()
+    assert decodificar(incidente.model_dump_json().encode()) == json.loads(incidente.model_dump_json())
+
+
+@pytest.mark.asyncio
+async def test_lee_ambos_formatos_durante_el_cambio(session, redis_async, incidente):
+    session.add(incidente)
+    session.commit()
+    await obtener_incidente_cache_async(incidente.id, session, redis_async)
+    assert (await redis_async.get(f"incidente:{incidente.id}")).startswith(b"{")
+
+    with patch.object(codec_cache.config, "CACHE_CODEC", "binario"):
+        desde_json = await obtener_incidente_cache_async(incidente.id, session, redis_async)
+        encontrado = await obtener_incidente_por_radicado_async(incidente.radicado, session, redis_async)
+
+    assert (await redis_async.get(f"incidente:radicado:{incidente.radicado}")).startswith(CABECERA)
+    assert desde_json["radicado"] == incidente.radicado
+    assert encontrado.id == incidente.id
+    assert (await obtener_incidente_por_radicado_async(incidente.radicado, session, redis_async)).id == incidente.id
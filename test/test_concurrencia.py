@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from jose import jwt
+from sqlalchemy import text
+
+from app.concurrencia import DependenciaSaturada, LimiteAdaptativo, RECHAZOS, limitar_pool, limites, sin_rechazos
+from app.database import get_engine, get_session
+from app.metricas import nombrar_engine
+from app.security import ALGORITHM, SECRET_KEY
+
+
+def _operar(limite, duracion):
+    with patch("app.concurrencia.time.perf_counter", side_effect=[0.0, duracion]):
+        with limite.adquirir():
+            pass
+
+
+def test_rechaza_al_alcanzar_el_limite():
+    limite = LimiteAdaptativo("prueba", inicial=2, minimo=1, maximo=10)
+    antes = RECHAZOS.valores().get(("prueba",), 0)
+    with limite.adquirir(), limite.adquirir():
+        with pytest.raises(DependenciaSaturada) as error:
+            with limite.adquirir():
+                pass
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "1"
+    assert limite.en_curso == 0
+    assert RECHAZOS.valores()[("prueba",)] == antes + 1
+
+
+def test_sin_rechazos_concede_el_cupo_sobre_el_limite():
+    limite = LimiteAdaptativo("prueba", inicial=1, minimo=1, maximo=10)
+    with limite.adquirir():
+        with sin_rechazos(), limite.adquirir(medir=False):
+            assert limite.en_curso == 2
+        with pytest.raises(DependenciaSaturada):
+            with limite.adquirir():
+                pass
+    assert limite.en_curso == 0
+
+
+def test_crece_con_latencia_estable_si_se_usa():
+    limite = LimiteAdaptativo("prueba", inicial=4, minimo=1, maximo=10)
+    with limite.adquirir(), limite.adquirir():
+        for _ in range(20):
+            _operar(limite, 0.010)
+    assert limite.limite > 4
+
+
+def test_no_crece_si_no_se_usa():
+    limite = LimiteAdaptativo("prueba", inicial=10, minimo=1, maximo=100)
+    for _ in range(20):
+        _operar(limite, 0.010)
+    assert limite.limite == 10
+
+
+def test_se_reduce_con_latencia_alta():
+    limite = LimiteAdaptativo("prueba", inicial=10, minimo=2, maximo=100, margen_s=0.001)
+    _operar(limite, 0.010)
+    _operar(limite, 0.100)
+    assert limite.limite == pytest.approx(9)
+
+
+def test_reduce_una_vez_por_intervalo_y_respeta_el_minimo():
+    limite = LimiteAdaptativo("prueba", inicial=10, minimo=8, maximo=100, margen_s=0.001)
+    limite.observar(0.010)
+    for _ in range(5):
+        limite.observar(0.5)
+    assert limite.limite == pytest.approx(9)
+    for _ in range(5):
+        limite._ultima_reduccion = 0.0
+        limite.observar(0.5)
+    assert limite.limite == 8
+
+
+def test_fallo_de_conexion_reduce_el_limite():
+    limite = LimiteAdaptativo("prueba", inicial=10, minimo=1, maximo=100, fallos=(ConnectionError,))
+    with pytest.raises(ConnectionError):
+        with limite.adquirir():
+            raise ConnectionError()
+    assert limite.limite == pytest.approx(9)
+    assert limite.latencia_base is None
+
+
+def test_una_operacion_lenta_aislada_no_reduce_el_limite():
+    limite = LimiteAdaptativo("prueba", inicial=10, minimo=2, maximo=100, margen_s=0.005)
+    for _ in range(50):
+        limite.observar(0.001)
+    # Una consulta pesada entre muchas livianas no es congestión
+    limite.observar(0.020)
+    assert limite.limite == 10
+
+
+def test_conexion_del_pool_reserva_el_cupo_hasta_devolverla(tmp_path, monkeypatch):
+    engine = get_engine(f"sqlite:///{tmp_path / 'c.db'}")
+    nombrar_engine(engine, "primary")
+    limitar_pool(engine, "primary")
+    limite = limites["db_primary"]
+    limite.reiniciar(1)
+    monkeypatch.setattr(limite, "maximo", 1)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert limite.en_curso == 1
+        # Sin cupo se rechaza antes de esperar una conexión del pool
+        with pytest.raises(DependenciaSaturada):
+            engine.connect()
+    assert limite.en_curso == 0
+    assert limite.latencia_base is not None
+
+    engine.dispose()
+    assert engine.pool.limite is limite
+    with engine.connect():
+        assert limite.en_curso == 1
+    assert limite.en_curso == 0
+    limite.reiniciar(15)
+    engine.dispose()
+
+
+def test_sesion_sin_consultas_no_ocupa_cupo(session):
+    limite = limites["db_primary"]
+    limite.reiniciar(15)
+    with patch("app.database.obtener_engine", return_value=session.get_bind()):
+        sesiones = get_session()
+        next(sesiones)
+        assert limite.en_curso == 0
+        sesiones.close()
+
+
+def test_servicio_de_clientes_saturado_responde_503(client, monkeypatch):
+    monkeypatch.setattr(limites["clientes"], "limite", 0.0)
+    token = jwt.encode({"sub": "a@b.co", "exp": datetime.utcnow() + timedelta(hours=1)}, SECRET_KEY, algorithm=ALGORITHM)
+    with patch("httpx.AsyncClient.post", new_callable=AsyncMock) as post:
+        response = client.get("/incidentes", headers={"Authorization": f"Bearer {token}"})
+    post.assert_not_called()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert 'concurrency_limit{dependency="clientes",kind="limit"} 0' in client.get("/metrics").text
+
+
+def test_crear_incidente_no_rechaza_tras_confirmar(client, session, monkeypatch):
+    monkeypatch.setattr(limites["redis"], "limite", 1.0)
+    monkeypatch.setattr(limites["redis"], "en_curso", 1)
+
+    async def marcar(*args, **kwargs):
+        with limites["redis"].adquirir(medir=False):
+            pass
+
+    cuerpo = {"description": "No puedo acceder", "categoria": "acceso", "prioridad": "alta", "canal": "llamada",
+              "cliente_id": 1, "estado": "abierto"}
+    with patch("app.routes.marcar_incidente_modificado_async", side_effect=marcar):
+        response = client.post("/incidente", json=cuerpo)
+
+    # Un 503 aquí haría que el cliente reintente y duplique el incidente ya guardado
+    assert response.status_code == 200
+    assert session.exec(text("SELECT COUNT(*) FROM incidente")).scalar() == 1
@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import config
+from app.consultas_lentas import (ConteoConsultasMiddleware, anonimizar_parametros, forma_parametros, normalizar_sql,
+                                  registro_consultas_lentas)
+
+INCIDENTE = {
+    "description": "Test incident", "categoria": "acceso", "prioridad": "alta", "canal": "llamada",
+    "cliente_id": 1, "estado": "abierto", "identificacion_usuario": "123456789"
+}
+
+
+def test_normalizar_sql():
+    sql = "SELECT *  FROM incidente\n WHERE cliente_id = 42 AND radicado = 'ab''c' AND id IN (?, ?, ?)"
+    assert normalizar_sql(sql) == "SELECT * FROM incidente WHERE cliente_id = ? AND radicado = ? AND id IN (?, ...)"
+
+
+def test_forma_parametros():
+    assert forma_parametros((1, "x"), False) == ["int", "str"]
+    assert forma_parametros({"id": 1}, False) == {"id": "int"}
+    assert forma_parametros([(1,), (2,)], True) == {"executemany": 2, "fila": ["int"]}
+
+
+def test_registra_consultas_sobre_el_umbral_y_explain(client, session, mocker):
+    mocker.patch.object(config, "CONSULTAS_LENTAS_UMBRAL_MS", 0)
+    mocker.patch.object(config, "DEBUG_TOKEN", "secreto")
+    registro_consultas_lentas.limpiar()
+
+    session.exec(text("SELECT * FROM incidente WHERE cliente_id = :cliente"), params={"cliente": 7}).all()
+
+    response = client.get("/debug/slow-queries", params={"explain": True}, headers={"X-Debug-Token": "secreto"})
+    assert response.status_code == 200
+    consulta = next(c for c in response.json() if "FROM incidente WHERE cliente_id" in c["sql"])
+    assert consulta["parametros"] == ["int"]
+    assert consulta["duracion_ms"] >= 0
+    assert consulta["plan"]
+
+
+def test_endpoints_debug_protegidos(client, mocker):
+    assert client.get("/debug/slow-queries").status_code == 404
+
+    mocker.patch.object(config, "DEBUG_TOKEN", "secreto")
+    assert client.get("/debug/slow-queries").status_code == 403
+    assert client.get("/debug/slow-queries", headers={"X-Debug-Token": "otro"}).status_code == 403
+
+
+def test_conteo_de_consultas_por_peticion(client):
+    with TestClient(ConteoConsultasMiddleware(client.app)) as cliente_debug:
+        incidente = cliente_debug.post("/incidente", json=INCIDENTE)
+        listado = cliente_debug.get("/incidentes/fields")
+
+    assert int(incidente.headers["X-Query-Count"]) >= 2
+    assert float(incidente.headers["X-Query-Time-Ms"]) >= 0
+    assert listado.headers["X-Query-Count"] == "0"
+
+
+def test_parametros_guardados_sin_textos(session, mocker):
+    mocker.patch.object(config, "CONSULTAS_LENTAS_UMBRAL_MS", 0)
+    registro_consultas_lentas.limpiar()
+
+    session.exec(text("SELECT * FROM incidente WHERE radicado = :radicado AND cliente_id = :cliente"),
+                 params={"radicado": "RAD-PERSONAL", "cliente": 7}).all()
+
+    consulta = next(c for c in registro_consultas_lentas.listar() if "radicado =" in c.sql)
+    assert consulta.parametros == ("", 7)
+    assert anonimizar_parametros({"a": "x", "b": [b"y", 2]}) == {"a": "", "b": [b"", 2]}
+
+
+def test_sentencia_fallida_no_deja_inicios_pendientes(session):
+    conexion = session.connection()
+    with pytest.raises(OperationalError):
+        conexion.execute(text("SELECT * FROM tabla_inexistente"))
+    assert not conexion.info.get("sentencia_inicio")
+
+
+def test_muestrea_las_consultas_lentas(session, mocker):
+    mocker.patch.object(config, "CONSULTAS_LENTAS_UMBRAL_MS", 0)
+    mocker.patch.object(config, "CONSULTAS_LENTAS_MUESTREO", 0.5)
+    registro_consultas_lentas.limpiar()
+
+    mocker.patch("app.consultas_lentas.random.random", return_value=0.7)
+    session.exec(text("SELECT * FROM incidente WHERE cliente_id = 1")).all()
+    assert not registro_consultas_lentas.listar()
+
+    mocker.patch("app.consultas_lentas.random.random", return_value=0.2)
+    session.exec(text("SELECT * FROM incidente WHERE cliente_id = 2")).all()
+    assert [c.sql_normalizado for c in registro_consultas_lentas.listar()] == [
+        "SELECT * FROM incidente WHERE cliente_id = ?"]
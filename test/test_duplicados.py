@@ -0,0 +1,101 @@
+import pytest
+from fakeredis import FakeRedis
+from app import config
+from app.duplicados import (DetectorDuplicados, DetectorDuplicadosMemoria, DetectorDuplicadosRedis, calcular_firma,
+                            crear_detector, similitud)
+
+DESCRIPCION = "No puedo ingresar a la aplicación móvil, dice que la contraseña es incorrecta aunque la cambié ayer"
+PARECIDA = "no puedo ingresar a la aplicacion movil dice que la contraseña es incorrecta aunque la cambie ayer!!"
+DISTINTA = "La factura de octubre llegó con un cobro duplicado del plan"
+
+
+def _incidente_data(description, cliente_id=1):
+    return {
+        "description": description, "categoria": "acceso", "prioridad": "alta", "canal": "correo",
+        "cliente_id": cliente_id, "estado": "abierto", "identificacion_usuario": "123456789"
+    }
+
+
+def test_similitud_minhash():
+    firma = calcular_firma(DESCRIPCION)
+    assert similitud(firma, calcular_firma(PARECIDA)) >= 0.8
+    assert similitud(firma, calcular_firma(DISTINTA)) < 0.3
+    assert calcular_firma("") is None
+
+
+@pytest.mark.parametrize("detector", [
+    DetectorDuplicadosMemoria(0.8, 3600),
+    DetectorDuplicadosRedis(0.8, 3600),
+])
+def test_detector_duplicados(detector):
+    redis_client = FakeRedis()
+    detector.registrar(1, 10, DESCRIPCION, redis_client)
+    detector.registrar(1, 11, DISTINTA, redis_client)
+
+    encontrado = detector.buscar(1, PARECIDA, redis_client)
+    assert encontrado[0] == 10
+    assert encontrado[1] >= 0.8
+    assert detector.buscar(2, PARECIDA, redis_client) is None
+
+    detector.descartar(1, 10, redis_client)
+    assert detector.buscar(1, PARECIDA, redis_client) is None
+
+
+def test_detector_memoria_olvida_fuera_de_ventana():
+    detector = DetectorDuplicadosMemoria(0.8, 0)
+    detector.registrar(1, 10, DESCRIPCION, None)
+    assert detector.buscar(1, PARECIDA, None) is None
+
+
+def test_crear_incidente_marca_duplicado(client, mocker):
+    mocker.patch.object(config, "DUPLICADOS_MODO", "marcar")
+
+    original = client.post("/incidente", json=_incidente_data(DESCRIPCION))
+    assert "X-Incidente-Duplicado" not in original.headers
+
+    duplicado = client.post("/incidente", json=_incidente_data(PARECIDA))
+    assert duplicado.status_code == 200
+    assert duplicado.headers["X-Incidente-Duplicado"] == str(original.json()["id"])
+    assert duplicado.json()["id"] != original.json()["id"]
+
+
+def test_crear_incidente_fusiona_duplicado(client, mocker):
+    mocker.patch.object(config, "DUPLICADOS_MODO", "fusionar")
+    facturar = mocker.patch("app.routes.registrar_incidente_facturado")
+
+    original = client.post("/incidente", json=_incidente_data(DESCRIPCION)).json()
+    duplicado = client.post("/incidente", json=_incidente_data(PARECIDA))
+
+    assert duplicado.status_code == 200
+    assert duplicado.json()["id"] == original["id"]
+    assert duplicado.headers["X-Incidente-Duplicado"] == str(original["id"])
+    assert facturar.call_count == 1
+
+
+def test_solucionar_incidente_deja_de_ser_candidato(client, mocker):
+    mocker.patch.object(config, "DUPLICADOS_MODO", "fusionar")
+
+    original = client.post("/incidente", json=_incidente_data(DESCRIPCION)).json()
+    client.put(f"/incidente/{original['id']}/solucionar", json={"solucion": "Se restableció la clave"})
+    nuevo = client.post("/incidente", json=_incidente_data(PARECIDA))
+
+    assert nuevo.json()["id"] != original["id"]
+    assert "X-Incidente-Duplicado" not in nuevo.headers
+
+
+def test_crear_incidente_sin_deteccion_por_defecto(client):
+    client.post("/incidente", json=_incidente_data(DESCRIPCION))
+    segundo = client.post("/incidente", json=_incidente_data(DESCRIPCION))
+    assert "X-Incidente-Duplicado" not in segundo.headers
+
+
+def test_almacen_por_defecto_usa_redis_si_esta_configurado(monkeypatch):
+    monkeypatch.setattr(config, "DUPLICADOS_ALMACEN", "auto")
+    monkeypatch.setattr(config, "REDIS_SERVICE_NAME", "redis")
+    assert isinstance(crear_detector(), DetectorDuplicadosRedis)
+
+    monkeypatch.setattr(config, "REDIS_SERVICE_NAME", None)
+    assert isinstance(crear_detector(), DetectorDuplicadosMemoria)
+
+    with pytest.raises(TypeError):
+        DetectorDuplicados(0.8, 3600)
@@ -0,0 +1,106 @@
+import csv
+import gzip
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+from fastapi import HTTPException, status
+from jose import jwt
+from sqlmodel import Session
+from app.exportacion import FiltrosExportacion, generar_exportacion, iterar_lotes
+from app.models import Canal, Categoria, Estado, Incidente, Prioridad
+from app.security import ALGORITHM, SECRET_KEY
+
+
+def _headers():
+    token = jwt.encode({"sub": "user@example.com", "exp": datetime.utcnow() + timedelta(minutes=30)},
+                       SECRET_KEY, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _sembrar(session, cantidad=5):
+    for i in range(cantidad):
+        session.add(Incidente(cliente_id=1 if i % 2 == 0 else 2, description=f"Incidente {i}",
+                              categoria=Categoria.acceso, prioridad=Prioridad.baja, canal=Canal.correo,
+                              estado=Estado.abierto if i < 3 else Estado.cerrado))
+    session.commit()
+
+
+def _como_agente(mocker):
+    mocker.patch("app.routes.verificar_cliente_existente",
+                 AsyncMock(side_effect=HTTPException(status_code=404, detail="Cliente no encontrado")))
+    mocker.patch("app.routes.verificar_agente_existente", AsyncMock(return_value="NIT"))
+
+
+def test_iterar_lotes_por_llave(session):
+    _sembrar(session)
+    lotes = list(iterar_lotes(session, FiltrosExportacion(), cursor=0, tamano_lote=2))
+    assert [len(lote) for lote in lotes] == [2, 2, 1]
+
+    lotes = list(iterar_lotes(session, FiltrosExportacion(), cursor=3, tamano_lote=2))
+    assert [incidente.id for lote in lotes for incidente in lote] == [4, 5]
+
+
+def test_generar_exportacion_gzip(session):
+    _sembrar(session)
+    bloques = list(generar_exportacion(lambda: Session(session.get_bind()), "ndjson", FiltrosExportacion(),
+                                       tamano_lote=2, comprimir=True))
+    lineas = gzip.decompress(b"".join(bloques)).decode().splitlines()
+    assert len(lineas) == 5
+    # Cada lote se puede descomprimir apenas llega
+    parcial = zlib.decompressobj(wbits=31).decompress(bloques[0])
+    assert parcial.decode().count("\n") == 2
+
+
+def test_exportar_ndjson_como_agente_con_filtros(client, session, mocker):
+    _sembrar(session)
+    _como_agente(mocker)
+
+    response = client.get("/incidentes/export", params={"estado": "abierto"}, headers=_headers())
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    filas = [json.loads(linea) for linea in response.text.splitlines()]
+    assert [fila["id"] for fila in filas] == [1, 2, 3]
+    assert all(fila["estado"] == "abierto" for fila in filas)
+
+
+def test_exportar_csv_cliente_solo_ve_lo_propio(client, session, mocker):
+    _sembrar(session)
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=2))
+
+    response = client.get("/incidentes/export", params={"format": "csv", "cliente_id": 1}, headers=_headers())
+
+    assert response.status_code == status.HTTP_200_OK
+    filas = list(csv.DictReader(io.StringIO(response.text)))
+    assert [fila["id"] for fila in filas] == ["2", "4"]
+    assert {fila["cliente_id"] for fila in filas} == {"2"}
+
+
+def test_exportar_reanuda_desde_cursor_con_gzip(client, session, mocker):
+    _sembrar(session)
+    _como_agente(mocker)
+
+    response = client.get("/incidentes/export", params={"cursor": 3, "gzip": True}, headers=_headers())
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(linea)["id"] for linea in response.text.splitlines()] == [4, 5]
+
+
+def test_generar_exportacion_devuelve_la_conexion_entre_lotes(session):
+    _sembrar(session)
+    pool = session.get_bind().pool
+    sesiones = []
+
+    def abrir_sesion():
+        sesiones.append(Session(session.get_bind()))
+        return sesiones[-1]
+
+    bloques = generar_exportacion(abrir_sesion, "ndjson", FiltrosExportacion(), tamano_lote=2)
+    assert next(bloques).decode().count("\n") == 2
+    # Mientras el cliente consume el bloque no se retiene conexión ni cupo de la réplica
+    assert pool.checkedout() == 0
+    assert len(b"".join(bloques).splitlines()) == 3
+    assert len(sesiones) == 1 and pool.checkedout() == 0
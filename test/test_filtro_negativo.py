@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.database import (create_incidente_cache_async, obtener_incidente_cache_async,
+                          obtener_incidente_por_radicado_async)
+from app import config
+from app.filtro_negativo import (ausente_seguro, clave_ausente, clave_vigencia, construir_filtro_radicados,
+                                   recordar_ausente, registrar_creacion)
+
+
+@pytest.mark.asyncio
+async def test_filtro_descarta_radicados_no_emitidos(session, redis_client, redis_async, incidente):
+    session.add(incidente)
+    session.commit()
+
+    # Sin construir, el filtro no descarta nada
+    assert not await ausente_seguro(redis_async, "radicado", "NOEXISTE")
+
+    assert construir_filtro_radicados(session.get_bind(), redis_client)
+    assert not construir_filtro_radicados(session.get_bind(), redis_client)
+
+    assert await ausente_seguro(redis_async, "radicado", "NOEXISTE")
+    assert not await ausente_seguro(redis_async, "radicado", incidente.radicado)
+    assert not await ausente_seguro(redis_async, "radicado", incidente.radicado.upper())
+
+
+@pytest.mark.asyncio
+async def test_radicado_descartado_no_consulta_la_base(session, redis_client, redis_async, incidente):
+    construir_filtro_radicados(session.get_bind(), redis_client)
+
+    with patch.object(session, "exec", wraps=session.exec) as consulta:
+        assert await obtener_incidente_por_radicado_async("NOEXISTE", session, redis_async) is None
+    consulta.assert_not_called()
+
+    incidente.id = None
+    creado = await create_incidente_cache_async(incidente, session, redis_async)
+    encontrado = await obtener_incidente_por_radicado_async(creado.radicado, session, redis_async)
+    assert encontrado.id == creado.id
+
+
+@pytest.mark.asyncio
+async def test_marca_de_ausencia_evita_la_segunda_consulta(session, redis_async):
+    with patch.object(session, "get", wraps=session.get) as consulta:
+        assert await obtener_incidente_cache_async(999, session, redis_async) is None
+        consultas = consulta.call_count
+        assert await obtener_incidente_cache_async(999, session, redis_async) is None
+    assert consulta.call_count == consultas
+    assert await redis_async.ttl(clave_ausente("id", 999)) > 0
+
+
+@pytest.mark.asyncio
+async def test_crear_borra_la_marca_de_ausencia(session, redis_async, incidente):
+    assert await obtener_incidente_cache_async(1, session, redis_async) is None
+    assert await redis_async.exists(clave_ausente("id", 1))
+
+    incidente.id = None
+    creado = await create_incidente_cache_async(incidente, session, redis_async)
+    assert creado.id == 1
+    assert not await redis_async.exists(clave_ausente("id", 1))
+    await redis_async.delete("incidente:1")
+    assert (await obtener_incidente_cache_async(1, session, redis_async))["id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_filtro_vencido_no_descarta_y_se_reconstruye(session, redis_client, redis_async, incidente):
+    construir_filtro_radicados(session.get_bind(), redis_client)
+    # Una carga directa a la base no pasa por registrar_creacion
+    session.add(incidente)
+    session.commit()
+    assert await ausente_seguro(redis_async, "radicado", incidente.radicado)
+
+    await redis_async.delete(clave_vigencia())
+    assert not await ausente_seguro(redis_async, "radicado", incidente.radicado)
+
+    assert construir_filtro_radicados(session.get_bind(), redis_client)
+    assert not await ausente_seguro(redis_async, "radicado", incidente.radicado)
+    assert await ausente_seguro(redis_async, "radicado", "NOEXISTE")
+    assert 0 < await redis_async.ttl(clave_vigencia()) <= config.FILTRO_RADICADOS_VIGENCIA_S
+
+
+@pytest.mark.asyncio
+async def test_no_marca_ausente_un_radicado_que_el_filtro_tiene(redis_client, redis_async, incidente):
+    # Recién creado en la primaria: la réplica atrasada aún no lo devuelve
+    incidente.id = 7
+    registrar_creacion(redis_client, incidente)
+    await recordar_ausente(redis_async, "radicado", incidente.radicado)
+    assert not await redis_async.exists(clave_ausente("radicado", incidente.radicado))
+
+    await recordar_ausente(redis_async, "radicado", "NOEXISTE")
+    assert await redis_async.exists(clave_ausente("radicado", "NOEXISTE"))
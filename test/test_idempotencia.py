@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+from fastapi import HTTPException
+from sqlmodel import select
+from unittest.mock import AsyncMock
+
+from app import config
+from app.database import create_incidente_cache_async
+from app.idempotencia import SolicitudIdempotente, huella_cuerpo
+from app.models import Incidente, LogIncidente
+
+INCIDENTE = {
+    "description": "No funciona el portal",
+    "categoria": "acceso",
+    "prioridad": "alta",
+    "canal": "aplicacion",
+    "cliente_id": 7,
+    "estado": "abierto",
+    "identificacion_usuario": "123456789",
+}
+
+
+@pytest.fixture
+def facturacion(mocker):
+    return mocker.patch("app.routes.registrar_incidente_facturado", AsyncMock(return_value={}))
+
+
+def test_reintento_con_la_misma_clave_no_repite_la_escritura(client, session, mocker, facturacion):
+    publicar = mocker.patch("app.routes.publish_message")
+    headers = {"Idempotency-Key": "reintento-1"}
+
+    primera = client.post("/incidente", json=INCIDENTE, headers=headers)
+    segunda = client.post("/incidente", json=INCIDENTE, headers=headers)
+
+    assert primera.status_code == segunda.status_code == 200
+    assert primera.json() == segunda.json()
+    assert segunda.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in primera.headers
+    assert len(session.exec(select(Incidente)).all()) == 1
+    assert len(session.exec(select(LogIncidente)).all()) == 1
+    assert publicar.call_count == 2
+    facturacion.assert_awaited_once()
+
+
+def test_claves_distintas_crean_incidentes_distintos(client, facturacion):
+    primera = client.post("/incidente", json=INCIDENTE, headers={"Idempotency-Key": "a"})
+    segunda = client.post("/incidente", json=INCIDENTE, headers={"Idempotency-Key": "b"})
+    assert primera.json()["id"] != segunda.json()["id"]
+
+
+def test_misma_clave_con_otro_cuerpo_retorna_422(client, facturacion):
+    client.post("/incidente", json=INCIDENTE, headers={"Idempotency-Key": "k"})
+    response = client.post("/incidente", json={**INCIDENTE, "description": "Otro"},
+                           headers={"Idempotency-Key": "k"})
+    assert response.status_code == 422
+
+
+def test_error_no_se_guarda_y_permite_reintentar(client, mocker, facturacion):
+    mocker.patch("app.routes.create_incidente_cache_async", side_effect=[Exception("caído"), mocker.DEFAULT],
+                 wraps=create_incidente_cache_async)
+    headers = {"Idempotency-Key": "con-error"}
+    assert client.post("/incidente", json=INCIDENTE, headers=headers).status_code == 500
+    response = client.post("/incidente", json=INCIDENTE, headers=headers)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_huella_ignora_orden_y_espacios():
+    assert huella_cuerpo(b'{"a": 1, "b": 2}') == huella_cuerpo(b'{"b":2,"a":1}')
+
+
+@pytest.mark.asyncio
+async def test_peticion_concurrente_espera_la_respuesta_del_primero():
+    redis = FakeRedis()
+    primera = SolicitudIdempotente(redis, "1", "clave", "h")
+    assert await primera.iniciar() is None
+
+    async def terminar_primera():
+        await asyncio.sleep(0.1)
+        await primera.guardar({"id": 10})
+        await primera.liberar()
+
+    segunda = SolicitudIdempotente(redis, "1", "clave", "h")
+    respuesta, _ = await asyncio.gather(segunda.iniciar(), terminar_primera())
+    assert json.loads(respuesta.body) == {"id": 10}
+    assert await redis.get(primera.clave_candado) is None
+
+
+@pytest.mark.asyncio
+async def test_peticion_concurrente_sin_respuesta_retorna_409(monkeypatch):
+    monkeypatch.setattr(config, "IDEMPOTENCIA_ESPERA_MS", 100)
+    redis = FakeRedis()
+    assert await SolicitudIdempotente(redis, "1", "clave", "h").iniciar() is None
+    with pytest.raises(HTTPException) as error:
+        await SolicitudIdempotente(redis, "1", "clave", "h").iniciar()
+    assert error.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_liberar_no_borra_un_candado_ajeno():
+    redis = FakeRedis()
+    solicitud = SolicitudIdempotente(redis, "1", "clave", "h")
+    await solicitud.iniciar()
+    await redis.set(solicitud.clave_candado, "otro")
+    await solicitud.liberar()
+    assert await redis.get(solicitud.clave_candado) == b"otro"
@@ -0,0 +1,123 @@
+import pytest
+from fakeredis import FakeRedis
+from fakeredis.aioredis import FakeRedis as FakeRedisAsync
+from starlette.requests import Request
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.limites import Limitador, LimiteExcedido, identidad_peticion, limitador_lectura
+
+INCIDENTE = {
+    "description": "No funciona el portal", "categoria": "acceso", "prioridad": "alta",
+    "canal": "aplicacion", "cliente_id": 3, "estado": "abierto", "identificacion_usuario": "1",
+}
+
+
+def _request(headers=(), query=b"", cliente=("10.0.0.1", 1234)):
+    return Request({"type": "http", "headers": list(headers), "query_string": query, "client": cliente})
+
+
+def test_limitador_rechaza_al_superar_el_limite():
+    redis = FakeRedis()
+    limitador = Limitador("prueba", limite=20, lote=5)
+    for _ in range(20):
+        limitador.verificar(redis, "cliente:1")
+    with pytest.raises(LimiteExcedido) as error:
+        limitador.verificar(redis, "cliente:1")
+    assert error.value.status_code == 429
+    assert 1 <= int(error.value.headers["Retry-After"]) <= 60
+
+
+def test_limitador_separa_clientes():
+    redis = FakeRedis()
+    limitador = Limitador("prueba", limite=10, lote=5)
+    for _ in range(10):
+        limitador.verificar(redis, "cliente:1")
+    limitador.verificar(redis, "cliente:2")
+
+
+def test_limitador_reserva_lotes_para_evitar_idas_a_redis():
+    redis = MagicMock(wraps=FakeRedis())
+    limitador = Limitador("prueba", limite=100, lote=10)
+    for _ in range(30):
+        limitador.verificar(redis, "cliente:1")
+    assert redis.pipeline.call_count == 3
+
+
+def test_limitador_comparte_el_presupuesto_entre_procesos():
+    redis = FakeRedis()
+    proceso_a, proceso_b = Limitador("prueba", limite=20, lote=5), Limitador("prueba", limite=20, lote=5)
+    for _ in range(10):
+        proceso_a.verificar(redis, "cliente:1")
+        proceso_b.verificar(redis, "cliente:1")
+    with pytest.raises(LimiteExcedido):
+        proceso_a.verificar(redis, "cliente:1")
+
+
+def test_limitador_pondera_la_ventana_anterior():
+    redis = FakeRedis()
+    limitador = Limitador("prueba", limite=20, ventana_s=60, lote=5)
+    with patch("app.limites.time.time", return_value=60 * 1000 + 59):
+        for _ in range(20):
+            limitador.verificar(redis, "cliente:1")
+    # Al inicio de la ventana siguiente la anterior aún pesa 59/60: queda un solo cupo
+    with patch("app.limites.time.time", return_value=60 * 1001 + 1):
+        limitador.verificar(redis, "cliente:1")
+        with pytest.raises(LimiteExcedido):
+            limitador.verificar(redis, "cliente:1")
+
+
+def test_limitador_permite_si_redis_falla():
+    redis = MagicMock()
+    redis.pipeline.side_effect = ConnectionError("sin redis")
+    Limitador("prueba", limite=1, lote=1).verificar(redis, "cliente:1")
+
+
+def test_limitador_descarta_reservas_de_ventanas_pasadas():
+    redis = FakeRedis()
+    limitador = Limitador("prueba", limite=100, ventana_s=60, lote=10)
+    with patch("app.limites.time.time", return_value=60 * 1000):
+        for identidad in range(50):
+            limitador.verificar(redis, f"ip:{identidad}")
+    with patch("app.limites.time.time", return_value=60 * 1001):
+        limitador.verificar(redis, "ip:nueva")
+    assert list(limitador._reservas) == ["ip:nueva"]
+
+
+@pytest.mark.asyncio
+async def test_limitador_async_comparte_presupuesto_con_el_sincrono(redis_server):
+    limitador = Limitador("prueba", limite=10, lote=5)
+    for _ in range(5):
+        limitador.verificar(FakeRedis(server=redis_server), "ip:1")
+    otro_proceso = Limitador("prueba", limite=10, lote=5)
+    redis_async = FakeRedisAsync(server=redis_server)
+    for _ in range(5):
+        await otro_proceso.verificar_async(redis_async, "ip:1")
+    with pytest.raises(LimiteExcedido):
+        await otro_proceso.verificar_async(redis_async, "ip:1")
+
+
+def test_identidad_peticion():
+    assert identidad_peticion(_request()) == "ip:10.0.0.1"
+    # El cliente no elige su identidad
+    assert identidad_peticion(_request(query=b"cliente_id=9")) == "ip:10.0.0.1"
+    with patch("app.limites._sujeto_token", return_value="a@b.co"):
+        assert identidad_peticion(_request([(b"authorization", b"Bearer x")])) == "sub:a@b.co"
+
+
+def test_endpoint_de_lectura_limitado(client, monkeypatch):
+    monkeypatch.setattr(limitador_lectura, "limite", 2)
+    monkeypatch.setattr(limitador_lectura, "lote", 1)
+    assert client.get("/incidente/1/logs").status_code == 200
+    assert client.get("/incidente/1/logs").status_code == 200
+    response = client.get("/incidente/1/logs")
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert 'rate_limited_requests_total{budget="lectura"}' in client.get("/metrics").text
+
+
+def test_crear_incidente_limitado(client, mocker):
+    mocker.patch("app.routes.registrar_incidente_facturado", AsyncMock(return_value={}))
+    mocker.patch("app.routes.limitador_escritura.verificar_async", AsyncMock(side_effect=LimiteExcedido(30)))
+    response = client.post("/incidente", json=INCIDENTE)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
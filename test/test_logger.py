@@ -0,0 +1,61 @@
+import json
+import logging
+from app import config, logger as modulo_logger
+from app.logger import FiltroMuestreo, FiltroRedaccion, FormatoJSON, configurar_logging, detener_logging, redactar
+
+
+def _registro(mensaje, nivel=logging.INFO, args=(), **extra):
+    record = logging.LogRecord("app.prueba", nivel, __file__, 1, mensaje, args, None)
+    for clave, valor in extra.items():
+        setattr(record, clave, valor)
+    return record
+
+
+def test_redactar_secretos():
+    assert redactar("Bearer eyJhbGciOi.abc.def") == "Bearer [REDACTED]"
+    assert redactar("mysql+mysqlconnector://root:clave@db:3306/incidentes") == \
+        "mysql+mysqlconnector://root:[REDACTED]@db:3306/incidentes"
+    assert redactar({"Authorization": "Bearer x", "User-Agent": "Mozilla"}) == \
+        {"Authorization": "[REDACTED]", "User-Agent": "Mozilla"}
+
+
+def test_filtro_redaccion_mensaje_y_extras():
+    record = _registro("Conectando a %s", args=("mysql://u:p@h/db",),
+                       headers={"authorization": "Bearer abc", "host": "x"}, token="abc")
+
+    FiltroRedaccion().filter(record)
+
+    assert record.getMessage() == "Conectando a mysql://u:[REDACTED]@h/db"
+    assert record.headers == {"authorization": "[REDACTED]", "host": "x"}
+    assert record.token == "[REDACTED]"
+
+
+def test_filtro_muestreo_solo_afecta_debug(mocker):
+    filtro = FiltroMuestreo(0.0)
+    assert filtro.filter(_registro("info")) is True
+    assert filtro.filter(_registro("debug", logging.DEBUG)) is False
+    assert FiltroMuestreo(1.0).filter(_registro("debug", logging.DEBUG)) is True
+
+
+def test_formato_json_incluye_campos_extra():
+    documento = json.loads(FormatoJSON().format(_registro("Incidentes encontrados", cantidad=3)))
+    assert documento["level"] == "INFO"
+    assert documento["logger"] == "app.prueba"
+    assert documento["message"] == "Incidentes encontrados"
+    assert documento["cantidad"] == 3
+
+
+def test_configurar_logging_escribe_json_en_segundo_plano(capsys, mocker):
+    mocker.patch.object(config, "LOG_NIVELES", "app.prueba_silenciosa=ERROR")
+    detener_logging()
+    configurar_logging()
+    try:
+        logging.getLogger("app.prueba").info("Hola", extra={"headers": {"Authorization": "Bearer abc"}})
+        logging.getLogger("app.prueba_silenciosa").warning("No debe salir")
+    finally:
+        detener_logging()
+
+    lineas = [json.loads(linea) for linea in capsys.readouterr().out.splitlines()]
+    assert [linea["message"] for linea in lineas] == ["Hola"]
+    assert lineas[0]["headers"] == {"Authorization": "[REDACTED]"}
+    assert modulo_logger._listener is None
@@ -0,0 +1,54 @@
+import threading
+from fastapi import status
+from app.metricas import RegistroMetricas
+
+
+def test_contador_suma_fragmentos_de_varios_hilos():
+    registro = RegistroMetricas()
+    contador = registro.contador("pruebas_total", "Pruebas", ("tipo",))
+
+    def incrementar():
+        for _ in range(1000):
+            contador.inc("a")
+
+    hilos = [threading.Thread(target=incrementar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert contador.valores() == {("a",): 4000}
+    assert 'pruebas_total{tipo="a"} 4000' in registro.exponer()
+
+
+def test_histograma_buckets_acumulados():
+    registro = RegistroMetricas()
+    histograma = registro.histograma("latencia_seconds", "Latencia", ("ruta",), buckets=(0.1, 1.0))
+    histograma.observar(0.05, "/x")
+    histograma.observar(0.5, "/x")
+    histograma.observar(5, "/x")
+
+    texto = registro.exponer()
+    assert '# TYPE latencia_seconds histogram' in texto
+    assert 'latencia_seconds_bucket{ruta="/x",le="0.1"} 1' in texto
+    assert 'latencia_seconds_bucket{ruta="/x",le="1.0"} 2' in texto
+    assert 'latencia_seconds_bucket{ruta="/x",le="+Inf"} 3' in texto
+    assert 'latencia_seconds_count{ruta="/x"} 3' in texto
+
+
+def test_endpoint_metrics(client):
+    incidente = client.post("/incidente", json={
+        "description": "Test incident", "categoria": "acceso", "prioridad": "alta", "canal": "llamada",
+        "cliente_id": 1, "estado": "abierto", "identificacion_usuario": "123456789"
+    }).json()
+    client.get(f"/incidente/{incidente['id']}")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    texto = response.text
+    assert 'http_requests_total{method="GET",route="/incidente/{incidente_id}",status="200"}' in texto
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/incidente",le="+Inf"}' in texto
+    assert 'db_statement_duration_seconds_count{engine="default",statement="INSERT"}' in texto
+    assert 'cache_requests_total{key="id",result="hit"}' in texto
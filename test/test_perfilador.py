@@ -0,0 +1,91 @@
+import pstats
+import time
+from fastapi.testclient import TestClient
+from app import config
+from app.perfilador import MuestreadorPilas, PerfiladorMiddleware, _perfilando
+
+DEBUG = {"X-Debug-Token": "secreto"}
+
+
+def _configurar(mocker, tmp_path, **valores):
+    mocker.patch.object(config, "PERFILADOR_DIRECTORIO", str(tmp_path))
+    mocker.patch.object(config, "PERFILADOR_TOKEN", "perfil")
+    mocker.patch.object(config, "DEBUG_TOKEN", "secreto")
+    for clave, valor in valores.items():
+        mocker.patch.object(config, clave, valor)
+
+
+def test_perfila_peticion_con_token_cprofile(client, mocker, tmp_path):
+    _configurar(mocker, tmp_path)
+
+    with TestClient(PerfiladorMiddleware(client.app)) as perfilado:
+        assert perfilado.get("/incidentes/fields").status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+        perfilado.get("/incidentes/fields", headers={"X-Profile": "perfil"})
+
+    archivos = list(tmp_path.iterdir())
+    assert len(archivos) == 1
+    assert archivos[0].name.endswith("-GET-incidentes_fields.prof")
+    assert pstats.Stats(str(archivos[0])).total_calls > 0
+
+    perfiles = client.get("/debug/profiles", headers=DEBUG).json()
+    assert [p["nombre"] for p in perfiles] == [archivos[0].name]
+    descarga = client.get(f"/debug/profiles/{archivos[0].name}", headers=DEBUG)
+    assert descarga.status_code == 200
+    assert descarga.content == archivos[0].read_bytes()
+
+
+def test_perfil_por_muestreo_y_limite_de_archivos(client, mocker, tmp_path):
+    _configurar(mocker, tmp_path, PERFILADOR_MUESTREO=1.0, PERFILADOR_MAX_ARCHIVOS=2)
+
+    with TestClient(PerfiladorMiddleware(client.app)) as perfilado:
+        for _ in range(4):
+            perfilado.get("/")
+            time.sleep(0.01)
+
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_muestreador_genera_pilas_colapsadas(tmp_path):
+    import threading
+    muestreador = MuestreadorPilas(threading.get_ident(), 0.001)
+    muestreador.iniciar()
+    fin = time.perf_counter() + 0.05
+    while time.perf_counter() < fin:
+        sum(range(1000))
+    muestreador.detener()
+    ruta = tmp_path / "perfil.collapsed"
+    muestreador.guardar(str(ruta))
+
+    lineas = ruta.read_text().splitlines()
+    assert lineas
+    pila, conteo = lineas[0].rsplit(" ", 1)
+    assert "test_muestreador_genera_pilas_colapsadas" in pila
+    assert int(conteo) >= 1
+
+
+def test_descargar_perfil_rechaza_rutas(client, mocker, tmp_path):
+    _configurar(mocker, tmp_path)
+    assert client.get("/debug/profiles/..%2F..%2Fetc%2Fpasswd", headers=DEBUG).status_code == 404
+    assert client.get("/debug/profiles/no-existe.prof", headers=DEBUG).status_code == 404
+
+
+def test_peticiones_concurrentes_no_fallan_por_el_perfilador(client, mocker, tmp_path):
+    _configurar(mocker, tmp_path)
+
+    with TestClient(PerfiladorMiddleware(client.app)) as perfilado:
+        # Otra petición se está perfilando: esta se atiende sin perfil
+        with _perfilando:
+            respuesta = perfilado.get("/incidentes/fields", headers={"X-Profile": "perfil"})
+        assert respuesta.status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+        # Si el perfilador no puede activarse (otro activo en 3.12), tampoco
+        mocker.patch("app.perfilador.cProfile.Profile.enable",
+                     side_effect=ValueError("Another profiling tool is already active"))
+        assert perfilado.get("/incidentes/fields", headers={"X-Profile": "perfil"}).status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+    assert _perfilando.acquire(blocking=False)
+    _perfilando.release()
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+import json
+from unittest.mock import patch
+
+from app.models import Canal, Categoria, Estado, Incidente, LogIncidente, Prioridad
+from app.precalentamiento import CLAVE_CANDADO, precalentar_cache
+
+
+def _incidente(estado: Estado, radicado: str, fecha_cierre=None) -> Incidente:
+    return Incidente(cliente_id=1, description="Sin acceso", categoria=Categoria.acceso, prioridad=Prioridad.alta,
+                     canal=Canal.llamada, estado=estado, fecha_cierre=fecha_cierre, solucion=None,
+                     radicado=radicado)
+
+
+def _sembrar(session):
+    incidentes = [
+        _incidente(Estado.abierto, "ABIERTO1"),
+        _incidente(Estado.escalado, "ESCALAD1"),
+        _incidente(Estado.cerrado, "CERRADO1", date.today() - timedelta(days=1)),
+        _incidente(Estado.cerrado, "ANTIGUO1", date.today() - timedelta(days=90)),
+        _incidente(Estado.cerrado, "ANTIGUO2", date.today() - timedelta(days=90)),
+    ]
+    session.add_all(incidentes)
+    session.commit()
+    # ANTIGUO2 se cerró hace tiempo pero tuvo un cambio reciente
+    session.add(LogIncidente(incidente_id=incidentes[4].id, cuerpo_completo="{}", origen_cambio="Otro",
+                             fecha_cambio=datetime.utcnow()))
+    session.commit()
+    return incidentes
+
+
+def test_precalienta_activos_y_recientes(session, redis_client):
+    incidentes = _sembrar(session)
+
+    resumen = precalentar_cache(session.get_bind(), redis_client, lote=2, filas_por_segundo=0, progreso=lambda _: None)
+
+    assert resumen["incidentes"] == 4
+    assert resumen["claves_escritas"] == 8
+    for incidente in incidentes:
+        esperado = incidente.radicado != "ANTIGUO1"
+        assert bool(redis_client.exists(f"incidente:{incidente.id}")) is esperado
+        assert bool(redis_client.exists(f"incidente:radicado:{incidente.radicado}")) is esperado
+    assert json.loads(redis_client.get(f"incidente:{incidentes[0].id}"))["radicado"] == "ABIERTO1"
+    assert redis_client.ttl(f"incidente:{incidentes[0].id}") > 0
+    assert not redis_client.exists(CLAVE_CANDADO)
+
+
+def test_no_pisa_valores_existentes(session, redis_client):
+    incidentes = _sembrar(session)
+    redis_client.set(f"incidente:{incidentes[0].id}", "vigente")
+
+    resumen = precalentar_cache(session.get_bind(), redis_client, filas_por_segundo=0, progreso=lambda _: None)
+
+    assert resumen["claves_escritas"] == 7
+    assert redis_client.get(f"incidente:{incidentes[0].id}") == b"vigente"
+
+
+def test_limita_el_ritmo(session, redis_client):
+    _sembrar(session)
+    progreso = []
+
+    with patch("app.precalentamiento.time.sleep") as dormir:
+        precalentar_cache(session.get_bind(), redis_client, lote=2, filas_por_segundo=1, progreso=progreso.append)
+
+    assert [p["incidentes"] for p in progreso] == [2, 4]
+    assert dormir.call_count == 2
+    assert dormir.call_args_list[-1].args[0] > 3
+
+
+def test_un_solo_proceso_precalienta(session, redis_client):
+    redis_client.set(CLAVE_CANDADO, "otro")
+    assert precalentar_cache(session.get_bind(), redis_client) is None
+
+
+def test_omite_incidentes_cambiados_tras_leer_el_lote(session, redis_client):
+    incidentes = _sembrar(session)
+    # La réplica leyó el estado anterior de ABIERTO1 y el cambio borró su clave
+    with patch("app.precalentamiento.nueva_version", return_value="1000"):
+        redis_client.set(f"incidente:version:{incidentes[0].id}", "2000")
+        resumen = precalentar_cache(session.get_bind(), redis_client, filas_por_segundo=0, progreso=lambda _: None)
+
+    assert resumen["omitidos_por_cambios"] == 1
+    assert resumen["claves_escritas"] == 6
+    assert not redis_client.exists(f"incidente:{incidentes[0].id}")
+    assert not redis_client.exists("incidente:radicado:ABIERTO1")
+
+
+def test_deshace_claves_de_incidentes_cambiados_al_escribir(session, redis_client):
+    incidentes = _sembrar(session)
+    redis_client.set(f"incidente:radicado:{incidentes[0].radicado}", "vigente")
+
+    with patch("app.precalentamiento._cambiados_desde", side_effect=[set(), {incidentes[0].id}]):
+        resumen = precalentar_cache(session.get_bind(), redis_client, filas_por_segundo=0, progreso=lambda _: None)
+
+    assert resumen["omitidos_por_cambios"] == 1
+    assert resumen["claves_escritas"] == 6
+    assert not redis_client.exists(f"incidente:{incidentes[0].id}")
+    # Solo se deshace lo que escribió el precalentamiento
+    assert redis_client.get("incidente:radicado:ABIERTO1") == b"vigente"
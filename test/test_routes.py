@@ -251,7 +251,7 @@ def test_obtener_valores_permitidos(client):
 def test_crear_incidente_error(client, mocker):
     # Mock para forzar un error en la creación del incidente
     mock_create_incidente_cache = mocker.patch(
-        "app.routes.create_incidente_cache")
+        "app.routes.create_incidente_cache_async")
     mock_create_incidente_cache.side_effect = Exception(
         "Error inesperado en la creación del incidente")
 
@@ -502,3 +502,55 @@ def test_listar_problemas_comunes_value_error(client, mocker):
     response = client.get("/soluciones")
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
     assert response.json() == {"detail": "Test error"}
+
+
+def test_listar_problemas_comunes_por_cliente_con_etag(client, session):
+    session.add(ProblemaComun(description="Problema cliente 1", categoria=Categoria.acceso,
+                              solucion="Solución 1", cliente_id=1))
+    session.add(ProblemaComun(description="Problema cliente 2", categoria=Categoria.acceso,
+                              solucion="Solución 2", cliente_id=2))
+    session.commit()
+
+    response = client.get("/soluciones", params={"cliente_id": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert [p["cliente_id"] for p in response.json()] == [1]
+    etag = response.headers["ETag"]
+
+    response = client.get("/soluciones", params={"cliente_id": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    client.post("/soluciones", json={"description": "Nuevo", "categoria": "acceso",
+                                     "solucion": "Nueva solución", "cliente_id": 1})
+
+    response = client.get("/soluciones", params={"cliente_id": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+
+def test_registrar_problema_comun_llena_el_catalogo_de_la_nueva_version(client, mocker):
+    client.get("/soluciones", params={"cliente_id": 1})
+    client.post("/soluciones", json={"description": "Nuevo", "categoria": "acceso",
+                                     "solucion": "Nueva solución", "cliente_id": 1})
+
+    # La réplica aún no tiene la fila: el catálogo debe venir de la caché llenada desde la primaria
+    consulta = mocker.patch("app.routes.obtener_problemas_comunes", return_value=[])
+    for params in ({"cliente_id": 1}, {}):
+        response = client.get("/soluciones", params=params)
+        assert [p["description"] for p in response.json()] == ["Nuevo"]
+    consulta.assert_not_called()
+
+
+def test_listar_problemas_comunes_sirve_desde_cache(client, session, mocker):
+    session.add(ProblemaComun(description="Problema", categoria=Categoria.acceso,
+                              solucion="Solución", cliente_id=1))
+    session.commit()
+    client.get("/soluciones", params={"cliente_id": 1})
+
+    consulta = mocker.patch("app.routes.obtener_problemas_comunes")
+    response = client.get("/soluciones", params={"cliente_id": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 1
+    consulta.assert_not_called()
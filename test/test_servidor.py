@@ -0,0 +1,124 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, mock_open, patch
+
+import httpx
+import pytest
+
+from app import config
+from app.servidor import Supervisor, calcular_workers, configuracion_uvicorn, cpus_disponibles, memoria_rss_mb
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def test_cpus_disponibles_respeta_cuota_de_cgroup():
+    with patch("os.sched_getaffinity", return_value=set(range(8))), \
+         patch("builtins.open", mock_open(read_data="200000 100000\n")):
+        assert cpus_disponibles() == 2
+
+
+def test_cpus_disponibles_sin_cuota():
+    with patch("os.sched_getaffinity", return_value=set(range(4))), \
+         patch("builtins.open", mock_open(read_data="max 100000\n")):
+        assert cpus_disponibles() == 4
+
+
+def test_calcular_workers_usa_configuracion(monkeypatch):
+    monkeypatch.setattr(config, "SERVIDOR_WORKERS", 3)
+    assert calcular_workers() == 3
+
+
+def test_configuracion_uvicorn_recicla_con_margen(monkeypatch):
+    monkeypatch.setattr(config, "SERVIDOR_MAX_PETICIONES", 1000)
+    configuracion = configuracion_uvicorn(object())
+    assert 1000 <= configuracion.limit_max_requests <= 1100
+    assert configuracion.reload is False
+
+
+def test_configuracion_uvicorn_solo_confia_en_proxies_configurados(monkeypatch):
+    monkeypatch.setattr(config, "SERVIDOR_PROXIES_CONFIABLES", "10.1.2.3")
+    configuracion = configuracion_uvicorn(object())
+    assert configuracion.forwarded_allow_ips == "10.1.2.3"
+
+
+def test_memoria_rss_mb_del_proceso_actual():
+    assert memoria_rss_mb(os.getpid()) > 0
+
+
+def test_supervisor_espera_cada_vez_mas_tras_fallos_de_arranque(monkeypatch):
+    monkeypatch.setattr(config, "SERVIDOR_REINICIO_ESPERA_S", 1)
+    supervisor = Supervisor(object(), None, 3)
+    supervisor.workers = {10: time.monotonic(), 11: time.monotonic(), 12: time.monotonic() - 3600}
+    # Códigos de salida 1 (estado 256) y 0
+    with patch("os.waitpid", side_effect=[(10, 256), (11, 256), (0, 0)]):
+        supervisor._recoger()
+    assert supervisor.fallos_seguidos == 2
+    assert 1 < supervisor.proximo_inicio - time.monotonic() <= 2
+    assert supervisor._faltantes() == 0
+
+    supervisor.proximo_inicio = 0
+    assert supervisor._faltantes() == 1
+
+    with patch("os.waitpid", side_effect=[(12, 0), (0, 0)]):
+        supervisor._recoger()
+    assert supervisor.fallos_seguidos == 0
+    assert supervisor._faltantes() == 3
+
+
+def test_supervisor_no_repite_sigterm_a_un_worker_reciclado(monkeypatch):
+    monkeypatch.setattr(config, "SERVIDOR_MAX_MEMORIA_MB", 100)
+    supervisor = Supervisor(object(), None, 1)
+    supervisor.workers = {10: time.monotonic()}
+    with patch("app.servidor.memoria_rss_mb", return_value=500), patch("os.kill") as kill:
+        supervisor._vigilar_memoria()
+        supervisor._vigilar_memoria()
+    kill.assert_called_once_with(10, signal.SIGTERM)
+    assert supervisor._faltantes() == 1
+
+    with patch("os.waitpid", side_effect=[(10, 0), (0, 0)]):
+        supervisor._recoger()
+    assert supervisor.saliendo == set()
+
+
+def test_supervisor_detiene_la_preparacion_de_cache_antes_del_fork():
+    llamadas = MagicMock()
+    supervisor = Supervisor(object(), None, 1)
+    with patch("app.servidor.detener_preparacion_cache", llamadas.detener), \
+         patch("os.fork", llamadas.fork) as fork:
+        fork.return_value = 123
+        supervisor.iniciar_worker()
+    assert [llamada[0] for llamada in llamadas.mock_calls] == ["detener", "fork"]
+    assert 123 in supervisor.workers
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere fork")
+def test_servidor_atiende_y_se_apaga_ordenadamente():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        puerto = sock.getsockname()[1]
+    entorno = {**os.environ, "TESTING": "True", "PORT": str(puerto), "SERVIDOR_HOST": "127.0.0.1",
+               "SERVIDOR_WORKERS": "2", "SERVIDOR_MAX_PETICIONES": "3"}
+    proceso = subprocess.Popen([sys.executable, "-m", "app.servidor"], cwd=RAIZ, env=entorno,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        respuestas = []
+        limite = time.monotonic() + 20
+        while len(respuestas) < 10 and time.monotonic() < limite:
+            try:
+                respuestas.append(httpx.get(f"http://127.0.0.1:{puerto}/", timeout=2).status_code)
+            except httpx.TransportError:
+                time.sleep(0.1)
+        # Con 2 workers y reciclaje cada ~3 peticiones, 10 respuestas implican reinicios
+        assert respuestas == [200] * 10
+
+        proceso.send_signal(signal.SIGTERM)
+        assert proceso.wait(timeout=30) == 0
+    finally:
+        if proceso.poll() is None:
+            proceso.kill()
+            proceso.wait()
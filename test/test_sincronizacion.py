@@ -0,0 +1,202 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select as sa_select
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.database import custom_serializer
+from app.filtro_negativo import clave_ausente
+from app.models import Canal, Categoria, Estado, Incidente, IncidenteArchivado, Prioridad
+from app.sincronizacion import ConsumidorReplica, Mensaje, descartados as tabla_descartados
+from app.versiones import clave_version_incidente, clave_version_incidentes
+
+_INICIO = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class SuscriptorEnMemoria:
+    """Sustituto del pull de Pub/Sub: entrega los pendientes y recuerda los confirmados."""
+
+    def __init__(self):
+        self.pendientes = []
+        self.confirmados = []
+        self._secuencia = 0
+
+    def publicar(self, datos, publicado=None):
+        self._secuencia += 1
+        publicado = publicado or _INICIO + timedelta(seconds=self._secuencia)
+        cuerpo = datos if isinstance(datos, bytes) else json.dumps(datos, default=custom_serializer).encode()
+        self.pendientes.append(Mensaje(f"ack-{self._secuencia}", cuerpo, publicado))
+
+    def extraer(self, maximo):
+        entregados, self.pendientes = self.pendientes[:maximo], self.pendientes[maximo:]
+        return entregados
+
+    def confirmar(self, ack_ids):
+        self.confirmados.extend(ack_ids)
+
+
+def _mensaje(incidente_id, operacion="create", **cambios):
+    datos = Incidente(id=incidente_id, cliente_id=1, description="Sin acceso", categoria=Categoria.acceso,
+                      prioridad=Prioridad.alta, canal=Canal.llamada, estado=Estado.abierto,
+                      fecha_creacion=date(2024, 5, 1), solucion=None, radicado=f"RAD{incidente_id:05d}").model_dump()
+    datos.update(cambios)
+    datos["operation"] = operacion
+    return datos
+
+
+@pytest.fixture
+def replica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _incidentes(engine):
+    with Session(engine) as session:
+        return {i.id: i for i in session.exec(select(Incidente)).all()}
+
+
+def test_aplica_creaciones_y_actualizaciones(replica, redis_client):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba", lote=10, redis_client=redis_client)
+    suscriptor.publicar(_mensaje(1))
+    suscriptor.publicar(_mensaje(2))
+    suscriptor.publicar(_mensaje(1, "update", estado="escalado"))
+    redis_client.set("incidente:1", "versión anterior leída de la réplica")
+    redis_client.set(clave_version_incidente(1), "1")
+    redis_client.set(clave_version_incidentes(None), "1")
+
+    assert consumidor.procesar_lote() == 3
+
+    incidentes = _incidentes(replica)
+    assert set(incidentes) == {1, 2}
+    assert incidentes[1].estado == Estado.escalado
+    assert incidentes[1].fecha_creacion == date(2024, 5, 1)
+    assert suscriptor.confirmados == ["ack-1", "ack-2", "ack-3"]
+    assert not redis_client.exists("incidente:1")
+    # El ETag servido con lo que había en la réplica deja de coincidir
+    assert redis_client.get(clave_version_incidente(1)) != b"1"
+    assert redis_client.get(clave_version_incidentes(None)) != b"1"
+    assert redis_client.exists(clave_version_incidentes(1))
+    assert not redis_client.exists(clave_version_incidente(2))
+
+    punto = consumidor.punto_control()
+    assert punto["mensajes"] == 3
+    assert punto["ultimo_publicado"] == (_INICIO + timedelta(seconds=3)).replace(tzinfo=None)
+    assert consumidor.ultimo_retraso > 0
+
+
+def test_gana_la_publicacion_mas_reciente_aunque_llegue_antes(replica):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba")
+    suscriptor.publicar(_mensaje(1, "update", estado="cerrado", solucion="Listo"), _INICIO + timedelta(seconds=10))
+    suscriptor.publicar(_mensaje(1, "create"), _INICIO)
+
+    consumidor.procesar_lote()
+
+    assert _incidentes(replica)[1].estado == Estado.cerrado
+
+
+def test_mensaje_atrasado_en_otro_lote_no_pisa_el_posterior(replica, redis_client):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba", redis_client=redis_client)
+    suscriptor.publicar(_mensaje(1, "update", estado="cerrado", solucion="Listo"), _INICIO + timedelta(seconds=10))
+    consumidor.procesar_lote()
+
+    # La reentrega de una publicación anterior llega en un lote posterior
+    suscriptor.publicar(_mensaje(1, "update", estado="escalado"), _INICIO + timedelta(seconds=5))
+    redis_client.set("incidente:1", "versión cerrada")
+    assert consumidor.procesar_lote() == 1
+
+    assert _incidentes(replica)[1].estado == Estado.cerrado
+    assert redis_client.exists("incidente:1")
+    assert suscriptor.confirmados == ["ack-1", "ack-2"]
+
+
+def test_borra_las_marcas_de_ausencia_de_las_filas_aplicadas(replica, redis_client):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba", redis_client=redis_client)
+    # Una lectura de la réplica atrasada marcó como ausente el incidente recién creado
+    redis_client.set(clave_ausente("id", 4), b"1")
+    redis_client.set(clave_ausente("radicado", "RAD00004"), b"1")
+    suscriptor.publicar(_mensaje(4))
+
+    consumidor.procesar_lote()
+
+    assert not redis_client.exists(clave_ausente("id", 4), clave_ausente("radicado", "RAD00004"))
+
+
+def test_reaplicar_es_idempotente(replica):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba")
+    for _ in range(2):
+        suscriptor.publicar(_mensaje(1, "update", estado="escalado"))
+        consumidor.procesar_lote()
+
+    assert list(_incidentes(replica)) == [1]
+    assert consumidor.punto_control()["mensajes"] == 2
+
+
+def test_archiva_y_no_resucita(replica):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba", lote=2)
+    suscriptor.publicar(_mensaje(1))
+    suscriptor.publicar(_mensaje(2))
+    consumidor.procesar_lote()
+
+    suscriptor.publicar({"operation": "archive", "ids": [1]})
+    # Una actualización atrasada del incidente ya archivado llega después
+    suscriptor.publicar(_mensaje(1, "update", estado="cerrado"))
+    consumidor.procesar_lote()
+    suscriptor.publicar(_mensaje(1, "update", estado="cerrado"))
+    consumidor.procesar_lote()
+
+    assert list(_incidentes(replica)) == [2]
+    with Session(replica) as session:
+        assert [i.id for i in session.exec(select(IncidenteArchivado)).all()] == [1]
+
+
+def test_mensajes_invalidos_se_confirman_sin_bloquear(replica):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba")
+    suscriptor.publicar(b"no es json")
+    suscriptor.publicar({"operation": "borrar", "id": 1})
+    suscriptor.publicar(_mensaje(3))
+
+    assert consumidor.procesar_lote() == 3
+    assert list(_incidentes(replica)) == [3]
+    assert len(suscriptor.confirmados) == 3
+
+
+def test_si_la_base_no_responde_no_confirma(replica, monkeypatch):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba")
+    suscriptor.publicar(_mensaje(1))
+    caida = OperationalError("INSERT", {}, Exception("Lost connection to MySQL server"))
+    monkeypatch.setattr("app.sincronizacion.upsert", lambda *a, **k: (_ for _ in ()).throw(caida))
+
+    with pytest.raises(OperationalError):
+        consumidor.procesar_lote()
+    assert suscriptor.confirmados == []
+    assert consumidor.punto_control() is None
+
+
+def test_fila_que_no_se_puede_escribir_se_descarta_sin_bloquear_el_lote(replica):
+    suscriptor = SuscriptorEnMemoria()
+    consumidor = ConsumidorReplica(replica, suscriptor, "prueba")
+    suscriptor.publicar(_mensaje(1))
+    suscriptor.publicar(_mensaje(2, cliente_id=2 ** 70))
+    suscriptor.publicar(_mensaje(3))
+
+    assert consumidor.procesar_lote() == 3
+
+    assert set(_incidentes(replica)) == {1, 3}
+    assert suscriptor.confirmados == ["ack-1", "ack-2", "ack-3"]
+    with replica.connect() as conn:
+        descartados = conn.execute(sa_select(tabla_descartados)).all()
+    assert len(descartados) == 1
+    assert json.loads(descartados[0].datos)["id"] == 2
+    assert descartados[0].suscripcion == "prueba"
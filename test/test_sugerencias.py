@@ -0,0 +1,133 @@
+import json
+
+from fastapi import status
+from app import sugerencias
+from app.indice_texto import IndiceBM25
+from app.models import Categoria, ProblemaComun
+from app.texto import tokenizar
+from app.versiones import clave_catalogo_soluciones, clave_version_soluciones, incrementar_version
+
+
+def test_tokenizar_normaliza_y_quita_stopwords():
+    assert tokenizar("No puedo ACCEDER a la aplicación") == ["puedo", "acceder", "aplicacion"]
+
+
+def test_indice_bm25_ordena_por_relevancia():
+    indice = IndiceBM25()
+    indice.agregar(1, "error de acceso a la cuenta")
+    indice.agregar(2, "la factura llega duplicada")
+    indice.agregar(3, "acceso bloqueado cuenta bloqueada por intentos")
+
+    resultados = indice.buscar("cuenta bloqueada", k=2)
+
+    assert [doc_id for doc_id, _ in resultados] == [3, 1]
+    assert resultados[0][1] > resultados[1][1]
+
+
+def test_indice_bm25_eliminar_y_reemplazar():
+    indice = IndiceBM25()
+    indice.agregar(1, "clave olvidada")
+    indice.agregar(1, "factura duplicada")
+
+    assert indice.buscar("clave") == []
+    assert [doc_id for doc_id, _ in indice.buscar("factura")] == [1]
+
+    indice.eliminar(1)
+    assert len(indice) == 0
+    assert indice.buscar("factura") == []
+
+
+def test_indice_bm25_recalcula_pesos_tras_escribir():
+    indice = IndiceBM25()
+    indice.agregar(1, "factura duplicada")
+    indice.agregar(2, "acceso bloqueado")
+    antes = dict(indice.buscar("factura"))[1]
+
+    # Un documento más largo cambia la longitud promedio y con ella el puntaje
+    indice.agregar(3, "acceso bloqueado cuenta bloqueada por intentos fallidos de ingreso")
+    assert dict(indice.buscar("factura"))[1] != antes
+    assert indice.contar("factura acceso") == 3
+
+
+def test_carga_del_catalogo_fuera_del_lock(client, session, monkeypatch):
+    session.add(ProblemaComun(description="No llega el correo", categoria=Categoria.acceso,
+                              solucion="Revisar spam", cliente_id=1))
+    session.commit()
+    cargar = sugerencias._cargar_problemas
+    bloqueado = []
+
+    def cargar_observando(*args):
+        bloqueado.append(sugerencias._lock.locked())
+        return cargar(*args)
+
+    monkeypatch.setattr(sugerencias, "_cargar_problemas", cargar_observando)
+    indice, problemas = sugerencias.obtener_indice_problemas(1, session)
+    assert bloqueado == [False]
+    assert list(problemas) == [1] and len(indice) == 1
+    assert sugerencias.obtener_indice_problemas(1, session)[0] is indice
+
+
+def test_sugerir_soluciones(client, session):
+    session.add(ProblemaComun(description="No llega el correo de recuperación de clave",
+                              categoria=Categoria.acceso, solucion="Revisar la carpeta de spam", cliente_id=1))
+    session.add(ProblemaComun(description="La aplicación se cierra al abrir el menú",
+                              categoria=Categoria.funcionamiento, solucion="Reinstalar la aplicación", cliente_id=1))
+    session.add(ProblemaComun(description="No llega el correo de recuperación",
+                              categoria=Categoria.acceso, solucion="Solución de otro cliente", cliente_id=2))
+    session.commit()
+
+    response = client.post("/soluciones/sugerencias",
+                           json={"description": "no me llega el correo para recuperar la clave", "cliente_id": 1, "k": 2})
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["problema"]["solucion"] == "Revisar la carpeta de spam"
+    assert data[0]["score"] > 0
+
+
+def test_sugerir_soluciones_incluye_problemas_nuevos(client):
+    response = client.post("/soluciones/sugerencias",
+                           json={"description": "pantalla en blanco", "cliente_id": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+    client.post("/soluciones", json={
+        "description": "Pantalla en blanco al iniciar sesión",
+        "categoria": Categoria.funcionamiento.value,
+        "solucion": "Limpiar la caché del navegador",
+        "cliente_id": 1
+    })
+
+    response = client.post("/soluciones/sugerencias",
+                           json={"description": "pantalla en blanco", "cliente_id": 1})
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["problema"]["solucion"] == "Limpiar la caché del navegador"
+
+
+def test_sugerir_soluciones_reconstruye_si_otra_instancia_cambia_el_catalogo(client, session, redis_client):
+    session.add(ProblemaComun(description="Impresora sin papel", categoria=Categoria.funcionamiento,
+                              solucion="Cargar papel", cliente_id=1))
+    session.commit()
+    assert client.post("/soluciones/sugerencias", json={"description": "token vencido", "cliente_id": 1}).json() == []
+
+    # Otra instancia registra un problema: su índice local no se entera, pero la versión cambia
+    session.add(ProblemaComun(description="Token de acceso vencido", categoria=Categoria.acceso,
+                              solucion="Renovar el token", cliente_id=1))
+    session.commit()
+    incrementar_version(redis_client, clave_version_soluciones(1))
+
+    data = client.post("/soluciones/sugerencias", json={"description": "token vencido", "cliente_id": 1}).json()
+    assert [s["problema"]["solucion"] for s in data] == ["Renovar el token"]
+
+
+def test_sugerir_soluciones_usa_el_catalogo_de_la_version_si_la_replica_no_lo_tiene(client, redis_client):
+    client.post("/soluciones/sugerencias", json={"description": "token vencido", "cliente_id": 1})
+    problema = ProblemaComun(id=99, description="Token de acceso vencido", categoria=Categoria.acceso,
+                             solucion="Renovar el token", cliente_id=1)
+    version = incrementar_version(redis_client, clave_version_soluciones(1))
+    redis_client.set(clave_catalogo_soluciones(1, version), json.dumps([problema.model_dump(mode="json")]))
+
+    data = client.post("/soluciones/sugerencias", json={"description": "token vencido", "cliente_id": 1}).json()
+    assert [s["problema"]["id"] for s in data] == [99]
@@ -0,0 +1,79 @@
+import io
+import json
+from unittest.mock import AsyncMock
+import pytest
+from app import config, trazas
+from app.cliente_service import verificar_cliente_existente
+from app.trazas import Exportador, Span, encabezados_propagacion, span
+
+
+def _activar(mocker, muestreo=1.0):
+    destino = io.StringIO()
+    exportador = Exportador(destino)
+    mocker.patch.object(config, "TRAZAS_EXPORTADOR", "consola")
+    mocker.patch.object(config, "TRAZAS_MUESTREO", muestreo)
+    mocker.patch.object(trazas, "_exportador", exportador)
+    return exportador, destino
+
+
+def _spans(exportador, destino):
+    exportador.detener()
+    return [json.loads(linea) for linea in destino.getvalue().splitlines()]
+
+
+def test_span_sin_peticion_muestreada_no_hace_nada():
+    with span("db.commit") as actual:
+        assert actual is None
+    assert encabezados_propagacion() == {}
+
+
+def test_crear_incidente_genera_cascada_de_spans(client, mocker):
+    exportador, destino = _activar(mocker)
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    response = client.post("/incidente", headers={"traceparent": traceparent}, json={
+        "description": "Test incident", "categoria": "acceso", "prioridad": "alta", "canal": "llamada",
+        "cliente_id": 1, "estado": "abierto", "identificacion_usuario": "123456789"
+    })
+    assert response.status_code == 200
+
+    spans = _spans(exportador, destino)
+    raiz = next(s for s in spans if s["name"] == "POST /incidente")
+    assert raiz["trace_id"] == "0af7651916cd43dd8448eb211c80319c"
+    assert raiz["parent_id"] == "b7ad6b7169203331"
+    assert raiz["attributes"]["http.status_code"] == 200
+
+    nombres = [s["name"] for s in spans if s["parent_id"] == raiz["span_id"]]
+    assert "db.commit" in nombres
+    assert "db.refresh" in nombres
+    assert "facturacion.registrar" in nombres
+    assert all(s["trace_id"] == raiz["trace_id"] for s in spans)
+
+
+def test_traceparent_no_muestreado_se_respeta(client, mocker):
+    exportador, destino = _activar(mocker)
+
+    client.get("/incidentes/fields", headers={"traceparent": "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"})
+
+    assert _spans(exportador, destino) == []
+
+
+@pytest.mark.asyncio
+async def test_propagacion_a_servicios_externos(mocker):
+    exportador, _ = _activar(mocker)
+    post = mocker.patch("httpx.AsyncClient.post", new_callable=AsyncMock)
+    post.return_value.status_code = 200
+    post.return_value.json = lambda: {"id": 7}
+
+    raiz = Span("0af7651916cd43dd8448eb211c80319c", None, "GET /incidentes", True)
+    token = trazas._span_actual.set(raiz)
+    try:
+        await verificar_cliente_existente("cliente@example.com", "token")
+    finally:
+        trazas._span_actual.reset(token)
+
+    traceparent = post.call_args.kwargs["headers"]["traceparent"]
+    assert traceparent.startswith("00-0af7651916cd43dd8448eb211c80319c-")
+    assert traceparent.endswith("-01")
+    assert raiz.span_id not in traceparent
+    exportador.detener()
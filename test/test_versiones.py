@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import AsyncMock
+from fastapi import status
+from jose import jwt
+from app.database import get_redis_client
+from app.models import Incidente
+from app.security import ALGORITHM, SECRET_KEY
+
+INCIDENTE = {
+    "description": "Test incident", "categoria": "acceso", "prioridad": "alta", "canal": "llamada",
+    "cliente_id": 1, "estado": "abierto", "identificacion_usuario": "123456789"
+}
+
+
+def _headers(**extra):
+    token = jwt.encode({"sub": "user@example.com", "exp": datetime.utcnow() + timedelta(minutes=30)},
+                       SECRET_KEY, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}", **extra}
+
+
+def _segundo_cerrado(mocker):
+    # Simula que ya terminó el segundo en que se escribió la versión
+    mocker.patch("app.versiones._segundo_actual", return_value=int(time.time()) + 1)
+
+
+def test_obtener_incidente_responde_304_con_etag(client, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    _segundo_cerrado(mocker)
+
+    response = client.get(f"/incidente/{incidente_id}")
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_obtener_incidente_304_no_consulta_la_base(client, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    etag = client.get(f"/incidente/{incidente_id}").headers["ETag"]
+
+    cache = mocker.patch("app.routes.obtener_incidente_cache_async")
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-None-Match": etag})
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    cache.assert_not_called()
+
+
+def test_solucionar_y_escalar_renuevan_etag(client):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    etag = client.get(f"/incidente/{incidente_id}").headers["ETag"]
+
+    client.put(f"/incidente/{incidente_id}/escalar")
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["estado"] == "escalado"
+    etag_escalado = response.headers["ETag"]
+    assert etag_escalado != etag
+
+    client.put(f"/incidente/{incidente_id}/solucionar", json={"solucion": "Listo"})
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-None-Match": etag_escalado})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["estado"] == "cerrado"
+    assert response.json()["solucion"] == "Listo"
+
+
+def test_obtener_incidente_if_modified_since(client, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    _segundo_cerrado(mocker)
+    last_modified = client.get(f"/incidente/{incidente_id}").headers["Last-Modified"]
+
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_if_modified_since_no_confunde_cambios_del_mismo_segundo(client, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    # El segundo de la versión sigue en curso
+    mocker.patch("app.versiones._segundo_actual", return_value=0)
+    response = client.get(f"/incidente/{incidente_id}")
+    assert "Last-Modified" not in response.headers
+    ahora = format_datetime(datetime.now(timezone.utc), usegmt=True)
+
+    # Otro cambio dentro del mismo segundo tendría la misma fecha: solo el ETag lo distingue
+    client.put(f"/incidente/{incidente_id}/solucionar", json={"solucion": "Listo"})
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-Modified-Since": ahora})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["estado"] == "cerrado"
+
+
+def test_lectura_desde_replica_atrasada_tras_solucionar(client, session, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    anterior = Incidente.model_validate(client.get(f"/incidente/{incidente_id}").json())
+
+    client.put(f"/incidente/{incidente_id}/escalar")
+    client.put(f"/incidente/{incidente_id}/solucionar", json={"solucion": "Listo"})
+    # La réplica todavía no aplicó los cambios
+    mocker.patch.object(session, "get", return_value=anterior)
+
+    response = client.get(f"/incidente/{incidente_id}")
+    assert response.json()["estado"] == "cerrado"
+    response = client.get(f"/incidente/{incidente_id}", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_lecturas_condicionales_sin_redis_sincrono(client, mocker):
+    incidente_id = client.post("/incidente", json=INCIDENTE).json()["id"]
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+    # Cualquier uso del cliente síncrono en el camino de lectura falla la petición
+    client.app.dependency_overrides[get_redis_client] = lambda: None
+
+    for ruta, headers in ((f"/incidente/{incidente_id}", {}), ("/incidentes", _headers())):
+        response = client.get(ruta, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        response = client.get(ruta, headers={**headers, "If-None-Match": response.headers["ETag"]})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_obtener_incidente_inexistente_no_crea_version(client, redis_client):
+    response = client.get("/incidente/999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert redis_client.get("incidente:version:999") is None
+
+
+def test_listado_incidentes_etag_por_cliente(client, mocker):
+    mocker.patch("app.routes.verificar_cliente_existente", AsyncMock(return_value=1))
+    client.post("/incidente", json=INCIDENTE)
+
+    response = client.get("/incidentes", headers=_headers())
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers["ETag"]
+
+    response = client.get("/incidentes", headers=_headers(**{"If-None-Match": etag}))
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.post("/incidente", json={**INCIDENTE, "cliente_id": 2})
+    response = client.get("/incidentes", headers=_headers(**{"If-None-Match": etag}))
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.post("/incidente", json=INCIDENTE)
+    response = client.get("/incidentes", headers=_headers(**{"If-None-Match": etag}))
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 2